@@ -1,19 +1,28 @@
 """Algorithms for scalar diffraction tomography"""
-from ._alg2d_bpp import backpropagate_2d  # noqa F401
-from ._alg2d_fmp import fourier_map_2d  # noqa F401
+from ._alg2d_bpp import backpropagate_2d, backpropagate_2d_stack  # noqa F401
+from ._alg2d_fmp import fourier_map_2d, fourier_map_2d_stack  # noqa F401
 from ._alg2d_int import integrate_2d  # noqa F401
 
+from ._accumulator import Accumulator2D, Accumulator3D  # noqa F401
 from ._alg3d_bpp import backpropagate_3d  # noqa F401
 from ._alg3d_bppt import backpropagate_3d_tilted  # noqa F401
+from ._async import backpropagate_3d_async  # noqa F401
+from ._async import backpropagate_3d_tilted_async  # noqa F401
+from ._autotune import autotune_3d  # noqa F401
+from ._cancel import CancelToken, ReconstructionCancelled  # noqa F401
+from ._checkpoint import Checkpoint  # noqa F401
+from ._focus import estimate_focus, tamura_coefficient  # noqa F401
+from ._memory import estimate_memory_3d  # noqa F401
+from ._partition import backpropagate_3d_partitioned  # noqa F401
+from ._partition import backpropagate_3d_tilted_partitioned  # noqa F401
+from ._sweep import backpropagate_3d_sweep  # noqa F401
 
 from ._postproc import odt_to_ri, opt_to_ri  # noqa F401
+from ._preproc import refocus_sinogram  # noqa F401
 from ._preproc import sinogram_as_radon, sinogram_as_rytov  # noqa F401
+from ._resources import resource_context, split_cores  # noqa F401
 from ._version import version as __version__  # noqa F401
 from ._version import longversion as __version_full__  # noqa F401
 
 __author__ = "Paul Müller"
 __license__ = "BSD (3 clause)"
-
-
-# Shared variable used by 3D backpropagation
-_shared_array = None
@@ -0,0 +1,390 @@
+"""Stateful backpropagation of individual projections
+
+The backpropagation is a weighted sum over the filtered and rotated
+projections. The accumulators in this module compute the geometry,
+the filters, and the FFT plans once and then add (or remove)
+projections one at a time.
+"""
+from multiprocessing.pool import ThreadPool
+
+import numexpr as ne
+import numpy as np
+
+from . import _fft
+from . import _resources
+from . import _rotation
+from . import util
+from ._alg2d_bpp import _rotate_add
+
+
+class _Accumulator(object):
+    """Common interface of :class:`Accumulator2D` and :class:`Accumulator3D`
+
+    The accumulated volume does not include the angular
+    differential :math:`\\Delta \\phi_0`; It is applied in
+    :func:`snapshot` using the sum of the weights of all
+    projections added so far.
+    """
+
+    def __init__(self, shape, dtype, onlyreal):
+        if dtype is None:
+            dtype = np.float_
+        dtype = np.dtype(dtype)
+        assert dtype.name in ["float32",
+                              "float64"], "dtype must be float32 or float64!"
+        self.dtype = dtype
+        self.dtype_complex = np.dtype("complex{}".format(
+            2 * int(dtype.name.strip("float"))))
+        self.onlyreal = onlyreal
+        self._outarr = np.zeros(shape, dtype=dtype if onlyreal
+                                else self.dtype_complex)
+        #: Number of projections in the accumulated volume
+        self.num_projections = 0
+        #: Sum of the weights of these projections
+        self.total_weight = 0.
+
+    def add(self, projection, angle, weight=1):
+        """Backpropagate a projection and add it to the volume
+
+        Parameters
+        ----------
+        projection: ndarray
+            Projection :math:`u_{\\mathrm{B}, \\phi_j}` divided by
+            the incident plane wave (one entry of the sinogram)
+        angle: float
+            Angular position :math:`\\phi_j` in radians
+        weight: float
+            Weight of the projection; To reproduce `weight_angles=True`
+            of the reconstruction functions, use the weights computed
+            with :func:`odtbrain.util.compute_angle_weights_1d`.
+        """
+        self.add_transformed(self.transform(projection), angle, weight)
+
+    def add_transformed(self, spectrum, angle, weight=1):
+        """Add a projection that was transformed with :func:`transform`
+
+        The padded Fourier transform of a projection does not depend
+        on `res`, `nm`, and `lD`. Thus, it can be added to several
+        accumulators that only differ in these parameters.
+        """
+        self._accumulate(spectrum, angle, weight)
+        self.num_projections += 1
+        self.total_weight += weight
+
+    def retract(self, projection, angle, weight=1):
+        """Remove a previously added projection from the volume
+
+        The arguments must be identical to those passed to
+        :func:`add`.
+        """
+        assert self.num_projections > 0, "No projections were added!"
+        self._accumulate(self.transform(projection), angle, -weight)
+        self.num_projections -= 1
+        self.total_weight -= weight
+        if self.num_projections == 0:
+            # remove floating point residuals
+            self._outarr[:] = 0
+            self.total_weight = 0.
+
+    def snapshot(self):
+        """Return the reconstruction from the projections added so far
+
+        Returns
+        -------
+        f: ndarray
+            Reconstructed object function (see the corresponding
+            reconstruction function); A copy of the internal volume.
+        """
+        if self.num_projections == 0:
+            return np.zeros_like(self._outarr)
+        return self._outarr * (2 * np.pi / self.total_weight)
+
+    def close(self):
+        """Release the thread pool (if any)"""
+
+    def transform(self, projection):
+        """Return the Fourier transform of the padded projection"""
+        raise NotImplementedError()
+
+    def _accumulate(self, spectrum, angle, weight):
+        raise NotImplementedError()
+
+
+class Accumulator2D(_Accumulator):
+    """Stateful 2D backpropagation (see :func:`backpropagate_2d`)"""
+
+    def __init__(self, size, res, nm, lD=0, padding=True, padval=0,
+                 pad_strategy="pow2", intp_order=3, intp_method="rotate",
+                 dtype=None, onlyreal=False, num_cores=None):
+        """
+        Parameters
+        ----------
+        size: int
+            Size N of the projections
+        res, nm, lD, padding, padval, pad_strategy, intp_order,
+        intp_method, dtype, onlyreal:
+            Parameters of :func:`backpropagate_2d`
+        num_cores: int or None
+            Number of threads used by the FFTs; Defaults to the
+            number of cores set with :func:`odtbrain.resource_context`.
+        """
+        assert intp_method in ["rotate", "fourier"], \
+            "`intp_method` must be 'rotate' or 'fourier'."
+        super(Accumulator2D, self).__init__((size, size), dtype, onlyreal)
+        if num_cores is None:
+            num_cores = _resources.get_num_cores()
+        self.intp_method = intp_method
+        self.intp_order = intp_order
+        self.padval = padval
+        ln = size
+        km = (2 * np.pi * nm) / res
+
+        order = util.compute_padded_size(ln, 2.1, strategy=pad_strategy)
+        pad = order - ln if padding else 0
+        self._padl = int(np.ceil(pad / 2))
+        self._padr = int(pad - self._padl)
+        lN = ln + pad
+
+        # filter (1) without the angular differential and including
+        # the normalization of the inverse FFT
+        kx = 2 * np.pi * np.fft.fftfreq(lN)
+        filter_klp = (kx**2 < km**2)
+        M = 1. / km * np.sqrt((km**2 - kx**2) * filter_klp)
+        prefactor = -1j * km / (2 * np.pi)
+        prefactor *= np.abs(kx) * filter_klp
+        prefactor *= np.exp(-1j * km * (M-1) * lD)
+        self._prefactor = prefactor / lN
+        # filter (2) for all rows of the output image
+        yv = (np.arange(lN) - ln / 2.0 + .5)[:ln].reshape(-1, 1)
+        self._filter2 = np.exp(1j * yv * km * (M - 1)).astype(
+            self.dtype_complex)
+
+        self._fftin = _fft.empty_aligned((lN,), self.dtype_complex)
+        self._fft_plan = _fft.plan(self._fftin, self._fftin, axes=(0,),
+                                   threads=num_cores,
+                                   flags=["FFTW_ESTIMATE"])
+        self._ifftin = _fft.empty_aligned((ln, lN), self.dtype_complex)
+        self._ifft_plan = _fft.plan(self._ifftin, self._ifftin, axes=(1,),
+                                    threads=num_cores,
+                                    direction="FFTW_BACKWARD",
+                                    flags=["FFTW_MEASURE"])
+        if intp_method == "fourier":
+            self._rotator = _rotation.FourierRotator(
+                (ln, 1, ln), self.dtype_complex, num_cores=num_cores)
+        else:
+            self._rotator = None
+
+    def transform(self, projection):
+        """Return the Fourier transform of the padded projection"""
+        ln = self._outarr.shape[0]
+        projection = np.asarray(projection)
+        assert projection.shape == (ln,), \
+            "`projection` must have shape ({},).".format(ln)
+        if self.padval is None:
+            self._fftin[:] = np.pad(projection, (self._padl, self._padr),
+                                    mode="edge")
+        else:
+            self._fftin[:] = np.pad(projection, (self._padl, self._padr),
+                                    mode="linear_ramp",
+                                    end_values=(self.padval,))
+        self._fft_plan.execute()
+        return self._fftin.copy()
+
+    def _accumulate(self, spectrum, angle, weight):
+        ln = self._outarr.shape[0]
+        np.multiply(spectrum, self._prefactor * weight, out=self._fftin)
+        np.multiply(self._filter2, self._fftin, out=self._ifftin)
+        self._ifft_plan.execute()
+        sino = self._ifftin[:, self._padl:self._padl + ln]
+        _rotate_add(sino[:, np.newaxis, :], angle,
+                    self._outarr[:, np.newaxis, :], onlyreal=self.onlyreal,
+                    intp_method=self.intp_method,
+                    intp_order=self.intp_order, rotator=self._rotator)
+
+
+class Accumulator3D(_Accumulator):
+    """Stateful 3D backpropagation (see :func:`backpropagate_3d`)"""
+
+    def __init__(self, shape, res, nm, lD=0, padding=(True, True),
+                 padfac=1.75, pad_strategy="pow2", padval=None,
+                 intp_order=2, intp_method="rotate", tile_size=32,
+                 dtype=None, onlyreal=False, num_cores=None,
+                 save_memory=False, rows=None):
+        """
+        Parameters
+        ----------
+        shape: tuple of ints (Ny, Nx)
+            Shape of the projections
+        res, nm, lD, padding, padfac, pad_strategy, padval,
+        intp_order, intp_method, tile_size, dtype, onlyreal,
+        save_memory:
+            Parameters of :func:`backpropagate_3d`
+        num_cores: int or None
+            Number of threads used by the FFTs and by
+            `intp_method="gather"`; Defaults to the number of cores
+            set with :func:`odtbrain.resource_context`.
+        rows: list of ints or None
+            Indices of the detector rows (slices of the volume along
+            the rotational axis y) that are reconstructed; If set,
+            the volume has the shape (Nx, len(rows), Nx) and only the
+            selected rows of the inverse Fourier transforms are
+            computed. Defaults to all rows.
+
+        Notes
+        -----
+        Projections are rotated in the calling process (with
+        `intp_method="rotate"`, the rotation is not distributed among
+        worker processes as in :func:`backpropagate_3d`).
+        """
+        assert intp_method in ["rotate", "gather", "fourier"], \
+            "`intp_method` must be 'rotate', 'gather', or 'fourier'."
+        (lny, lnx) = shape
+        ln = lnx
+        if rows is not None:
+            rows = np.array(rows, dtype=int).reshape(-1)
+            assert np.all((rows >= 0) & (rows < lny)), \
+                "`rows` must be in the range [0, {}).".format(lny)
+            nrows = rows.size
+        else:
+            nrows = lny
+        self.shape = (lny, lnx)
+        self.rows = rows
+        super(Accumulator3D, self).__init__((ln, nrows, lnx), dtype,
+                                            onlyreal)
+        if num_cores is None:
+            num_cores = _resources.get_num_cores()
+        self.intp_method = intp_method
+        self.intp_order = intp_order
+        self.padval = padval
+        self.save_memory = save_memory
+        km = (2 * np.pi * nm) / res
+
+        padx = util.compute_padded_size(lnx, padfac, strategy=pad_strategy) \
+            - lnx if padding[0] else 0
+        pady = util.compute_padded_size(lny, padfac, strategy=pad_strategy) \
+            - lny if padding[1] else 0
+        self._pad = ((int(np.ceil(pady / 2)), pady - int(np.ceil(pady / 2))),
+                     (int(np.ceil(padx / 2)), padx - int(np.ceil(padx / 2))))
+        (lNy, lNx) = (lny + pady, lnx + padx)
+
+        # filter (1) without the angular differential and including
+        # the normalization of the inverse FFT
+        kx = 2 * np.pi * np.fft.fftfreq(lNx).reshape(1, -1)
+        ky = 2 * np.pi * np.fft.fftfreq(lNy).reshape(-1, 1)
+        filter_klp = (kx**2 + ky**2 < km**2)
+        M = 1. / km * np.sqrt((km**2 - kx**2 - ky**2) * filter_klp)
+        prefactor = -1j * km / (2 * np.pi)
+        prefactor *= np.abs(kx) * filter_klp
+        prefactor *= np.exp(-1j * km * (M-1) * lD)
+        self._prefactor = prefactor / (lNx * lNy)
+        # filter (2) for all z-positions of the output volume
+        self._zv = np.linspace(-ln / 2.0, ln / 2.0, ln,
+                               endpoint=False).reshape(-1, 1, 1)
+        self._f2_exp_fac = 1j * km * (M - 1)
+        if not save_memory:
+            self._filter2 = ne.evaluate("exp(factor * zv)",
+                                        local_dict={
+                                            "factor": self._f2_exp_fac,
+                                            "zv": self._zv})
+
+        self._fftin = _fft.empty_aligned((lNy, lNx), self.dtype_complex)
+        self._fft_plan = _fft.plan(self._fftin, self._fftin, axes=(0, 1),
+                                   threads=num_cores,
+                                   flags=["FFTW_ESTIMATE"])
+        self._ifftin = _fft.empty_aligned((lNy, lNx), self.dtype_complex)
+        if rows is None:
+            self._ifft_plan = _fft.plan(self._ifftin, self._ifftin,
+                                        axes=(0, 1), threads=num_cores,
+                                        direction="FFTW_BACKWARD",
+                                        flags=["FFTW_MEASURE"])
+        else:
+            # The inverse transform along y is only evaluated at the
+            # selected rows (a matrix product), the inverse transform
+            # along x is computed with an FFT.
+            ky_idx = np.arange(lNy).reshape(1, -1)
+            yr = (rows + self._pad[0][0]).reshape(-1, 1)
+            self._ey = np.exp(2j * np.pi * ky_idx * yr / lNy).astype(
+                self.dtype_complex)
+            self._rowbuf = _fft.empty_aligned((nrows, lNx),
+                                              self.dtype_complex)
+            self._ifft_plan = _fft.plan(self._rowbuf, self._rowbuf,
+                                        axes=(1,), threads=num_cores,
+                                        direction="FFTW_BACKWARD",
+                                        flags=["FFTW_MEASURE"])
+
+        self._pool = None
+        self._rotator = None
+        if intp_method == "gather":
+            self._tiles = _rotation.get_tiles(ln, lnx, tile_size)
+            self._pool = ThreadPool(processes=num_cores)
+            # y is the last axis (see `_rotation.gather_accumulate`)
+            self._filtered_proj = np.zeros((ln, lnx, nrows),
+                                           dtype=self.dtype_complex)
+        else:
+            if intp_method == "fourier":
+                self._rotator = _rotation.FourierRotator(
+                    (ln, nrows, lnx), self.dtype_complex,
+                    num_cores=num_cores)
+            self._filtered_proj = np.zeros((ln, nrows, lnx),
+                                           dtype=self.dtype_complex)
+
+    def close(self):
+        """Release the thread pool (if any)"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def transform(self, projection):
+        """Return the Fourier transform of the padded projection"""
+        (lny, lnx) = self.shape
+        projection = np.asarray(projection)
+        assert projection.shape == (lny, lnx), \
+            "`projection` must have shape ({}, {}).".format(lny, lnx)
+        if self.padval is None:
+            self._fftin[:] = np.pad(projection, self._pad, mode="edge")
+        else:
+            self._fftin[:] = np.pad(projection, self._pad,
+                                    mode="linear_ramp",
+                                    end_values=(self.padval,))
+        self._fft_plan.execute()
+        return self._fftin.copy()
+
+    def _accumulate(self, spectrum, angle, weight):
+        (ln, lny, lnx) = self._outarr.shape
+        np.multiply(spectrum, self._prefactor * weight, out=self._fftin)
+
+        (padyl, padxl) = (self._pad[0][0], self._pad[1][0])
+        for p in range(ln):
+            if self.save_memory:
+                ne.evaluate("exp(factor * zvp) * projection",
+                            local_dict={"zvp": self._zv[p],
+                                        "projection": self._fftin,
+                                        "factor": self._f2_exp_fac},
+                            out=self._ifftin)
+            else:
+                np.multiply(self._filter2[p], self._fftin, out=self._ifftin)
+            if self.rows is None:
+                self._ifft_plan.execute()
+                cropped = self._ifftin[padyl:padyl + lny,
+                                       padxl:padxl + lnx]
+            else:
+                np.dot(self._ey, self._ifftin, out=self._rowbuf)
+                self._ifft_plan.execute()
+                cropped = self._rowbuf[:, padxl:padxl + lnx]
+            if self.intp_method == "gather":
+                cropped = cropped.T
+            self._filtered_proj[p] = cropped
+
+        if self.intp_method == "gather":
+            proj = self._filtered_proj
+            if self.onlyreal:
+                proj = proj.real
+            _rotation.gather_accumulate(proj, self._outarr,
+                                        -np.rad2deg(angle), self._tiles,
+                                        self._pool)
+        else:
+            _rotate_add(self._filtered_proj, angle, self._outarr,
+                        onlyreal=self.onlyreal,
+                        intp_method=self.intp_method,
+                        intp_order=self.intp_order, rotator=self._rotator)
@@ -1,13 +1,207 @@
 """2D backpropagation algorithm"""
+import ctypes
+import multiprocessing as mp
+
 import numpy as np
 import scipy.ndimage
 
+from . import _fft
+from . import _preview
+from . import _resources
+from . import _rotation
 from . import util
 
 
+#: Shared output array and keyword arguments of the worker processes
+#: of the parallel backpropagation (see :func:`_backpropagate_init`)
+_block_array = None
+_block_kwargs = None
+
+#: Minimum number of pixel updates (angles times rows times N²) for
+#: which the backpropagation is distributed among worker processes;
+#: Smaller problems are computed in the calling process, because
+#: starting the processes would take longer than the computation.
+PARALLEL_MIN_SIZE = 2**24
+
+
+def _backpropagate_angles(indices, outarr, projection, filter2, angles,
+                          ln, padl, onlyreal, intp_method, intp_order,
+                          lN=None, real_input=False, chunk_size=1,
+                          row_chunk=1, threads=1, count=None):
+    """Backpropagate filtered projections and add them to `outarr`
+
+    Parameters
+    ----------
+    indices: iterable of ints
+        Indices of the angles to backpropagate
+    outarr: (N, R, N) ndarray
+        Output array (real if `onlyreal` is set) for `R` independent
+        detector rows (the second axis); For `R=1`, this is a view
+        of the reconstructed image.
+    projection: (A, R, 1, lN) ndarray
+        Fourier transform of the sinogram multiplied with the
+        filter that does not depend on the distance
+    filter2: (N, lN) ndarray
+        Filter that depends on the distance
+    lN: int
+        Padded size of the sinogram
+    real_input: bool
+        If set, `projection` and `filter2` contain only the
+        non-negative frequencies (`lN//2+1` values) of a real-valued
+        sinogram and the filter (see :func:`_backpropagate_2d`)
+    angles: (A,) ndarray
+        Angles of the projections in radians
+    ln, padl: int
+        Size of the output and left padding of the sinogram
+    onlyreal: bool
+        Only compute the real part
+    intp_method: str
+        Rotation method ("rotate" or "fourier")
+    intp_order: int
+        Interpolation order for `intp_method="rotate"`
+    chunk_size: int
+        Number of angles that are filtered at once
+    row_chunk: int
+        Number of detector rows that are filtered and rotated at once
+    threads: int
+        Number of threads used by FFTW
+    count: multiprocessing.Value or None
+        Incremented by the number of rows after each angle
+    """
+    indices = np.asarray(indices, dtype=int)
+    lnr = projection.shape[1]
+    chunk_size = max(1, min(chunk_size, indices.size))
+    row_chunk = max(1, min(row_chunk, lnr))
+    # The inverse Fourier transforms of `chunk_size` angles are
+    # computed with a single (batched) FFTW plan.
+    inarr = _fft.empty_aligned((chunk_size, row_chunk) +
+                               filter2.shape, filter2.dtype)
+    if real_input:
+        # The real and imaginary parts of the filtered projections
+        # are computed with inverse real FFTs.
+        dtype = filter2.real.dtype
+        shape = (chunk_size, row_chunk, filter2.shape[0], lN)
+        outre = _fft.empty_aligned(shape, dtype)
+        ifft_plan = _fft.plan(inarr, outre, axes=(3,), threads=threads,
+                              direction="FFTW_BACKWARD",
+                              flags=["FFTW_ESTIMATE"])
+        if not onlyreal:
+            outim = _fft.empty_aligned(shape, dtype)
+            ifft_plan_im = _fft.plan(inarr, outim, axes=(3,),
+                                     threads=threads,
+                                     direction="FFTW_BACKWARD",
+                                     flags=["FFTW_ESTIMATE"])
+    else:
+        ifft_plan = _fft.plan(inarr, inarr, axes=(3,), threads=threads,
+                              direction="FFTW_BACKWARD",
+                              flags=["FFTW_ESTIMATE"])
+
+    # The Fourier rotators are created once for each block size.
+    rotators = {}
+
+    # Calculate backpropagations
+    for r0 in range(0, lnr, row_chunk):
+        rows = slice(r0, min(r0 + row_chunk, lnr))
+        nrows = rows.stop - rows.start
+        if intp_method == "fourier" and nrows not in rotators:
+            rotators[nrows] = _rotation.FourierRotator(
+                (ln, nrows, ln), filter2.dtype, num_cores=threads)
+        for c0 in range(0, indices.size, chunk_size):
+            chunk = indices[c0:c0 + chunk_size]
+            if chunk.size < chunk_size or nrows < row_chunk:
+                # do not transform stale data of the previous chunk
+                inarr[chunk.size:] = 0
+                inarr[:, nrows:] = 0
+            # Filter all projections of the chunk at once
+            # (The normalization of the inverse FFT is included
+            # in `projection`.)
+            if real_input:
+                np.multiply(projection[chunk, rows], filter2.real,
+                            out=inarr[:chunk.size, :nrows])
+                ifft_plan.execute()
+                sinos = outre[:chunk.size, :nrows, :, padl:padl + ln]
+                if not onlyreal:
+                    np.multiply(projection[chunk, rows], filter2.imag,
+                                out=inarr[:chunk.size, :nrows])
+                    ifft_plan_im.execute()
+                    sinos = sinos + 1j * outim[:chunk.size, :nrows, :,
+                                               padl:padl + ln]
+            else:
+                np.multiply(projection[chunk, rows], filter2,
+                            out=inarr[:chunk.size, :nrows])
+                ifft_plan.execute()
+                # Resize filtered sinograms back to original size
+                # (without copying them out of the FFT buffer)
+                sinos = inarr[:chunk.size, :nrows, :, padl:padl + ln]
+            for i, sino in zip(chunk, sinos):
+                _rotate_add(sino.transpose(1, 0, 2), angles[i],
+                            outarr[:, rows], onlyreal=onlyreal,
+                            intp_method=intp_method, intp_order=intp_order,
+                            rotator=rotators.get(nrows))
+                if count is not None:
+                    _resources.increment(count, nrows)
+
+
+def _rotate_add(sino, angle, outarr, onlyreal, intp_method, intp_order,
+                rotator=None):
+    """Rotate filtered projections about the y-axis and add to `outarr`"""
+    if intp_method == "fourier":
+        rotator.rotate_add(sino, -angle * 180 / np.pi, outarr)
+    else:
+        rotated_projr = scipy.ndimage.interpolation.rotate(
+            sino.real, -angle * 180 / np.pi,
+            reshape=False, mode="constant", cval=0,
+            order=intp_order, axes=(0, 2))
+        # Append results
+
+        outarr += rotated_projr
+
+        if not onlyreal:
+            outarr += 1j * scipy.ndimage.interpolation.rotate(
+                sino.imag, -angle * 180 / np.pi,
+                reshape=False, mode="constant", cval=0,
+                order=intp_order, axes=(0, 2))
+
+
+def _backpropagate_init(shared_array_base, shape, outdtype, kwargs):
+    """Initialize a worker process of the parallel backpropagation
+
+    The shared output array and the keyword arguments of
+    :func:`_backpropagate_angles` are passed to the workers when
+    they are started, such that concurrent reconstructions (e.g.
+    in different threads) do not share any data.
+    """
+    global _block_array, _block_kwargs
+    _block_array = np.ctypeslib.as_array(shared_array_base.get_obj())
+    _block_array = _block_array.view(outdtype).reshape(shape)
+    _block_kwargs = kwargs
+
+
+def _backpropagate_block(d):
+    """Backpropagate a block of angles and rows into a partial volume
+
+    The partial volume with the index `slot` is located in the
+    shared array of the worker (see :func:`_backpropagate_init`).
+    The progress counter `count` (a :class:`multiprocessing.Value`)
+    is incremented for each angle.
+    """
+    (slot, amin, amax, rmin, rmax) = d
+    kwargs = dict(_block_kwargs)
+    kwargs["projection"] = kwargs["projection"][:, rmin:rmax]
+    outarr = _block_array[slot, rmin:rmax].transpose(1, 0, 2)
+    _backpropagate_angles(indices=range(amin, amax), outarr=outarr,
+                          **kwargs)
+
+
+@_preview.with_preview
+@_resources.with_resources
 def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
                      weight_angles=True,
                      onlyreal=False, padding=True, padval=0,
+                     pad_strategy="pow2", intp_order=3,
+                     intp_method="rotate", dtype=None,
+                     chunk_size=None, num_cores=None,
+                     preview=1, preview_angles=1,
                      count=None, max_count=None, verbose=0):
     """2D backpropagation with the Fourier diffraction theorem
 
@@ -50,6 +244,9 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
         :math:`u_{\mathrm{B}, \phi_j}(x_\mathrm{D})`
         divided by the incident plane wave :math:`u_0(l_\mathrm{D})`
         measured at the detector.
+        If `uSin` is real-valued (e.g. phase data), real-to-complex
+        Fourier transforms are used, which halves the cost of the
+        forward transform and the memory of the filtered spectrum.
     angles: (A,) ndarray
         Angular positions :math:`\phi_j` of `uSin` in radians.
     res: float
@@ -87,6 +284,74 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
         case, this value should be a multiple of 2πi.
         If `padval` is `None`, then the edge values are used for
         padding (see documentation of :func:`numpy.pad`).
+    pad_strategy: str
+        How the padded size is chosen (if `padding` is set).
+
+        - "pow2": second next power of two (at least 64)
+        - "smooth": smallest integer of the form
+          :math:`2^a 3^b 5^c 7^d` that is larger than 2.1 times
+          the input size (at least 64). This reduces memory usage
+          and computation time of the filtering stage.
+
+        .. versionadded:: 0.3.0
+    intp_order: int between 0 and 5
+        Order of the interpolation for rotation.
+        See :func:`scipy.ndimage.interpolation.rotate` for details.
+
+        .. versionadded:: 0.3.0
+    intp_method: str
+        Method used for rotating the filtered projections.
+
+        - "rotate": rotate real and imaginary part of each filtered
+          projection with :func:`scipy.ndimage.interpolation.rotate`.
+        - "fourier": rotation by three-pass Fourier shears using
+          FFTW. This is an (up to boundary effects) exact
+          interpolation of the band-limited filtered projections
+          and real and imaginary parts are rotated in one pass.
+
+        .. versionadded:: 0.3.0
+    dtype: dtype object or argument for :func:`numpy.dtype`
+        The data type that is used for calculations (float or double).
+        Defaults to `numpy.float_`.
+
+        .. versionadded:: 0.3.0
+    chunk_size: int or None
+        Number of projections that are filtered at once. The
+        filtered projections of a chunk are computed with a single
+        batched inverse Fourier transform which requires a buffer of
+        `chunk_size` times `N` times the padded size of the sinogram.
+        If set to `None`, the chunk size is chosen such that this
+        buffer does not exceed 32MB.
+
+        .. versionadded:: 0.3.0
+    num_cores: int or None
+        The number of cores to use for parallel operations. For
+        large problems (see `PARALLEL_MIN_SIZE`), the angles are
+        distributed among `num_cores` processes, each of which
+        backpropagates its angles into a partial image. The partial
+        images are summed at the end. Small problems are computed
+        in the calling process with `num_cores` FFT threads. This
+        value defaults to the number of cores set with
+        :func:`odtbrain.resource_context` (all cores of the system
+        outside of such a context).
+
+        .. versionadded:: 0.3.0
+    preview: int
+        Reconstruct a preview on a grid that is coarser by this
+        factor, i.e. the output has the shape (N/preview, N/preview).
+        The projections are downsampled by cropping their Fourier
+        spectrum (an ideal low-pass filter) and the same filtering
+        and backpropagation steps are performed on the coarse grid.
+        For large images, the computation time decreases by about
+        `preview**2`. The values of the object function are given
+        in the units of the original pixels.
+
+        .. versionadded:: 0.3.0
+    preview_angles: int
+        Only use every `preview_angles`-th angle for a preview,
+        which reduces the computation time by this factor.
+
+        .. versionadded:: 0.3.0
     count, max_count: multiprocessing.Value or `None`
         Can be used to monitor the progress of the algorithm.
         Initially, the value of `max_count.value` is incremented
@@ -119,23 +384,142 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
     approximation - the propagation is not correctly described.
     Instead, numerically refocus the sinogram prior to converting
     it to Rytov data (using e.g. :func:`odtbrain.sinogram_as_rytov`)
-    with a numerical focusing algorithm (available in the Python
-    package :py:mod:`nrefocus`).
+    with :func:`odtbrain.refocus_sinogram` (or with the numerical
+    focusing algorithms of the Python package :py:mod:`nrefocus`).
+    """
+    assert len(uSin.shape) == 2, "Input data `uB` must have shape (A,N)!"
+    f = _backpropagate_2d(uSin[:, np.newaxis, :], angles, res=res, nm=nm,
+                          lD=lD, coords=coords,
+                          weight_angles=weight_angles,
+                          onlyreal=onlyreal, padding=padding,
+                          padval=padval, pad_strategy=pad_strategy,
+                          intp_order=intp_order,
+                          intp_method=intp_method, dtype=dtype,
+                          chunk_size=chunk_size, num_cores=num_cores,
+                          count=count, max_count=max_count,
+                          verbose=verbose)
+    return f[0]
+
+
+@_resources.with_resources
+def backpropagate_2d_stack(uSin, angles, res, nm, lD=0,
+                           weight_angles=True, onlyreal=False,
+                           padding=True, padval=0, pad_strategy="pow2",
+                           intp_order=3,
+                           intp_method="rotate", dtype=None,
+                           chunk_size=None, num_cores=None,
+                           count=None, max_count=None, verbose=0):
+    """2D backpropagation of a stack of independent detector rows
+
+    Reconstructs each detector row `uSin[:, y, :]` of a 3D sinogram
+    independently with the 2D backpropagation algorithm (see
+    :func:`backpropagate_2d`). This is useful for objects with
+    cylindrical symmetry about the rotation axis (e.g. fibers),
+    where a full 3D reconstruction is not necessary.
+
+    In contrast to calling :func:`backpropagate_2d` for each row,
+    the filters are computed only once, the filtered projections
+    of several rows are computed with one batched Fourier transform
+    and rotated at once, and the rows are distributed among
+    `num_cores` processes that write to a shared output volume.
+
+    Parameters
+    ----------
+    uSin: (A,Ny,Nx) ndarray
+        Stack of two-dimensional sinograms; The second axis is
+        the detector row.
+    angles: (A,) ndarray
+        Angular positions :math:`\phi_j` of `uSin` in radians.
+    res, nm, lD, weight_angles, onlyreal, padding, padval, pad_strategy:
+        See :func:`backpropagate_2d`.
+    intp_order, intp_method, dtype, chunk_size:
+        See :func:`backpropagate_2d`.
+    num_cores: int or None
+        The number of cores to use for parallel operations. If there
+        are at least as many rows as cores, the rows are distributed
+        among the processes. Otherwise, the angles are distributed
+        as in :func:`backpropagate_2d`. Small stacks are computed in
+        the calling process (see :func:`backpropagate_2d`). This
+        value defaults to the number of cores set with
+        :func:`odtbrain.resource_context`.
+    count, max_count: multiprocessing.Value or `None`
+        Can be used to monitor the progress of the algorithm.
+        Initially, the value of `max_count.value` is incremented
+        by the total number of steps. At each step, the value
+        of `count.value` is incremented.
+    verbose: int
+        Increment to increase verbosity.
+
+    Returns
+    -------
+    f: ndarray of shape (Ny,Nx,Nx), complex if `onlyreal` is `False`
+        Reconstructed object functions; `f[y]` is the reconstruction
+        of the detector row `uSin[:, y, :]`.
+
+    See Also
+    --------
+    backpropagate_2d: reconstruction of a single 2D sinogram
+    fourier_map_2d_stack: stack reconstruction by Fourier mapping
+
+    Notes
+    -----
+    .. versionadded:: 0.3.0
+    """
+    assert len(uSin.shape) == 3, "Input data `uB` must have shape (A,Ny,Nx)!"
+    return _backpropagate_2d(uSin, angles, res=res, nm=nm, lD=lD,
+                             weight_angles=weight_angles,
+                             onlyreal=onlyreal, padding=padding,
+                             padval=padval, pad_strategy=pad_strategy,
+                             intp_order=intp_order,
+                             intp_method=intp_method, dtype=dtype,
+                             chunk_size=chunk_size, num_cores=num_cores,
+                             count=count, max_count=max_count,
+                             verbose=verbose)
+
+
+def _backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
+                      weight_angles=True, onlyreal=False, padding=True,
+                      padval=0, pad_strategy="pow2", intp_order=3,
+                      intp_method="rotate",
+                      dtype=None, chunk_size=None, num_cores=None,
+                      count=None, max_count=None, verbose=0):
+    """2D backpropagation of the detector rows of a (A,R,N) sinogram
+
+    Returns an array of shape (R,N,N). See :func:`backpropagate_2d`
+    for a description of the parameters.
     """
-    ##
-    ##
-    # TODO:
-    # - combine the 2nd filter and the rotation in the for loop
-    # to save memory. However, memory is not a big issue in 2D.
-    ##
-    ##
     A = angles.shape[0]
+    # number of independent detector rows
+    lnr = uSin.shape[1]
     if max_count is not None:
-        max_count.value += A + 2
+        max_count.value += A * lnr + 2
     # Check input data
-    assert len(uSin.shape) == 2, "Input data `uB` must have shape (A,N)!"
     assert len(uSin) == A, "`len(angles)` must be  equal to `len(uSin)`!"
 
+    assert intp_method in ["rotate", "fourier"], \
+        "`intp_method` must be 'rotate' or 'fourier'."
+
+    # check for dtype
+    if dtype is None:
+        dtype = np.float_
+    dtype = np.dtype(dtype)
+    assert dtype.name in ["float32",
+                          "float64"], "dtype must be float32 or float64!"
+
+    if num_cores is None:
+        num_cores = _resources.get_num_cores()
+    ncores = mp.cpu_count()
+    assert num_cores <= ncores, "`num_cores` must not exceed number " +\
+                                "of physical cores: {}".format(ncores)
+
+    dtype_complex = np.dtype("complex{}".format(
+        2 * int(dtype.name.strip("float"))))
+
+    # set ctype
+    ct_dt_map = {np.dtype(np.float32): ctypes.c_float,
+                 np.dtype(np.float64): ctypes.c_double
+                 }
+
     if coords is not None:
         raise NotImplementedError("Output coordinates cannot yet be set " +
                                   + "for the 2D backrpopagation algorithm.")
@@ -159,19 +543,19 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
 
     # Perform weighting
     if weight_angles:
-        weights = util.compute_angle_weights_1d(angles).reshape(-1, 1)
+        weights = util.compute_angle_weights_1d(angles).reshape(-1, 1, 1)
         sinogram = uSin * weights
     else:
         sinogram = uSin
 
     # Size of the input data
-    ln = sinogram.shape[1]
+    ln = sinogram.shape[2]
 
     # We perform padding before performing the Fourier transform.
     # This gets rid of artifacts due to false periodicity and also
     # speeds up Fourier transforms of the input image size is not
     # a power of 2.
-    order = max(64., 2**np.ceil(np.log(ln * 2.1) / np.log(2)))
+    order = util.compute_padded_size(ln, 2.1, strategy=pad_strategy)
 
     if padding:
         pad = order - ln
@@ -182,19 +566,19 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
     padr = np.int(pad - padl)
 
     if padval is None:
-        sino = np.pad(sinogram, ((0, 0), (padl, padr)),
+        sino = np.pad(sinogram, ((0, 0), (0, 0), (padl, padr)),
                       mode="edge")
         if verbose > 0:
             print("......Padding with edge values.")
     else:
-        sino = np.pad(sinogram, ((0, 0), (padl, padr)),
+        sino = np.pad(sinogram, ((0, 0), (0, 0), (padl, padr)),
                       mode="linear_ramp",
                       end_values=(padval,))
         if verbose > 0:
             print("......Verifying padding value: {}".format(padval))
 
     # zero-padded length of sinogram.
-    lN = sino.shape[1]
+    lN = sino.shape[2]
 
     # Ask for the filter. Do not include zero (first element).
     #
@@ -260,8 +644,40 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
     # to take into account that we have a scattered
     # wave that is normalized by u0.
     prefactor *= np.exp(-1j * km * (M-1) * lD)
+
+    # Real-valued sinograms (e.g. phase data): Both filters depend
+    # on kx only via |kx| and kx², i.e. they are even functions of kx.
+    # Thus, the real and imaginary parts of the filtered projections
+    # are the inverse real FFTs of the non-negative half of the
+    # spectrum multiplied with the real and imaginary parts of the
+    # filter, respectively.
+    real_input = not np.iscomplexobj(sino)
+
     # Perform filtering of the sinogram
-    projection = np.fft.fft(sino, axis=-1) * prefactor
+    # (normalization of the inverse FFTW included)
+    if real_input:
+        lNh = lN // 2 + 1
+        kx = kx[:, :lNh]
+        M = M[:, :lNh]
+        sino_real = _fft.empty_aligned(sino.shape, dtype)
+        projection = _fft.empty_aligned(sino.shape[:2] + (lNh,), dtype_complex)
+        fft_plan = _fft.plan(sino_real, projection, axes=(2,),
+                             threads=num_cores, flags=["FFTW_ESTIMATE"])
+        sino_real[:] = sino
+        fft_plan.execute()
+        del sino_real
+        # The complex phase of the prefactor is included in filter2.
+        projection *= np.abs(prefactor[:, :lNh]) / lN
+        prefactor = -1j * np.exp(-1j * km * (M-1) * lD)
+    else:
+        lNh = lN
+        projection = _fft.empty_aligned(sino.shape,
+                                        dtype_complex)
+        fft_plan = _fft.plan(projection, projection, axes=(2,),
+                             threads=num_cores, flags=["FFTW_ESTIMATE"])
+        projection[:] = sino
+        fft_plan.execute()
+        projection *= prefactor / lN
 
     #
     # filter (2) must be applied before rotation as well
@@ -281,46 +697,109 @@ def backpropagate_2d(uSin, angles, res, nm, lD=0, coords=None,
     center = ln / 2.0
     x = np.arange(lN) - center + .5
     # Meshgrid for output array
-    yv = x.reshape(-1, 1)
+    # (only the first `ln` rows of the filtered projection are
+    # used, the padded rows are cropped)
+    yv = x[:ln].reshape(-1, 1)
 
     Mp = M.reshape(1, -1)
-    filter2 = np.exp(1j * yv * km * (Mp - 1))  # .reshape(1,lN,lN)
+    filter2 = np.exp(1j * yv * km * (Mp - 1))  # .reshape(1,ln,lN)
+    if real_input:
+        filter2 *= prefactor
+    filter2 = filter2.astype(dtype_complex)
 
-    projection = projection.reshape(A, 1, lN)  # * filter2
+    projection = projection.reshape(A, lnr, 1, lNh)  # * filter2
 
     # Prepare complex output image
     if onlyreal:
-        outarr = np.zeros((ln, ln))
+        outdtype = dtype
     else:
-        outarr = np.zeros((ln, ln), dtype=np.dtype(complex))
+        outdtype = dtype_complex
 
     if count is not None:
         count.value += 1
 
-    # Calculate backpropagations
-    for i in np.arange(A):
-        # Create an interpolation object of the projection.
-
-        # interpolation of the rotated fourier transformed projection
-        # this is already tiled onto the entire image.
-        sino_filtered = np.fft.ifft(projection[i] * filter2, axis=-1)
-
-        # Resize filtered sinogram back to original size
-        sino = sino_filtered[:ln, padl:padl + ln]
-
-        rotated_projr = scipy.ndimage.interpolation.rotate(
-            sino.real, -angles[i] * 180 / np.pi,
-            reshape=False, mode="constant", cval=0)
-        # Append results
-
-        outarr += rotated_projr
-
-        if not onlyreal:
-            outarr += 1j * scipy.ndimage.interpolation.rotate(
-                sino.imag, -angles[i] * 180 / np.pi,
-                reshape=False, mode="constant", cval=0)
-
-        if count is not None:
-            count.value += 1
+    # Size of the FFT buffer for one angle and one row
+    nbytes = filter2.nbytes
+    # limit the size of the FFT buffer to 32MB
+    if chunk_size is None:
+        row_chunk = max(1, min(lnr, 2**25 // nbytes))
+        chunk_size = 2**25 // (nbytes * row_chunk)
+    else:
+        row_chunk = 2**25 // (nbytes * max(1, chunk_size))
+    chunk_size = max(1, chunk_size)
+    row_chunk = max(1, min(lnr, row_chunk))
+
+    kwargs = {"projection": projection,
+              "filter2": filter2,
+              "angles": angles,
+              "ln": ln,
+              "padl": padl,
+              "onlyreal": onlyreal,
+              "intp_method": intp_method,
+              "intp_order": intp_order,
+              "lN": lN,
+              "real_input": real_input,
+              "chunk_size": chunk_size,
+              "row_chunk": row_chunk}
+
+    if lnr >= num_cores:
+        # distribute the rows among the workers
+        nworkers = num_cores
+        nslots = 1
+        rbounds = np.linspace(0, lnr, nworkers + 1).astype(int)
+        targ_args = [(0, 0, A, rbounds[t], rbounds[t + 1])
+                     for t in range(nworkers)]
+    else:
+        # distribute the angles among the workers, each of which
+        # accumulates its projections in a separate partial volume
+        nworkers = min(num_cores, A)
+        nslots = nworkers
+        abounds = np.linspace(0, A, nworkers + 1).astype(int)
+        targ_args = [(t, abounds[t], abounds[t + 1], 0, lnr)
+                     for t in range(nworkers)]
+
+    if nworkers == 1 or A * lnr * ln**2 < PARALLEL_MIN_SIZE:
+        outarr = np.zeros((lnr, ln, ln), dtype=outdtype)
+        _backpropagate_angles(indices=range(A),
+                              outarr=outarr.transpose(1, 0, 2),
+                              threads=num_cores, count=count, **kwargs)
+    else:
+        nfloat = nslots * lnr * ln * ln * (1 if onlyreal else 2)
+        ctx = _resources.get_mp_context()
+        shared_array_base = ctx.Array(ct_dt_map[dtype], nfloat)
+        _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
+        _shared_array = _shared_array.view(outdtype)
+        _shared_array = _shared_array.reshape(nslots, lnr, ln, ln)
+
+        # The workers increment a shared counter of the same context,
+        # whose progress is passed on to `count`.
+        progress = ctx.Value("l", 0)
+        initargs = (shared_array_base, (nslots, lnr, ln, ln), outdtype,
+                    dict(kwargs, count=progress))
+        try:
+            with ctx.Pool(processes=nworkers,
+                          initializer=_backpropagate_init,
+                          initargs=initargs) as pool:
+                result = pool.map_async(_backpropagate_block, targ_args)
+                reported = 0
+                while True:
+                    result.wait(.1)
+                    # all increments are visible once the map is ready
+                    done = result.ready()
+                    value = progress.value
+                    if count is not None and value > reported:
+                        count.value += value - reported
+                        reported = value
+                    if done:
+                        break
+                result.get()
+
+            if nslots == 1:
+                outarr = _shared_array[0].copy()
+            else:
+                # sum partial volumes
+                outarr = np.sum(_shared_array, axis=0)
+        finally:
+            del _shared_array, shared_array_base, initargs
 
     return outarr
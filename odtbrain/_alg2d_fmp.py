@@ -1,6 +1,13 @@
 """2D Fourier mapping"""
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 import scipy.interpolate as intp
+import scipy.spatial
+
+from . import _fft
+from . import _resources
+from ._alg3d_bpp import _ncores
 
 
 def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
@@ -73,8 +80,91 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
     approximation - the propagation is not correctly described.
     Instead, numerically refocus the sinogram prior to converting
     it to Rytov data (using e.g. :func:`odtbrain.sinogram_as_rytov`)
-    with a numerical focusing algorithm (available in the Python
-    package :py:mod:`nrefocus`).
+    with :func:`odtbrain.refocus_sinogram` (or with the numerical
+    focusing algorithms of the Python package :py:mod:`nrefocus`).
+    """
+    assert len(uSin.shape) == 2, "Input data `uSin` must have shape (A,N)!"
+    f = _fourier_map_2d(uSin[:, np.newaxis, :], angles, res=res, nm=nm,
+                        lD=lD, semi_coverage=semi_coverage, coords=coords,
+                        num_cores=1, count=count, max_count=max_count,
+                        verbose=verbose)
+    return f[0]
+
+
+@_resources.with_resources
+def fourier_map_2d_stack(uSin, angles, res, nm, lD=0, semi_coverage=False,
+                         num_cores=None, count=None, max_count=None,
+                         verbose=0):
+    """2D Fourier mapping of a stack of independent detector rows
+
+    Reconstructs each detector row `uSin[:, y, :]` of a 3D sinogram
+    independently with the 2D Fourier mapping algorithm (see
+    :func:`fourier_map_2d`). This is useful for objects with
+    cylindrical symmetry about the rotation axis.
+
+    In contrast to calling :func:`fourier_map_2d` for each row, the
+    filters and the Delaunay triangulation of the scattered Fourier
+    data points (which do not depend on the row) are computed only
+    once. The interpolation of the rows is distributed among
+    `num_cores` threads that write to a shared output array.
+
+    Parameters
+    ----------
+    uSin: (A,Ny,Nx) ndarray
+        Stack of two-dimensional sinograms; The second axis is
+        the detector row.
+    angles: (A,) ndarray
+        Angular positions :math:`\phi_j` of `uSin` in radians.
+    res, nm, lD, semi_coverage:
+        See :func:`fourier_map_2d`.
+    num_cores: int or None
+        The number of threads used for interpolation. This value
+        defaults to the number of cores set with
+        :func:`odtbrain.resource_context`.
+    count, max_count: multiprocessing.Value or `None`
+        Can be used to monitor the progress of the algorithm.
+        Initially, the value of `max_count.value` is incremented
+        by the total number of steps. At each step, the value
+        of `count.value` is incremented.
+    verbose: int
+        Increment to increase verbosity.
+
+    Returns
+    -------
+    f: complex ndarray of shape (Ny,Nx,Nx)
+        Reconstructed object functions; `f[y]` is the reconstruction
+        of the detector row `uSin[:, y, :]`.
+
+    See Also
+    --------
+    fourier_map_2d: reconstruction of a single 2D sinogram
+    backpropagate_2d_stack: stack reconstruction by backpropagation
+
+    Notes
+    -----
+    .. versionadded:: 0.3.0
+    """
+    assert len(uSin.shape) == 3, \
+        "Input data `uSin` must have shape (A,Ny,Nx)!"
+    return _fourier_map_2d(uSin, angles, res=res, nm=nm, lD=lD,
+                           semi_coverage=semi_coverage,
+                           num_cores=num_cores, count=count,
+                           max_count=max_count, verbose=verbose)
+
+
+def _interpolate_rows(d):
+    """Interpolate a block of rows using a shared triangulation"""
+    (tri, values, xi, out) = d
+    out[:] = intp.LinearNDInterpolator(tri, values)(xi)
+
+
+def _fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
+                    coords=None, num_cores=_ncores, count=None,
+                    max_count=None, verbose=0):
+    """2D Fourier mapping of the detector rows of a (A,R,N) sinogram
+
+    Returns an array of shape (R,N,N). See :func:`fourier_map_2d`
+    for a description of the parameters.
     """
     ##
     ##
@@ -90,7 +180,6 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
     if max_count is not None:
         max_count.value += 4
     # Check input data
-    assert len(uSin.shape) == 2, "Input data `uSin` must have shape (A,N)!"
     assert len(uSin) == A, "`len(angles)` must be  equal to `len(uSin)`!"
 
     if coords is not None:
@@ -144,10 +233,10 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
     # This is not a big problem. We only need to multiply the imaginary
     # part of the scattered wave by -1.
 
-    UB = np.fft.fft(np.fft.ifftshift(uSin, axes=-1)) * np.sqrt(2 * np.pi)
+    UB = _fft.fft(np.fft.ifftshift(uSin, axes=-1)) * np.sqrt(2 * np.pi)
 
     # Corresponding sample frequencies
-    fx = np.fft.fftfreq(len(uSin[0]))  # 1D array
+    fx = np.fft.fftfreq(uSin.shape[-1])  # 1D array
 
     # kx is a 1D array.
     kx = 2 * np.pi * fx
@@ -219,7 +308,9 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
 
     Xf = krx.flatten()
     Yf = kry.flatten()
-    Zf = Fsin.flatten()
+    # one column for each detector row
+    lnr = uSin.shape[1]
+    Zf = Fsin.transpose(0, 2, 1).reshape(-1, lnr)
 
     # DEBUG: plot kry vs krx
     # from matplotlib import pylab as plt
@@ -232,7 +323,23 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
     # interpolation on grid with same resolution as input data
     kintp = np.fft.fftshift(kx.reshape(-1))
 
-    Fcomp = intp.griddata((Xf, Yf), Zf, (kintp[None, :], kintp[:, None]))
+    # The triangulation of the data points is the same for all rows
+    # (this is equivalent to `scipy.interpolate.griddata`).
+    tri = scipy.spatial.Delaunay(np.stack((Xf, Yf), axis=-1))
+    xi = np.stack(np.meshgrid(kintp, kintp), axis=-1)
+    Fcomp = np.zeros(xi.shape[:2] + (lnr,), dtype=Zf.dtype)
+    nthreads = max(1, min(num_cores, lnr))
+    bounds = np.linspace(0, lnr, nthreads + 1).astype(int)
+    targ_args = [(tri, Zf[:, bounds[t]:bounds[t + 1]], xi,
+                  Fcomp[:, :, bounds[t]:bounds[t + 1]])
+                 for t in range(nthreads)]
+    if nthreads == 1:
+        _interpolate_rows(targ_args[0])
+    else:
+        pool = ThreadPool(processes=nthreads)
+        pool.map(_interpolate_rows, targ_args)
+        pool.terminate()
+        pool.join()
 
     if count is not None:
         count.value += 1
@@ -246,9 +353,11 @@ def fourier_map_2d(uSin, angles, res, nm, lD=0, semi_coverage=False,
     # Fcomp[np.where(kinx**2+kiny**2<km)] = 0
 
     # Fcomp is centered at K = 0 due to the way we chose kintp/coords
-    f = np.fft.fftshift(np.fft.ifft2(np.fft.ifftshift(Fcomp)))
+    f = np.fft.fftshift(_fft.ifft(np.fft.ifftshift(Fcomp, axes=(0, 1)),
+                                  axes=(0, 1)),
+                        axes=(0, 1))
 
     if count is not None:
         count.value += 1
 
-    return f[::-1]
+    return f[::-1].transpose(2, 0, 1)
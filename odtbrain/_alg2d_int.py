@@ -1,6 +1,8 @@
 """2D slow integration"""
 import numpy as np
 
+from . import _fft
+
 
 def integrate_2d(uSin, angles, res, nm, lD=0, coords=None,
                  count=None, max_count=None, verbose=0):
@@ -71,8 +73,8 @@ def integrate_2d(uSin, angles, res, nm, lD=0, coords=None,
     approximation - the propagation is not correctly described.
     Instead, numerically refocus the sinogram prior to converting
     it to Rytov data (using e.g. :func:`odtbrain.sinogram_as_rytov`)
-    with a numerical focusing algorithm (available in the Python
-    package :py:mod:`nrefocus`).
+    with :func:`odtbrain.refocus_sinogram` (or with the numerical
+    focusing algorithms of the Python package :py:mod:`nrefocus`).
     """
     if coords is None:
         lx = uSin.shape[1]
@@ -208,7 +210,7 @@ def integrate_2d(uSin, angles, res, nm, lD=0, coords=None,
     # convention.
     # This is not a big problem. We only need to multiply the imaginary
     # part of the scattered wave by -1.
-    UB = np.fft.fft(np.fft.ifftshift(uSin, axes=-1)) / np.sqrt(2 * np.pi)
+    UB = _fft.fft(np.fft.ifftshift(uSin, axes=-1)) / np.sqrt(2 * np.pi)
     UBi = UB.reshape(len(angles), lenu0)
 
     if count is not None:
@@ -2,27 +2,37 @@
 import ctypes
 import gc
 import multiprocessing as mp
-import platform
+from multiprocessing.pool import ThreadPool
+import warnings
 
 import numexpr as ne
 import numpy as np
-import pyfftw
 import scipy.ndimage
 
-import odtbrain
-
+from . import _autotune
+from . import _checkpoint
+from . import _fft
+from . import _memory
+from . import _preview
+from . import _resources
+from . import _rotation
 from . import util
 
 _ncores = mp.cpu_count()
 
+#: Shared array and cancel token of the worker processes of _mprotate
+_rotate_array = None
+_rotate_cancel = None
+
 
 def _mprotate(ang, lny, pool, order):
     """Uses multiprocessing to wrap around _rotate
 
     4x speedup on an intel i7-3820 CPU @ 3.60GHz with 8 cores.
 
-    The function calls _rotate which accesses the
-    `odtbrain._shared_array`. Data is rotated in-place.
+    The function calls _rotate which accesses the shared array
+    that was passed to the worker processes of `pool` via
+    :func:`_rotate_init`. Data is rotated in-place.
 
     Parameters
     ----------
@@ -46,41 +56,64 @@ def _mprotate(ang, lny, pool, order):
             ymax = lny
         targ_args.append((ymin, ymax, ang, order))
 
-    if platform.system() == "Windows":
-        # Because Windows does not support forking,
-        # the subprocess does not have access to
-        # odtbrain._shared_array. We circumvent
-        # this problem by not using a pool.
-        # We could copy all the data instead and
-        # use a _rotate function that accepts the
-        # array as an argument.
-        for d in targ_args:
-            _rotate(d)
+    pool.map(_rotate, targ_args)
 
-    else:
-        pool.map(_rotate, targ_args)
+
+def _rotate_init(shared_array_base, shape, cancel):
+    """Initialize a worker process of the pool used by _mprotate
+
+    The shared array and the cancel token are passed to the workers
+    when they are started (this also works with the "spawn" start
+    method).
+    """
+    global _rotate_array, _rotate_cancel
+    _rotate_array = np.ctypeslib.as_array(
+        shared_array_base.get_obj()).reshape(shape)
+    _rotate_cancel = cancel
 
 
 def _rotate(d):
     (ymin, ymax, ang, order) = d
+    if _rotate_cancel is not None and _rotate_cancel.cancelled():
+        return
+    inarr = _rotate_array[:, ymin:ymax, :]
+    if order <= 1:
+        # For orders > 1, the spline filter creates a copy of the
+        # input. Without it, rotating in-place would read values
+        # that have already been overridden.
+        inarr = inarr.copy()
     return scipy.ndimage.interpolation.rotate(
-        odtbrain._shared_array[:, ymin:ymax, :],  # input
+        inarr,  # input
         angle=-ang,  # angle
         axes=(0, 2),  # axes
         reshape=False,  # reshape
-        output=odtbrain._shared_array[:, ymin:ymax, :],  # output
+        output=_rotate_array[:, ymin:ymax, :],  # output
         order=order,  # order
         mode="constant",  # mode
         cval=0)
 
 
+@_preview.with_preview
+@_autotune.with_autotune
+@_resources.with_resources
 def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
                      weight_angles=True, onlyreal=False,
-                     padding=(True, True), padfac=1.75, padval=None,
-                     intp_order=2, dtype=None,
-                     num_cores=_ncores,
+                     padding=(True, True), padfac=1.75,
+                     pad_strategy="pow2", padval=None,
+                     intp_order=2, intp_method="rotate", tile_size=32,
+                     dtype=None,
+                     num_cores=None,
                      save_memory=False,
+                     max_memory=None,
+                     prune_spectrum=False,
+                     fft_backend=None,
+                     preview=1, preview_angles=1,
                      copy=True,
+                     autotune=False,
+                     cancel=None,
+                     checkpoint=None,
+                     angle_order="acquisition",
+                     callback=None, callback_interval=10,
                      count=None, max_count=None,
                      verbose=0):
     """3D backpropagation
@@ -125,6 +158,9 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
         :math:`u_{\mathrm{B}, \phi_j}(x_\mathrm{D}, y_\mathrm{D})`
         divided by the incident plane wave :math:`u_0(l_\mathrm{D})`
         measured at the detector.
+        If `uSin` is real-valued (e.g. phase data), real-to-complex
+        Fourier transforms are used, which halves the cost of the
+        forward transform and the memory of the filtered spectrum.
     angles: (A,) ndarray
         Angular positions :math:`\phi_j` of `uSin` in radians.
     res: float
@@ -167,6 +203,19 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
         lead to a padded size of 512 for an initial size of 150.
         Values geater than 2 are allowed. This parameter may
         greatly increase memory usage!
+    pad_strategy: str
+        How the padded size is chosen (if `padding` is set).
+
+        - "pow2": next power of two of the size times `padfac`
+          (at least 64)
+        - "smooth": smallest integer of the form
+          :math:`2^a 3^b 5^c 7^d` that is larger than the size times
+          `padfac` (at least 64). For example, an initial size of
+          150 with `padfac=1.75` is padded to 270 instead of 512.
+          This reduces memory usage and computation time of the
+          filtering stage.
+
+        .. versionadded:: 0.3.0
     padval: float
         The value used for padding. This is important for the Rytov
         approximation, where an approximat zero in the phase might
@@ -177,23 +226,164 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     intp_order: int between 0 and 5
         Order of the interpolation for rotation.
         See :func:`scipy.ndimage.interpolation.rotate` for details.
+    intp_method: str
+        Method used for rotating the filtered projections about the
+        y-axis and adding them to the reconstruction volume.
+
+        - "rotate": rotate each filtered projection in parallel
+          slabs with :func:`scipy.ndimage.interpolation.rotate`
+          and add it to the output volume.
+        - "gather": voxel-driven kernel that, for each tile in the
+          x-z plane of the output volume, computes the source
+          coordinates analytically and gathers the linearly
+          interpolated values of all y-slices at once. This avoids
+          the intermediate rotated volume and processes real and
+          imaginary parts in one pass. The kernel always uses
+          linear interpolation (`intp_order` is ignored); the result
+          is identical (up to floating point accuracy) to
+          `intp_method="rotate"` with `intp_order=1`.
+        - "fourier": rotation by three-pass Fourier shears using
+          FFTW. This is an (up to boundary effects) exact
+          interpolation of the band-limited filtered projections
+          whose cost scales with the FFT and not with `intp_order`
+          (which is ignored). Real and imaginary parts are rotated
+          in one pass.
+
+        .. versionadded:: 0.3.0
+    tile_size: int
+        Edge length of the x-z tiles in pixels for
+        `intp_method="gather"`. The tiles are distributed among
+        `num_cores` threads. Smaller tiles keep the gathered
+        values in the CPU cache.
+
+        .. versionadded:: 0.3.0
     dtype: dtype object or argument for :func:`numpy.dtype`
         The data type that is used for calculations (float or double).
         Defaults to `numpy.float_`.
-    num_cores: int
+    num_cores: int or None
         The number of cores to use for parallel operations. This value
-        defaults to the number of cores on the system.
-    save_memory: bool
+        defaults to the number of cores set with
+        :func:`odtbrain.resource_context` (all cores of the system
+        outside of such a context). The numexpr and FFT threads
+        are limited accordingly during the reconstruction.
+    save_memory: bool or str
         Saves memory at the cost of longer computation time.
+        If set to "auto", memory is only saved if the estimated
+        peak memory (see :func:`estimate_memory_3d`) exceeds
+        `max_memory`.
 
         .. versionadded:: 0.1.5
 
+    max_memory: int or None
+        Memory budget in bytes for `save_memory="auto"`; Defaults
+        to the available physical memory.
+
+        .. versionadded:: 0.3.0
+
+    prune_spectrum: bool
+        Only store and process the part of the Fourier spectrum
+        within the bounding box of the low-pass filter
+        :math:`k_\mathrm{x}^2 + k_\mathrm{y}^2 < k_\mathrm{m}^2`.
+        The inverse Fourier transforms of the filtered projections
+        are computed in two stages, where only the nonzero columns
+        are transformed along y and only the rows that are not
+        cropped afterwards are transformed along x. The result
+        is identical, but memory usage and computation time of the
+        filtering stage decrease when the wavelength `res` is large
+        compared to the pixel size.
+
+        .. versionadded:: 0.3.0
+
+    fft_backend: str or None
+        FFT backend used for the reconstruction ("pyfftw", "scipy",
+        or "numpy"); Defaults to the backend set with
+        :func:`odtbrain._fft.set_backend`.
+
+        .. versionadded:: 0.3.0
+
+    preview: int
+        Reconstruct a preview on a grid that is coarser by this
+        factor, i.e. the output has the shape
+        (Nx/preview, Ny/preview, Nx/preview). The projections are
+        downsampled by cropping their Fourier spectrum (an ideal
+        low-pass filter) and the same filtering and backpropagation
+        steps are performed on the coarse grid. For large volumes,
+        the computation time decreases by about `preview**3`. The
+        values of the object function are given in the units of the
+        original pixels.
+
+        .. versionadded:: 0.3.0
+
+    preview_angles: int
+        Only use every `preview_angles`-th angle for a preview,
+        which reduces the computation time of the backpropagation
+        by this factor.
+
+        .. versionadded:: 0.3.0
+
     copy: bool
         Copy input sinogram `uSin` for data processing. If `copy`
         is set to `False`, then `uSin` will be overridden.
 
         .. versionadded:: 0.1.5
 
+    autotune: bool or str
+        Use the fastest values of `num_cores`, `save_memory`,
+        `prune_spectrum`, `tile_size`, and of the FFT backend for
+        this host and sinogram shape (unless given explicitly). If
+        no configuration is stored for the shape, it is determined
+        with benchmarks on synthetic data first (see
+        :func:`autotune_3d`). If `autotune` is a string, it is used
+        as the path of the configuration file.
+
+        .. versionadded:: 0.3.0
+
+    cancel: odtbrain.CancelToken or None
+        Token that is checked before each angle and by the worker
+        processes. If it is cancelled (or its deadline has passed),
+        the reconstruction stops, releases the worker processes
+        and buffers, and either raises
+        :class:`odtbrain.ReconstructionCancelled` or returns the
+        partial sum of the angles backpropagated so far (see
+        :class:`odtbrain.CancelToken`).
+
+        .. versionadded:: 0.3.0
+
+    checkpoint: odtbrain.Checkpoint or None
+        Periodically store the accumulated volume and the number of
+        completed angles in a memory-mapped file. If the checkpoint
+        files already exist, the reconstruction resumes after the
+        completed angles (see :class:`odtbrain.Checkpoint`).
+
+        .. versionadded:: 0.3.0
+
+    angle_order: str
+        Order in which the angles are backpropagated (see
+        :func:`odtbrain.util.compute_angle_order`): "acquisition"
+        (the order of `angles`), "bitreversed", or "golden". With
+        the latter two, the partial sum covers the full angular
+        range early on, which is useful in combination with
+        `callback`.
+
+        .. versionadded:: 0.3.0
+
+    callback: callable or None
+        Function that is called every `callback_interval` angles
+        with the intermediate reconstruction and the number of
+        backpropagated angles, `callback(f, angles_done)`. The
+        intermediate reconstruction `f` is the partial sum of the
+        angles backpropagated so far rescaled by the ratio of the
+        sum of all angular weights to the sum of the weights of
+        these angles. To stop the reconstruction, cancel a
+        :class:`odtbrain.CancelToken` (see `cancel`) in `callback`.
+
+        .. versionadded:: 0.3.0
+
+    callback_interval: int
+        Number of angles between two calls of `callback`
+
+        .. versionadded:: 0.3.0
+
     count, max_count: multiprocessing.Value or `None`
         Can be used to monitor the progress of the algorithm.
         Initially, the value of `max_count.value` is incremented
@@ -223,11 +413,9 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     approximation - the propagation is not correctly described.
     Instead, numerically refocus the sinogram prior to converting
     it to Rytov data (using e.g. :func:`odtbrain.sinogram_as_rytov`)
-    with a numerical focusing algorithm (available in the Python
-    package :py:mod:`nrefocus`).
+    with :func:`odtbrain.refocus_sinogram` (or with the numerical
+    focusing algorithms of the Python package :py:mod:`nrefocus`).
     """
-    ne.set_num_threads(num_cores)
-
     if copy:
         uSin = uSin.copy()
 
@@ -245,8 +433,34 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
 
     assert num_cores <= _ncores, "`num_cores` must not exceed number " +\
                                  "of physical cores: {}".format(_ncores)
-
-    assert np.iscomplexobj(uSin), "uSin dtype must be complex128."
+    assert save_memory in [True, False, "auto"], \
+        "`save_memory` must be True, False, or 'auto'."
+
+    if save_memory == "auto":
+        # Choose the fastest setting that fits into memory.
+        if max_memory is None:
+            max_memory = _memory.available_memory()
+        mem_kwargs = {"shape": uSin.shape, "res": res, "nm": nm,
+                      "padding": padding, "padfac": padfac,
+                      "pad_strategy": pad_strategy,
+                      "intp_order": intp_order, "intp_method": intp_method,
+                      "tile_size": tile_size, "dtype": dtype,
+                      "sino_dtype": uSin.dtype, "onlyreal": onlyreal,
+                      "num_cores": num_cores,
+                      "prune_spectrum": prune_spectrum,
+                      "copy": copy}
+        for save_memory in [False, True]:
+            peak = _memory.estimate_memory_3d(save_memory=save_memory,
+                                              **mem_kwargs)["peak"]
+            if max_memory is None or peak <= max_memory:
+                break
+        else:
+            warnings.warn("Estimated peak memory ({:.0f} MB) exceeds "
+                          "`max_memory` ({:.0f} MB)!".format(
+                              peak / 1024**2, max_memory / 1024**2))
+        if verbose > 0:
+            print("......Estimated peak memory: {:.0f} MB, "
+                  "save_memory={}".format(peak / 1024**2, save_memory))
 
     dtype_complex = np.dtype("complex{}".format(
         2 * np.int(dtype.name.strip("float"))))
@@ -263,6 +477,8 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     assert np.array(padding).dtype is np.dtype(
         bool), "Parameter `padding` must be boolean tuple."
     assert coords is None, "Setting coordinates is not yet supported."
+    assert intp_method in ["rotate", "gather", "fourier"], \
+        "`intp_method` must be 'rotate', 'gather', or 'fourier'."
 
     # Cut-Off frequency
     # km [1/px]
@@ -300,8 +516,8 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     # a power of 2.
     # transpose so we can call resize correctly
 
-    orderx = max(64., 2**np.ceil(np.log(lnx * padfac) / np.log(2)))
-    ordery = max(64., 2**np.ceil(np.log(lny * padfac) / np.log(2)))
+    orderx = util.compute_padded_size(lnx, padfac, strategy=pad_strategy)
+    ordery = util.compute_padded_size(lny, padfac, strategy=pad_strategy)
 
     if padding[0]:
         padx = orderx - lnx
@@ -413,6 +629,23 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     # to take into account that we have a scattered
     # wave that is normalized by u0.
     prefactor *= np.exp(-1j * km * (M-1) * lD)
+
+    # Real-valued sinograms (e.g. phase data): Both filters depend
+    # on kx and ky only via |kx| and kx² + ky², i.e. they are even
+    # functions. Thus, the real and imaginary parts of the filtered
+    # projections are the inverse real FFTs of the non-negative half
+    # of the spectrum multiplied with the real and imaginary parts of
+    # the filter, respectively.
+    real_input = not np.iscomplexobj(sino)
+    if real_input:
+        lNxh = lNx // 2 + 1
+        M = M[:, :, :lNxh]
+        # The complex phase of the prefactor is included in filter2.
+        prefactor_abs = np.abs(prefactor[:, :, :lNxh])
+        prefactor = -1j * np.exp(-1j * km * (M-1) * lD)
+    else:
+        lNxh = lNx
+
     # Perform filtering of the sinogram,
     # save memory by in-place operations
     # projection = np.fft.fft2(sino, axes=(-1,-2)) * prefactor
@@ -422,29 +655,72 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     #   sub-optimal) plan quickly. With this flag, the input/output
     #   arrays are not overwritten during planning.
 
-    # Byte-aligned arrays
-    temp_array = pyfftw.n_byte_align_empty(sino[0].shape, 16, dtype_complex)
+    if real_input:
+        # Byte-aligned arrays
+        temp_array = _fft.empty_aligned(sino[0].shape, dtype)
+        temp_out = _fft.empty_aligned((lNy, lNxh),
+                                      dtype_complex)
+        myfftw_plan = _fft.plan(temp_array, temp_out, threads=num_cores,
+                                flags=["FFTW_ESTIMATE"], axes=(0, 1),
+                                backend=fft_backend)
 
-    myfftw_plan = pyfftw.FFTW(temp_array, temp_array, threads=num_cores,
-                              flags=["FFTW_ESTIMATE"], axes=(0, 1))
+        if count is not None:
+            count.value += 1
 
-    if count is not None:
-        count.value += 1
+        projection = np.zeros((la, lNy, lNxh), dtype=dtype_complex)
+        for p in range(len(sino)):
+            temp_array[:] = sino[p, :, :]
+            myfftw_plan.execute()
+            projection[p, :, :] = temp_out[:]
 
-    for p in range(len(sino)):
-        # this overwrites sino
-        temp_array[:] = sino[p, :, :]
-        myfftw_plan.execute()
-        sino[p, :, :] = temp_array[:]
+        del temp_array, temp_out, myfftw_plan, sino
 
-    temp_array, myfftw_plan
+        # - normalize to (lNx * lNy) for FFTW
+        projection[:] *= prefactor_abs / (lNx * lNy)
+        del prefactor_abs
+    else:
+        # Byte-aligned arrays
+        temp_array = _fft.empty_aligned(sino[0].shape,
+                                        dtype_complex)
 
-    projection = sino
-    # - normalize to (lNx * lNy) for FFTW
-    projection[:] *= prefactor / (lNx * lNy)
+        myfftw_plan = _fft.plan(temp_array, temp_array,
+                                threads=num_cores,
+                                flags=["FFTW_ESTIMATE"], axes=(0, 1),
+                                backend=fft_backend)
+
+        if count is not None:
+            count.value += 1
+
+        for p in range(len(sino)):
+            # this overwrites sino
+            temp_array[:] = sino[p, :, :]
+            myfftw_plan.execute()
+            sino[p, :, :] = temp_array[:]
+
+        temp_array, myfftw_plan
+
+        projection = sino
+        del sino
+        # - normalize to (lNx * lNy) for FFTW
+        projection[:] *= prefactor / (lNx * lNy)
 
     # save memory
-    del prefactor, filter_klp
+    del filter_klp
+
+    if prune_spectrum:
+        # Only keep the bounding box of the low-pass filter.
+        rows = np.where(ky.flatten()**2 < km**2)[0]
+        cols = np.where(kx.flatten()[:lNxh]**2 < km**2)[0]
+        projection = projection[:, rows][:, :, cols]
+        M = M[:, rows][:, :, cols]
+        if real_input:
+            prefactor = prefactor[:, rows][:, :, cols]
+        (lNyb, lNxb) = (rows.size, cols.size)
+        if verbose > 0:
+            print("......Pruned spectrum size (x,y): {}x{}".format(
+                lNxb, lNyb))
+    else:
+        (lNyb, lNxb) = (lNy, lNxh)
     #
     #
     # filter (2) must be applied before rotation as well
@@ -468,17 +744,23 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     zv = z.reshape(-1, 1, 1)
 
     #              z, y, x
-    Mp = M.reshape(lNy, lNx)
+    Mp = M.reshape(lNyb, lNxb)
 
     # filter2 = np.exp(1j * zv * km * (Mp - 1))
     f2_exp_fac = 1j * km * (Mp - 1)
+    if real_input:
+        f2_pre_fac = prefactor.reshape(lNyb, lNxb)
+    else:
+        f2_pre_fac = 1
+    del prefactor
     if save_memory:
         # compute filter2 later
         pass
     else:
         # compute filter2 now
-        filter2 = ne.evaluate("exp(factor * zv)",
+        filter2 = ne.evaluate("prefac * exp(factor * zv)",
                               local_dict={"factor": f2_exp_fac,
+                                          "prefac": f2_pre_fac,
                                           "zv": zv})
         # occupies some amount of ram, but yields faster
         # computation later
@@ -489,7 +771,7 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
 
     #                                  a, z, y,  x
     # projection = projection.reshape(la, 1, lNy, lNx)
-    projection = projection.reshape(la, lNy, lNx)
+    projection = projection.reshape(la, lNyb, lNxb)
 
     # This frees comparatively few data
     del M
@@ -501,7 +783,7 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
         outarr = np.zeros((ln, lny, lnx), dtype=dtype_complex)
 
     # Create plan for fftw:
-    inarr = pyfftw.n_byte_align_empty((lNy, lNx), 16, dtype_complex)
+    inarr = _fft.empty_aligned((lNyb, lNxb), dtype_complex)
     # inarr[:] = (projection[0]*filter2)[0,:,:]
     # plan is "patient":
     #    FFTW_PATIENT is like FFTW_MEASURE, but considers a wider range
@@ -511,86 +793,210 @@ def backpropagate_3d(uSin, angles, res, nm, lD=0, coords=None,
     #    transforms).
     # print(inarr.flags)
 
-    myifftw_plan = pyfftw.FFTW(inarr, inarr, threads=num_cores,
-                               axes=(0, 1),
-                               direction="FFTW_BACKWARD",
-                               flags=["FFTW_MEASURE"])
-
-    # assert shared_array.base.base is shared_array_base.get_obj()
-    shared_array_base = mp.Array(ct_dt_map[dtype], ln * lny * lnx)
-    _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
-    _shared_array = _shared_array.reshape(ln, lny, lnx)
-
-    # Initialize the pool with the shared array
-    odtbrain._shared_array = _shared_array
-    pool4loop = mp.Pool(processes=num_cores)
-
-    # filtered projections in loop
-    filtered_proj = np.zeros((ln, lny, lnx), dtype=dtype_complex)
-
-    for aa in np.arange(A):
-        # 14x Speedup with fftw3 compared to numpy fft and
-        # memory reduction by a factor of 2!
-        # ifft will be computed in-place
-
-        # A == la
-        # projection.shape == (A, lNx, lNy)
-        # filter2.shape == (ln, lNx, lNy)
-        for p in range(len(zv)):
-            if save_memory:
-                # compute filter2 here;
-                # this is comparatively slower than the other case
-                ne.evaluate("exp(factor * zvp) * projectioni",
-                            local_dict={"zvp": zv[p],
-                                        "projectioni": projection[aa],
-                                        "factor": f2_exp_fac},
-                            out=inarr)
+    if real_input:
+        # real and imaginary parts are computed consecutively
+        parts = ["real"] if onlyreal else ["real", "imag"]
+    else:
+        parts = [None]
+    if prune_spectrum:
+        crop = (slice(padyl, padyl + lny), slice(padxl, padxl + lnx))
+        pruned_ifft = _fft.PrunedIFFT2((lNy, lNx), rows, cols, crop,
+                                       dtype_complex,
+                                       real_output=real_input,
+                                       num_cores=num_cores,
+                                       backend=fft_backend)
+    else:
+        if real_input:
+            outarr_fft = _fft.empty_aligned((lNy, lNx), dtype)
+        else:
+            outarr_fft = inarr
+        myifftw_plan = _fft.plan(inarr, outarr_fft, threads=num_cores,
+                                 axes=(0, 1),
+                                 direction="FFTW_BACKWARD",
+                                 flags=["FFTW_MEASURE"],
+                                 backend=fft_backend)
+
+    pool4loop = None
+    shared_array_base = _shared_array = None
+    try:
+        if intp_method == "gather":
+            # The tiles of the output volume are processed by threads
+            # that share `outarr`.
+            tiles = _rotation.get_tiles(ln, lnx, tile_size)
+            pool4loop = ThreadPool(processes=num_cores)
+            # filtered projections in loop (y is the last axis, such that
+            # the gathered rows are contiguous in memory)
+            filtered_proj = np.zeros((ln, lnx, lny), dtype=dtype_complex)
+        elif intp_method == "fourier":
+            # FFTW is already multi-threaded
+            pool4loop = None
+            rotator = _rotation.FourierRotator((ln, lny, lnx), dtype_complex,
+                                               num_cores=num_cores,
+                                               backend=fft_backend)
+            # filtered projections in loop
+            filtered_proj = np.zeros((ln, lny, lnx), dtype=dtype_complex)
+        else:
+            # assert shared_array.base.base is shared_array_base.get_obj()
+            ctx = _resources.get_mp_context()
+            shared_array_base = ctx.Array(ct_dt_map[dtype], ln * lny * lnx)
+            _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
+            _shared_array = _shared_array.reshape(ln, lny, lnx)
+
+            # The workers access the shared array and the cancel token
+            # via the pool initializer. The event of the cancel token
+            # belongs to the default context; Workers started by another
+            # context only stop after the current angle.
+            if ctx is mp.get_context():
+                worker_cancel = cancel
             else:
-                # use universal functions
-                np.multiply(filter2[p], projection[aa], out=inarr)
-            myifftw_plan.execute()
-            filtered_proj[p, :, :] = inarr[
-                padyl:padyl + lny,
-                padxl:padxl + lnx
-            ]
-
-        # resize image to original size
-        # The copy is necessary to prevent memory leakage.
-        # The fftw did not normalize the data.
-        # _shared_array[:] = sino_filtered.real[:ln, :lny, :lnx] / (lNx * lNy)
-        # By performing the "/" operation here, we magically use less
-        # memory and we gain speed...
-        _shared_array[:] = filtered_proj.real
-        # _shared_array[:] = sino_filtered.real[:ln,
-        #                                       padyl:padyl+lny,
-        #                                       padxl:padxl+lnx] / (lNx * lNy)
-
-        phi0 = np.rad2deg(angles[aa])
-
-        if not onlyreal:
-            filtered_proj_imag = filtered_proj.imag
-
-        _mprotate(phi0, lny, pool4loop, intp_order)
-
-        outarr.real += _shared_array
-
-        if not onlyreal:
-            _shared_array[:] = filtered_proj_imag
-            # _shared_array[:] = sino_filtered_imag[
-            #    :ln, :lny, :lnx] / (lNx * lNy)
-            del filtered_proj_imag
-            _mprotate(phi0, lny, pool4loop, intp_order)
-            outarr.imag += _shared_array
-
-        if count is not None:
-            count.value += 1
-
-    pool4loop.terminate()
-    pool4loop.join()
-
-    del _shared_array, inarr, odtbrain._shared_array
-    del shared_array_base
+                worker_cancel = None
+            pool4loop = ctx.Pool(processes=num_cores,
+                                 initializer=_rotate_init,
+                                 initargs=(shared_array_base, (ln, lny, lnx),
+                                           worker_cancel))
+
+            # filtered projections in loop
+            filtered_proj = np.zeros((ln, lny, lnx), dtype=dtype_complex)
+
+        angles_done = 0
+        if checkpoint is not None:
+            key = _checkpoint.fingerprint(
+                uSin, angles, res=res, nm=nm, lD=lD, onlyreal=onlyreal,
+                weight_angles=weight_angles, padding=tuple(padding),
+                padfac=padfac, pad_strategy=pad_strategy, padval=padval,
+                intp_order=intp_order, intp_method=intp_method,
+                dtype=dtype.name, angle_order=angle_order)
+            angles_done = checkpoint.start(outarr, key)
+            if count is not None:
+                count.value += angles_done
+
+        # processing order of the angles and the sum of their weights
+        order = util.compute_angle_order(angles, angle_order)
+        if weight_angles:
+            angle_weights = np.ones(A) * np.ravel(weights)
+        else:
+            angle_weights = np.ones(A)
+        weights_done = np.cumsum(angle_weights[order])
+
+        for ii in range(angles_done, A):
+            if cancel is not None and cancel.cancelled():
+                break
+            aa = order[ii]
+            # 14x Speedup with fftw3 compared to numpy fft and
+            # memory reduction by a factor of 2!
+            # ifft will be computed in-place
+
+            # A == la
+            # projection.shape == (A, lNx, lNy)
+            # filter2.shape == (ln, lNx, lNy)
+            for p in range(len(zv)):
+                for part in parts:
+                    if save_memory:
+                        # compute filter2 here;
+                        # this is comparatively slower than the other case
+                        if part is None:
+                            ex = "exp(factor * zvp) * projectioni"
+                        else:
+                            ex = "{}(prefac * exp(factor * zvp))" \
+                                 .format(part) + " * projectioni"
+                        ne.evaluate(ex,
+                                    local_dict={"zvp": zv[p],
+                                                "projectioni": projection[aa],
+                                                "factor": f2_exp_fac,
+                                                "prefac": f2_pre_fac},
+                                    out=inarr)
+                    else:
+                        # use universal functions
+                        if part is None:
+                            filter2p = filter2[p]
+                        else:
+                            filter2p = getattr(filter2[p], part)
+                        np.multiply(filter2p, projection[aa], out=inarr)
+                    if prune_spectrum:
+                        cropped = pruned_ifft.execute(inarr)
+                    else:
+                        myifftw_plan.execute()
+                        cropped = outarr_fft[padyl:padyl + lny,
+                                             padxl:padxl + lnx]
+                    if intp_method == "gather":
+                        cropped = cropped.T
+                    if part is None:
+                        filtered_proj[p, :, :] = cropped
+                    else:
+                        getattr(filtered_proj, part)[p, :, :] = cropped
+
+            phi0 = np.rad2deg(angles[aa])
+
+            if intp_method == "gather":
+                if onlyreal:
+                    _rotation.gather_accumulate(filtered_proj.real, outarr,
+                                                -phi0, tiles, pool4loop)
+                else:
+                    _rotation.gather_accumulate(filtered_proj, outarr,
+                                                -phi0, tiles, pool4loop)
+            elif intp_method == "fourier":
+                rotator.rotate_add(filtered_proj, -phi0, outarr)
+            else:
+                # resize image to original size
+                # The copy is necessary to prevent memory leakage.
+                # The fftw did not normalize the data.
+                # By performing the "/" operation here, we magically use less
+                # memory and we gain speed...
+                _shared_array[:] = filtered_proj.real
+
+                if not onlyreal:
+                    filtered_proj_imag = filtered_proj.imag
+
+                _mprotate(phi0, lny, pool4loop, intp_order)
+
+                if cancel is not None and cancel.cancelled():
+                    # The workers may have skipped the rotation.
+                    break
+
+                if onlyreal:
+                    outarr.real += _shared_array
+                else:
+                    # Keep the rotated real part until the imaginary part
+                    # has been rotated, such that a cancelled angle does
+                    # not contribute to the partial sum.
+                    filtered_proj.real[:] = _shared_array
+                    _shared_array[:] = filtered_proj_imag
+                    del filtered_proj_imag
+                    _mprotate(phi0, lny, pool4loop, intp_order)
+                    if cancel is not None and cancel.cancelled():
+                        break
+                    outarr.real += filtered_proj.real
+                    outarr.imag += _shared_array
+
+            angles_done += 1
+            if checkpoint is not None:
+                checkpoint.save(outarr, angles_done)
+
+            if callback is not None and angles_done % callback_interval == 0:
+                callback(outarr * (weights_done[-1]
+                                   / weights_done[angles_done - 1]),
+                         angles_done)
+
+            if count is not None:
+                count.value += 1
+
+        if checkpoint is not None:
+            # also store the angles completed before a cancellation
+            checkpoint.save(outarr, angles_done, force=True)
+    finally:
+        if pool4loop is not None:
+            pool4loop.terminate()
+            pool4loop.join()
+        if checkpoint is not None:
+            checkpoint.close()
+        # release the shared memory (also on exceptions)
+        _shared_array = shared_array_base = None
+
+    del inarr
 
     gc.collect()
 
+    if cancel is not None:
+        cancel.finish(angles_done, A)
+
     return outarr
@@ -1,18 +1,17 @@
 """3D backpropagation algorithm with a tilted axis of rotation"""
-import ctypes
 import gc
-import multiprocessing as mp
 import warnings
 
 import numexpr as ne
 import numpy as np
-import pyfftw
 import scipy.ndimage
 
 
 from ._alg3d_bpp import _ncores
+from . import _checkpoint
+from . import _fft
+from . import _resources
 from . import util
-import odtbrain
 
 
 def estimate_major_rotation_axis(loc):
@@ -368,14 +367,20 @@ def sphere_points_from_angles_and_tilt(angles, tilted_axis):
     return newang
 
 
+@_resources.with_resources
 def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
                             tilted_axis=[0, 1, 0],
                             coords=None, weight_angles=True, onlyreal=False,
-                            padding=(True, True), padfac=1.75, padval=None,
+                            padding=(True, True), padfac=1.75,
+                            pad_strategy="pow2", padval=None,
                             intp_order=2, dtype=None,
-                            num_cores=_ncores,
+                            num_cores=None,
                             save_memory=False,
                             copy=True,
+                            cancel=None,
+                            checkpoint=None,
+                            angle_order="acquisition",
+                            callback=None, callback_interval=10,
                             count=None, max_count=None,
                             verbose=0):
     """3D backpropagation with a tilted axis of rotation
@@ -474,6 +479,19 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
         lead to a padded size of 512 for an initial size of 150.
         Values geater than 2 are allowed. This parameter may
         greatly increase memory usage!
+    pad_strategy: str
+        How the padded size is chosen (if `padding` is set).
+
+        - "pow2": next power of two of the size times `padfac`
+          (at least 64)
+        - "smooth": smallest integer of the form
+          :math:`2^a 3^b 5^c 7^d` that is larger than the size times
+          `padfac` (at least 64). For example, an initial size of
+          150 with `padfac=1.75` is padded to 270 instead of 512.
+          This reduces memory usage and computation time of the
+          filtering stage.
+
+        .. versionadded:: 0.3.0
     padval: float
         The value used for padding. This is important for the Rytov
         approximation, where an approximat zero in the phase might
@@ -487,9 +505,12 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     dtype: dtype object or argument for :func:`numpy.dtype`
         The data type that is used for calculations (float or double).
         Defaults to `numpy.float_`.
-    num_cores: int
+    num_cores: int or None
         The number of cores to use for parallel operations. This value
-        defaults to the number of cores on the system.
+        defaults to the number of cores set with
+        :func:`odtbrain.resource_context` (all cores of the system
+        outside of such a context). The numexpr and FFT threads
+        are limited accordingly during the reconstruction.
     save_memory: bool
         Saves memory at the cost of longer computation time.
 
@@ -501,6 +522,51 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
 
         .. versionadded:: 0.1.5
 
+    cancel: odtbrain.CancelToken or None
+        Token that is checked before each angle. If it is cancelled
+        (or its deadline has passed), the reconstruction stops,
+        releases the buffers, and either raises
+        :class:`odtbrain.ReconstructionCancelled` or returns the
+        partial sum of the angles backpropagated so far (see
+        :class:`odtbrain.CancelToken`).
+
+        .. versionadded:: 0.3.0
+
+    checkpoint: odtbrain.Checkpoint or None
+        Periodically store the accumulated volume and the number of
+        completed angles in a memory-mapped file. If the checkpoint
+        files already exist, the reconstruction resumes after the
+        completed angles (see :class:`odtbrain.Checkpoint`).
+
+        .. versionadded:: 0.3.0
+
+    angle_order: str
+        Order in which the angles are backpropagated (see
+        :func:`odtbrain.util.compute_angle_order`): "acquisition"
+        (the order of `angles`), "bitreversed", or "golden". With
+        the latter two, the partial sum covers the full angular
+        range early on, which is useful in combination with
+        `callback`.
+
+        .. versionadded:: 0.3.0
+
+    callback: callable or None
+        Function that is called every `callback_interval` angles
+        with the intermediate reconstruction and the number of
+        backpropagated angles, `callback(f, angles_done)`. The
+        intermediate reconstruction `f` is the partial sum of the
+        angles backpropagated so far rescaled by the ratio of the
+        sum of all angular weights to the sum of the weights of
+        these angles. To stop the reconstruction, cancel a
+        :class:`odtbrain.CancelToken` (see `cancel`) in `callback`.
+
+        .. versionadded:: 0.3.0
+
+    callback_interval: int
+        Number of angles between two calls of `callback`
+
+        .. versionadded:: 0.3.0
+
     count, max_count: multiprocessing.Value or `None`
         Can be used to monitor the progress of the algorithm.
         Initially, the value of `max_count.value` is incremented
@@ -552,11 +618,9 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     approximation - the propagation is not correctly described.
     Instead, numerically refocus the sinogram prior to converting
     it to Rytov data (using e.g. :func:`odtbrain.sinogram_as_rytov`)
-    with a numerical focusing algorithm (available in the Python
-    package :py:mod:`nrefocus`).
+    with :func:`odtbrain.refocus_sinogram` (or with the numerical
+    focusing algorithms of the Python package :py:mod:`nrefocus`).
     """
-    ne.set_num_threads(num_cores)
-
     if copy:
         uSin = uSin.copy()
         angles = angles.copy()
@@ -596,6 +660,9 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     if max_count is not None:
         max_count.value += A + 2
 
+    # processing order of the angles
+    order = util.compute_angle_order(angles, angle_order)
+
     if len(angles.shape) == 1:
         if weight_angles:
             weights = util.compute_angle_weights_1d(angles).reshape(-1, 1, 1)
@@ -627,11 +694,6 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     dtype_complex = np.dtype("complex{}".format(
         2 * int(dtype.name.strip("float"))))
 
-    # set ctype
-    ct_dt_map = {np.dtype(np.float32): ctypes.c_float,
-                 np.dtype(np.float64): ctypes.c_double
-                 }
-
     assert len(uSin.shape) == 3, "Input data `uSin` must have shape (A,Ny,Nx)."
     assert len(uSin) == A, "`len(angles)` must be  equal to `len(uSin)`."
     assert len(
@@ -672,8 +734,8 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     # a power of 2.
     # transpose so we can call resize correctly
 
-    orderx = max(64., 2**np.ceil(np.log(lnx * padfac) / np.log(2)))
-    ordery = max(64., 2**np.ceil(np.log(lny * padfac) / np.log(2)))
+    orderx = util.compute_padded_size(lnx, padfac, strategy=pad_strategy)
+    ordery = util.compute_padded_size(lny, padfac, strategy=pad_strategy)
 
     if padding[0]:
         padx = orderx - lnx
@@ -803,10 +865,10 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     #   arrays are not overwritten during planning.
 
     # Byte-aligned arrays
-    temp_array = pyfftw.n_byte_align_empty(sino[0].shape, 16, dtype_complex)
+    temp_array = _fft.empty_aligned(sino[0].shape, dtype_complex)
 
-    myfftw_plan = pyfftw.FFTW(temp_array, temp_array, threads=num_cores,
-                              flags=["FFTW_ESTIMATE"], axes=(0, 1))
+    myfftw_plan = _fft.plan(temp_array, temp_array, threads=num_cores,
+                            flags=["FFTW_ESTIMATE"], axes=(0, 1))
 
     if count is not None:
         count.value += 1
@@ -889,7 +951,7 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
         outarr = np.zeros((ln, lny, lnx), dtype=dtype_complex)
 
     # Create plan for fftw:
-    inarr = pyfftw.n_byte_align_empty((lNy, lNx), 16, dtype_complex)
+    inarr = _fft.empty_aligned((lNy, lNx), dtype_complex)
     # inarr[:] = (projection[0]*filter2)[0,:,:]
     # plan is "patient":
     #    FFTW_PATIENT is like FFTW_MEASURE, but considers a wider range
@@ -899,105 +961,136 @@ def backpropagate_3d_tilted(uSin, angles, res, nm, lD=0,
     #    transforms).
     # print(inarr.flags)
 
-    myifftw_plan = pyfftw.FFTW(inarr, inarr, threads=num_cores,
-                               axes=(0, 1),
-                               direction="FFTW_BACKWARD",
-                               flags=["FFTW_MEASURE"])
-
-    # assert shared_array.base.base is shared_array_base.get_obj()
-    shared_array_base = mp.Array(ct_dt_map[dtype], ln * lny * lnx)
-    _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
-    _shared_array = _shared_array.reshape(ln, lny, lnx)
-
-    # Initialize the pool with the shared array
-    odtbrain._shared_array = _shared_array
-    pool4loop = mp.Pool(processes=num_cores)
-
-    # filtered projections in loop
-    filtered_proj = np.zeros((ln, lny, lnx), dtype=dtype_complex)
-
-    # Rotate all points such that we are effectively rotating everything
-    # about the y-axis.
-    angles = rotate_points_to_axis(points=angles, axis=tilted_axis_yz)
-
-    for aa in np.arange(A):
-        # A == la
-        # projection.shape == (A, lNx, lNy)
-        # filter2.shape == (ln, lNx, lNy)
-
-        for p in range(len(zv)):
-            if save_memory:
-                # compute filter2 here;
-                # this is comparatively slower than the other case
-                ne.evaluate("exp(factor * zvp) * projectioni",
-                            local_dict={"zvp": zv[p],
-                                        "projectioni": projection[aa],
-                                        "factor": f2_exp_fac},
-                            out=inarr)
-            else:
-                # use universal functions
-                np.multiply(filter2[p], projection[aa], out=inarr)
-            myifftw_plan.execute()
-            filtered_proj[p, :, :] = inarr[
-                padyl:padyl + lny,
-                padxl:padxl + lnx
-            ]
-
-        # The Cartesian axes in our array are ordered like this: [z,y,x]
-        # However, the rotation matrix requires [x,y,z]. Therefore, we
-        # need to np.transpose the first and last axis and also invert the
-        # y-axis.
-        fil_p_t = filtered_proj.transpose(2, 1, 0)[:, ::-1, :]
-
-        # get rotation matrix for this point and also rotate in plane
-        _drot, drotinv = rotation_matrix_from_point_planerot(angles[aa],
-                                                             plane_angle=angz,
-                                                             ret_inv=True)
-
-        # apply offset required by affine_transform
-        # The offset is only required for the rotation in
-        # the x-z-plane.
-        # This could be achieved like so:
-        # The offset "-.5" assures that we are rotating about
-        # the center of the image and not the value at the center
-        # of the array (this is also what `scipy.ndimage.rotate` does.
-        c = 0.5 * np.array(fil_p_t.shape) - .5
-        offset = c - np.dot(drotinv, c)
-
-        # Perform rotation
-        # We cannot split the inplace-rotation into multiple subrotations
-        # as we did in _Back_3d_tilted.backpropagate_3d, because the rotation
-        # axis is arbitrarily placed in the 3d array. Rotating single
-        # slices does not yield the same result as rotating the entire
-        # array. Instead of using affine_transform, map_coordinates might
-        # be faster for multiple cores.
-
-        # Also undo the axis transposition that we performed previously.
-
-        outarr.real += scipy.ndimage.interpolation.affine_transform(
-            fil_p_t.real, drotinv,
-            offset=offset,
-            mode="constant",
-            cval=0,
-            order=intp_order).transpose(2, 1, 0)[:, ::-1, :]
-
-        if not onlyreal:
-            outarr.imag += scipy.ndimage.interpolation.affine_transform(
-                fil_p_t.imag, drotinv,
+    myifftw_plan = _fft.plan(inarr, inarr, threads=num_cores,
+                             axes=(0, 1),
+                             direction="FFTW_BACKWARD",
+                             flags=["FFTW_MEASURE"])
+
+    try:
+        # filtered projections in loop
+        filtered_proj = np.zeros((ln, lny, lnx), dtype=dtype_complex)
+
+        # Rotate all points such that we are effectively rotating everything
+        # about the y-axis.
+        angles = rotate_points_to_axis(points=angles, axis=tilted_axis_yz)
+
+        angles_done = 0
+        if checkpoint is not None:
+            key = _checkpoint.fingerprint(
+                uSin, angles, res=res, nm=nm, lD=lD,
+                tilted_axis=np.asarray(tilted_axis).tolist(),
+                onlyreal=onlyreal, weight_angles=weight_angles,
+                padding=tuple(padding), padfac=padfac,
+                pad_strategy=pad_strategy, padval=padval,
+                intp_order=intp_order, dtype=dtype.name,
+                angle_order=angle_order)
+            angles_done = checkpoint.start(outarr, key)
+            if count is not None:
+                count.value += angles_done
+
+        # sum of the weights of the angles in the processing order
+        if weight_angles:
+            angle_weights = np.ones(A) * np.ravel(weights)
+        else:
+            angle_weights = np.ones(A)
+        weights_done = np.cumsum(angle_weights[order])
+
+        for ii in range(angles_done, A):
+            if cancel is not None and cancel.cancelled():
+                break
+            aa = order[ii]
+            # A == la
+            # projection.shape == (A, lNx, lNy)
+            # filter2.shape == (ln, lNx, lNy)
+
+            for p in range(len(zv)):
+                if save_memory:
+                    # compute filter2 here;
+                    # this is comparatively slower than the other case
+                    ne.evaluate("exp(factor * zvp) * projectioni",
+                                local_dict={"zvp": zv[p],
+                                            "projectioni": projection[aa],
+                                            "factor": f2_exp_fac},
+                                out=inarr)
+                else:
+                    # use universal functions
+                    np.multiply(filter2[p], projection[aa], out=inarr)
+                myifftw_plan.execute()
+                filtered_proj[p, :, :] = inarr[
+                    padyl:padyl + lny,
+                    padxl:padxl + lnx
+                ]
+
+            # The Cartesian axes in our array are ordered like this: [z,y,x]
+            # However, the rotation matrix requires [x,y,z]. Therefore, we
+            # need to np.transpose the first and last axis and also invert the
+            # y-axis.
+            fil_p_t = filtered_proj.transpose(2, 1, 0)[:, ::-1, :]
+
+            # get rotation matrix for this point and also rotate in plane
+            _drot, drotinv = rotation_matrix_from_point_planerot(
+                angles[aa], plane_angle=angz, ret_inv=True)
+
+            # apply offset required by affine_transform
+            # The offset is only required for the rotation in
+            # the x-z-plane.
+            # This could be achieved like so:
+            # The offset "-.5" assures that we are rotating about
+            # the center of the image and not the value at the center
+            # of the array (this is also what `scipy.ndimage.rotate` does.
+            c = 0.5 * np.array(fil_p_t.shape) - .5
+            offset = c - np.dot(drotinv, c)
+
+            # Perform rotation
+            # We cannot split the inplace-rotation into multiple
+            # subrotations as we did in _Back_3d_tilted.backpropagate_3d,
+            # because the rotation axis is arbitrarily placed in the 3d
+            # array. Rotating single slices does not yield the same result
+            # as rotating the entire array. Instead of using
+            # affine_transform, map_coordinates might be faster for
+            # multiple cores.
+
+            # Also undo the axis transposition that we performed previously.
+
+            outarr.real += scipy.ndimage.interpolation.affine_transform(
+                fil_p_t.real, drotinv,
                 offset=offset,
                 mode="constant",
                 cval=0,
                 order=intp_order).transpose(2, 1, 0)[:, ::-1, :]
 
-        if count is not None:
-            count.value += 1
+            if not onlyreal:
+                outarr.imag += scipy.ndimage.interpolation.affine_transform(
+                    fil_p_t.imag, drotinv,
+                    offset=offset,
+                    mode="constant",
+                    cval=0,
+                    order=intp_order).transpose(2, 1, 0)[:, ::-1, :]
 
-    pool4loop.terminate()
-    pool4loop.join()
+            angles_done += 1
+            if checkpoint is not None:
+                checkpoint.save(outarr, angles_done)
 
-    del _shared_array, inarr, odtbrain._shared_array
-    del shared_array_base
+            if callback is not None and angles_done % callback_interval == 0:
+                callback(outarr * (weights_done[-1]
+                                   / weights_done[angles_done - 1]),
+                         angles_done)
+
+            if count is not None:
+                count.value += 1
+
+        if checkpoint is not None:
+            # also store the angles completed before a cancellation
+            checkpoint.save(outarr, angles_done, force=True)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    del inarr
 
     gc.collect()
 
+    if cancel is not None:
+        cancel.finish(angles_done, A)
+
     return outarr
@@ -0,0 +1,202 @@
+"""asyncio interface to the 3D reconstruction algorithms"""
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import inspect
+import time
+
+import numpy as np
+
+from . import util
+from ._alg3d_bpp import backpropagate_3d
+from ._alg3d_bppt import backpropagate_3d_tilted
+
+#: Progress of an asynchronous reconstruction
+#:
+#: - stage: "started", "filtering" (Fourier filtering of the
+#:   sinogram), "backpropagation" (one event per angle), or "finished"
+#: - step, total: number of completed and of all steps
+#: - angle: index (in `angles`) of the backpropagated angle; `None`
+#:   for the other stages and for the angles that were restored from
+#:   a checkpoint. With `angle_order` other than "acquisition", the
+#:   angles are not backpropagated in ascending order. With
+#:   `preview_angles`, only the angles of the preview are reported.
+#: - elapsed: time since the start of the reconstruction in seconds
+ProgressEvent = collections.namedtuple(
+    "ProgressEvent", ["stage", "step", "total", "angle", "elapsed"])
+
+#: Executor used for reconstructions if no executor is given. The
+#: reconstructions use all cores, so they are run one after another.
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    return _executor
+
+
+class _Counter(object):
+    """Replacement for `multiprocessing.Value` that reports changes"""
+
+    def __init__(self, callback=None):
+        self._value = 0
+        self._callback = callback
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        if self._callback is not None:
+            self._callback()
+
+
+class AsyncReconstruction(object):
+    """Reconstruction running in an executor
+
+    Awaiting the instance returns the result of the reconstruction.
+    Iterating over it asynchronously yields instances of
+    :class:`ProgressEvent` until the reconstruction is finished.
+    The progress is reported by the reconstruction thread, i.e.
+    `executor` must be a :class:`concurrent.futures.ThreadPoolExecutor`.
+    """
+
+    def __init__(self, func, args, kwargs, executor=None):
+        assert "count" not in kwargs and "max_count" not in kwargs, \
+            "`count` and `max_count` are set by the asynchronous API."
+        assert executor is None or isinstance(
+            executor, concurrent.futures.ThreadPoolExecutor), \
+            "`executor` must be a `concurrent.futures.ThreadPoolExecutor`."
+        # indices of the angles in the processing order of the
+        # algorithm; With `preview_angles`, only every
+        # `preview_angles`-th angle is backpropagated (see
+        # :func:`odtbrain._preview.with_preview`).
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        angles = np.squeeze(bound.arguments["angles"])
+        indices = np.arange(angles.shape[0])
+        preview_angles = bound.arguments.get("preview_angles", 1)
+        if preview_angles > 1:
+            angles = angles[::preview_angles]
+            indices = indices[::preview_angles]
+        self._order = indices[util.compute_angle_order(
+            angles, bound.arguments["angle_order"])]
+        self.num_angles = len(self._order)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._count = _Counter(self._progress)
+        self._max_count = _Counter()
+        self._step = 0
+        self._start = time.perf_counter()
+        kwargs = dict(kwargs, count=self._count, max_count=self._max_count)
+        self._emit("started")
+        if executor is None:
+            executor = _get_executor()
+        # run in a copy of the current context, such that e.g. the
+        # settings of :func:`odtbrain.resource_context` apply
+        context = contextvars.copy_context()
+        self._future = self._loop.run_in_executor(
+            executor, context.run, self._run, func, args, kwargs)
+
+    def __await__(self):
+        return self._future.__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self._queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def _emit(self, stage, angle=None, last=False):
+        """Put an event into the queue (thread-safe)"""
+        event = ProgressEvent(stage=stage,
+                              step=self._count.value,
+                              total=self._max_count.value,
+                              angle=angle,
+                              elapsed=time.perf_counter() - self._start)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+        if last:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    def _progress(self):
+        """Called (in the executor) for each step of the algorithm"""
+        # The algorithms first perform the filtering steps and then
+        # one step per angle.
+        num_filter = self._max_count.value - self.num_angles
+        step = self._count.value
+        previous, self._step = self._step, step
+        if step == previous:
+            return
+        elif step <= num_filter:
+            self._emit("filtering")
+        elif step - previous == 1:
+            angle = int(self._order[step - num_filter - 1])
+            self._emit("backpropagation", angle=angle)
+        else:
+            # angles restored from a checkpoint
+            self._emit("backpropagation")
+
+    def _run(self, func, args, kwargs):
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            # end the iteration; the exception is raised when the
+            # instance is awaited
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+            raise
+        self._emit("finished", last=True)
+        return result
+
+    def done(self):
+        """Return `True` if the reconstruction is finished"""
+        return self._future.done()
+
+
+def backpropagate_3d_async(uSin, angles, *args, executor=None, **kwargs):
+    """Asynchronous version of :func:`backpropagate_3d`
+
+    Parameters
+    ----------
+    uSin, angles, args, kwargs:
+        Arguments of :func:`backpropagate_3d` (except `count` and
+        `max_count`)
+    executor: concurrent.futures.ThreadPoolExecutor or None
+        Executor in which the reconstruction is computed; Defaults
+        to a thread pool executor that runs the reconstructions
+        one after another. Process pool executors are not supported,
+        because the progress is reported from the executor thread.
+
+    Returns
+    -------
+    reconstruction: AsyncReconstruction
+        Awaiting `reconstruction` yields the result of
+        :func:`backpropagate_3d`; Iterating over it with
+        `async for` yields :class:`ProgressEvent` instances.
+
+    Notes
+    -----
+    This function must be called from a coroutine (i.e. with a
+    running event loop).
+    """
+    return AsyncReconstruction(backpropagate_3d,
+                               (uSin, angles) + args, kwargs,
+                               executor=executor)
+
+
+def backpropagate_3d_tilted_async(uSin, angles, *args, executor=None,
+                                  **kwargs):
+    """Asynchronous version of :func:`backpropagate_3d_tilted`
+
+    See :func:`backpropagate_3d_async` for details.
+    """
+    return AsyncReconstruction(backpropagate_3d_tilted,
+                               (uSin, angles) + args, kwargs,
+                               executor=executor)
@@ -0,0 +1,273 @@
+"""Machine-specific tuning of the 3D backpropagation
+
+The parameters of :func:`backpropagate_3d` that only affect the
+computation time (and not the result) are benchmarked on synthetic
+data the first time a sinogram shape is reconstructed with
+`autotune=True`. The fastest configuration is stored for the current
+host in a JSON file and reused for later reconstructions.
+"""
+import functools
+import inspect
+import json
+import multiprocessing as mp
+import os
+import platform
+import time
+
+import numpy as np
+
+from . import _fft
+from . import _memory
+from . import _resources
+
+#: Default location of the autotuning cache
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "odtbrain",
+                          "autotune_3d.json")
+
+#: Parameters of the cached configurations
+TUNED_PARAMETERS = ["num_cores", "save_memory", "prune_spectrum",
+                    "tile_size", "fft_backend"]
+
+
+def _cache_key(shape, sino_dtype, kwargs):
+    """Key of a configuration in the cache of a host
+
+    The key contains all parameters that determine the size of the
+    padded arrays (and thus the computation time) as well as the
+    number of cores that are available to the reconstruction (see
+    :func:`odtbrain.resource_context`).
+    """
+    dtype = kwargs.get("dtype", None)
+    padding = kwargs.get("padding", (True, True))
+    if isinstance(padding, bool):
+        padding = (padding, padding)
+    return "{}x{}x{}-{}-{}-{}-{}-res{:g}-nm{:g}-pad{}{}-{:g}-{}-cores{}" \
+        .format(shape[0], shape[1], shape[2],
+                np.dtype(sino_dtype).name,
+                np.dtype(np.float_ if dtype is None else dtype).name,
+                kwargs.get("intp_method", "rotate"),
+                "real" if kwargs.get("onlyreal", False) else "complex",
+                kwargs["res"], kwargs["nm"],
+                int(bool(padding[0])), int(bool(padding[1])),
+                kwargs.get("padfac", 1.75),
+                kwargs.get("pad_strategy", "pow2"),
+                _resources.get_num_cores())
+
+
+def _load_cache(cache_file):
+    if not os.path.exists(cache_file):
+        return {}
+    with open(cache_file, "r") as fd:
+        return json.load(fd)
+
+
+def _save_cache(cache, cache_file):
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    # Write to a temporary file first, such that concurrent
+    # processes never read an incomplete file.
+    temp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+    with open(temp_file, "w") as fd:
+        json.dump(cache, fd, indent=2, sort_keys=True)
+    os.replace(temp_file, cache_file)
+
+
+def _candidates(shape, sino_dtype, kwargs):
+    """Candidate values of the tuned parameters
+
+    The first value of each parameter is the default value.
+    """
+    ncores = min(_resources.get_num_cores(), mp.cpu_count())
+    cands = {"num_cores": sorted({ncores, max(1, ncores // 2), 1},
+                                 reverse=True),
+             "save_memory": [False, True],
+             "prune_spectrum": [False, True],
+             "tile_size": [32],
+             "fft_backend": list(_fft.BACKENDS),
+             }
+    if kwargs.get("intp_method", "rotate") == "gather":
+        cands["tile_size"] = [32, 16, 64]
+    # Do not consider configurations that do not fit into memory.
+    available = _memory.available_memory()
+    if available is not None:
+        memkw = {}
+        for key in ["padding", "padfac", "pad_strategy", "intp_order",
+                    "intp_method", "dtype", "onlyreal", "copy"]:
+            if key in kwargs:
+                memkw[key] = kwargs[key]
+        mem = _memory.estimate_memory_3d(shape, kwargs["res"],
+                                         kwargs["nm"],
+                                         sino_dtype=sino_dtype,
+                                         save_memory=False,
+                                         prune_spectrum=True, **memkw)
+        if mem["peak"] > available:
+            cands["save_memory"] = [True]
+    return cands
+
+
+def tune(func, shape, sino_dtype, kwargs, num_angles=3, verbose=0):
+    """Benchmark the configurations of `func` on synthetic data
+
+    The parameters are tuned one after another (starting with the
+    default configuration), i.e. the number of benchmarks is the
+    sum and not the product of the number of candidate values.
+
+    Parameters
+    ----------
+    func: callable
+        The reconstruction function (:func:`backpropagate_3d`)
+    shape: tuple of ints (A, Ny, Nx)
+        Shape of the sinogram
+    sino_dtype: dtype object
+        Data type of the sinogram
+    kwargs: dict
+        Fixed keyword arguments of `func` (must contain "res" and
+        "nm")
+    num_angles: int
+        Number of angles used for benchmarking; The computation
+        time of the reconstruction is proportional to the number
+        of angles.
+    verbose: int
+        Increment to increase verbosity.
+
+    Returns
+    -------
+    config: dict
+        The fastest configuration
+    """
+    rs = np.random.RandomState(42)
+    lA = min(shape[0], num_angles)
+    sino = rs.random_sample((lA,) + tuple(shape[1:])).astype(sino_dtype)
+    if np.iscomplexobj(sino):
+        sino += 1j * rs.random_sample(sino.shape)
+    angles = np.linspace(0, 2 * np.pi, shape[0], endpoint=False)[:lA]
+
+    fixed = dict(kwargs)
+    fixed.pop("uSin", None)
+    fixed.pop("angles", None)
+    for key in TUNED_PARAMETERS + ["autotune", "cancel", "checkpoint",
+                                   "callback", "count", "max_count",
+                                   "verbose", "copy"]:
+        fixed.pop(key, None)
+
+    cands = _candidates(shape, sino_dtype, kwargs)
+    config = {key: cands[key][0] for key in TUNED_PARAMETERS}
+
+    def benchmark(cfg):
+        t0 = time.perf_counter()
+        func(sino, angles, copy=True, **cfg, **fixed)
+        return time.perf_counter() - t0
+
+    # warm-up (e.g. FFTW planning and pool creation)
+    benchmark(config)
+    best = benchmark(config)
+    if verbose > 0:
+        print("......Autotuning {}: {:.3f}s".format(config, best))
+    for key in TUNED_PARAMETERS:
+        for value in cands[key][1:]:
+            cfg = dict(config)
+            cfg[key] = value
+            duration = benchmark(cfg)
+            if verbose > 0:
+                print("......Autotuning {}: {:.3f}s".format(cfg, duration))
+            if duration < best:
+                best = duration
+                config = cfg
+    return config
+
+
+def autotune_3d(shape, res, nm, sino_dtype=np.complex128, cache_file=None,
+                force=False, verbose=0, **kwargs):
+    """Determine the fastest configuration of :func:`backpropagate_3d`
+
+    Parameters
+    ----------
+    shape: tuple of ints (A, Ny, Nx)
+        Shape of the sinogram
+    res, nm: float
+        Parameters of :func:`backpropagate_3d`
+    sino_dtype: dtype object or argument for :func:`numpy.dtype`
+        Data type of the sinogram
+    cache_file: str or None
+        Path to the JSON file in which the configurations are stored
+        for each host; Defaults to `CACHE_FILE`
+        (`~/.cache/odtbrain/autotune_3d.json`).
+    force: bool
+        Run the benchmarks even if a configuration for `shape` is
+        already stored in the cache.
+    verbose: int
+        Increment to increase verbosity.
+    kwargs:
+        Additional keyword arguments of :func:`backpropagate_3d`
+        that are not tuned (e.g. `intp_method` or `onlyreal`)
+
+    Returns
+    -------
+    config: dict
+        The fastest values of `num_cores`, `save_memory`,
+        `prune_spectrum`, `tile_size`, and the FFT backend
+        ("fft_backend")
+    """
+    from ._alg3d_bpp import backpropagate_3d
+    kwargs["res"] = res
+    kwargs["nm"] = nm
+    return _get_config(backpropagate_3d, shape, sino_dtype, kwargs,
+                       cache_file=cache_file, force=force, verbose=verbose)
+
+
+def _get_config(func, shape, sino_dtype, kwargs, cache_file=None,
+                force=False, verbose=0):
+    """Return the cached configuration or tune `func`"""
+    if cache_file is None:
+        cache_file = CACHE_FILE
+    host = platform.node()
+    key = _cache_key(shape, sino_dtype, kwargs)
+    cache = _load_cache(cache_file)
+    if not force and key in cache.get(host, {}):
+        config = cache[host][key]
+        # e.g. pyfftw is not installed anymore
+        if config["fft_backend"] in _fft.BACKENDS:
+            return config
+    if verbose > 0:
+        print("......Autotuning for {} on {}".format(key, host))
+    config = tune(func, shape, sino_dtype, kwargs, verbose=verbose)
+    # reload in case another process has modified the cache meanwhile
+    cache = _load_cache(cache_file)
+    cache.setdefault(host, {})[key] = config
+    _save_cache(cache, cache_file)
+    return config
+
+
+def with_autotune(func):
+    """Decorator that applies the tuned configuration if `autotune`
+
+    If the keyword argument `autotune` of `func` is set, the tuned
+    parameters that were not given explicitly are taken from the
+    cached (or newly determined) configuration. The number of cores
+    is limited to the cores that are available to the current
+    context (see :func:`odtbrain.resource_context`).
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        autotune = bound.arguments.get("autotune", False)
+        if not autotune:
+            return func(*args, **kwargs)
+        uSin = np.asarray(bound.arguments["uSin"])
+        cache_file = autotune if isinstance(autotune, str) else None
+        config = _get_config(func, uSin.shape, uSin.dtype, bound.arguments,
+                             cache_file=cache_file,
+                             verbose=bound.arguments.get("verbose", 0))
+        config = dict(config)
+        config["num_cores"] = max(1, min(config["num_cores"],
+                                         _resources.get_num_cores()))
+        for key in TUNED_PARAMETERS:
+            if key not in bound.arguments:
+                bound.arguments[key] = config[key]
+        bound.arguments["autotune"] = False
+        return func(*bound.args, **bound.kwargs)
+
+    return wrapper
@@ -0,0 +1,73 @@
+"""Cooperative cancellation of reconstructions"""
+import multiprocessing as mp
+import time
+
+
+class ReconstructionCancelled(Exception):
+    """Raised when a reconstruction is cancelled via a :class:`CancelToken`
+
+    The attribute `angles_done` holds the number of angles that were
+    backpropagated before the reconstruction was cancelled.
+    """
+
+    def __init__(self, message, angles_done=0):
+        super(ReconstructionCancelled, self).__init__(message)
+        self.angles_done = angles_done
+
+
+class CancelToken(object):
+    """Request the cancellation of a running reconstruction
+
+    The reconstruction algorithms check the token before each angle
+    (and the worker processes before each rotation). Once the token
+    is cancelled (via :func:`CancelToken.cancel` or because the
+    deadline has passed), the worker processes and the buffers are
+    released and either :class:`ReconstructionCancelled` is raised
+    or the partial sum of the angles backpropagated so far is
+    returned.
+    """
+
+    def __init__(self, timeout=None, partial=False):
+        """
+        Parameters
+        ----------
+        timeout: float or None
+            Deadline in seconds from the creation of the token
+        partial: bool
+            If set, the reconstruction returns the partial sum of
+            the angles backpropagated so far instead of raising
+            :class:`ReconstructionCancelled`. The number of these
+            angles is stored in `angles_done`.
+        """
+        # `multiprocessing.Event` is shared with forked workers.
+        self._event = mp.Event()
+        if timeout is None:
+            self.deadline = None
+        else:
+            self.deadline = time.monotonic() + timeout
+        self.partial = partial
+        #: Number of backpropagated angles (set by the reconstruction)
+        self.angles_done = None
+
+    def cancel(self):
+        """Cancel the reconstruction"""
+        self._event.set()
+
+    def cancelled(self):
+        """Return `True` if the reconstruction should be cancelled"""
+        if self._event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def finish(self, angles_done, num_angles):
+        """Called by the reconstruction after the loop over the angles
+
+        Raises :class:`ReconstructionCancelled` if not all angles
+        were backpropagated and `partial` is not set.
+        """
+        self.angles_done = angles_done
+        if angles_done < num_angles and not self.partial:
+            raise ReconstructionCancelled(
+                "Reconstruction cancelled after {} of {} angles.".format(
+                    angles_done, num_angles),
+                angles_done=angles_done)
@@ -0,0 +1,133 @@
+"""Checkpointing of the per-angle accumulation"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class Checkpoint(object):
+    """Periodically store the accumulated volume of a reconstruction
+
+    The backpropagation is a sum over the angles. The accumulated
+    volume and the number of completed angles are stored in a
+    memory-mapped file (`path + ".npy"`) and a JSON index
+    (`path + ".json"`). A reconstruction started with the same
+    checkpoint (and the same data and parameters) skips the angles
+    that were already completed.
+
+    The memory-mapped file contains two copies of the volume. They
+    are written alternately and the index is updated (atomically)
+    only after a copy has been written completely, such that a
+    failure during checkpointing does not corrupt the checkpoint.
+    """
+
+    def __init__(self, path, interval=10, resume=True):
+        """
+        Parameters
+        ----------
+        path: str
+            Path of the checkpoint files without file extension
+        interval: int
+            Number of angles after which the volume is stored
+        resume: bool
+            Resume from existing checkpoint files; If set to `False`,
+            existing checkpoint files are overwritten.
+        """
+        assert interval >= 1, "`interval` must be a positive integer."
+        self.path = str(path)
+        self.interval = interval
+        self.resume = resume
+        self.angles_done = 0
+        self._key = None
+        self._slot = 0
+        self._mmap = None
+
+    @property
+    def data_file(self):
+        return self.path + ".npy"
+
+    @property
+    def index_file(self):
+        return self.path + ".json"
+
+    def start(self, outarr, key):
+        """Initialize or load the checkpoint
+
+        Parameters
+        ----------
+        outarr: ndarray
+            The (zero-initialized) output volume; If the checkpoint
+            is resumed, the accumulated volume is copied to `outarr`.
+        key: str
+            Identifier of the data and reconstruction parameters
+            (see :func:`fingerprint`)
+
+        Returns
+        -------
+        angles_done: int
+            Number of completed angles
+        """
+        self._key = key
+        if self.resume and os.path.exists(self.index_file):
+            with open(self.index_file, "r") as fd:
+                index = json.load(fd)
+            assert index["key"] == key, \
+                "The checkpoint '{}' belongs to a ".format(self.path) \
+                + "different sinogram or different parameters!"
+            self._mmap = np.lib.format.open_memmap(self.data_file,
+                                                   mode="r+")
+            self._slot = index["slot"]
+            self.angles_done = index["angles_done"]
+            outarr[:] = self._mmap[self._slot]
+        else:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            self._mmap = np.lib.format.open_memmap(
+                self.data_file, mode="w+", dtype=outarr.dtype,
+                shape=(2,) + outarr.shape)
+            self._slot = 0
+            self.angles_done = 0
+            self._write_index()
+        return self.angles_done
+
+    def save(self, outarr, angles_done, force=False):
+        """Store the volume every `interval` angles (or if `force`)"""
+        if angles_done == self.angles_done:
+            return
+        if not force and angles_done % self.interval:
+            return
+        slot = 1 - self._slot
+        self._mmap[slot] = outarr
+        self._mmap.flush()
+        self._slot = slot
+        self.angles_done = angles_done
+        self._write_index()
+
+    def close(self):
+        """Close the memory-mapped file"""
+        self._mmap = None
+
+    def _write_index(self):
+        index = {"key": self._key,
+                 "slot": self._slot,
+                 "angles_done": self.angles_done}
+        temp_file = "{}.{}.tmp".format(self.index_file, os.getpid())
+        with open(temp_file, "w") as fd:
+            json.dump(index, fd)
+        os.replace(temp_file, self.index_file)
+
+
+def fingerprint(uSin, angles, **params):
+    """Identifier of a sinogram and of reconstruction parameters
+
+    The identifier is computed from the shape, the data type, and
+    the content of the sinogram, the angles, and the parameters.
+    """
+    hasher = hashlib.sha1()
+    hasher.update(repr((uSin.shape, uSin.dtype.str)).encode())
+    hasher.update(np.ascontiguousarray(uSin).view(np.uint8))
+    hasher.update(np.ascontiguousarray(angles, dtype=float).tobytes())
+    hasher.update(repr(sorted(params.items())).encode())
+    return hasher.hexdigest()
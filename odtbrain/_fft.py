@@ -0,0 +1,328 @@
+"""Fourier transform backends
+
+All Fourier transforms in ODTbrain are computed via :func:`plan`,
+which mimics the interface of :class:`pyfftw.FFTW` (unnormalized
+transforms between preallocated arrays that are executed with
+`execute()`). The following backends are supported:
+
+- "pyfftw": FFTW via :mod:`pyfftw` (multi-threaded); Plans for
+  transforms that were planned before in the same session are
+  created quickly from the accumulated FFTW wisdom (see
+  :func:`get_wisdom`).
+- "scipy": :mod:`scipy.fft` (multi-threaded via `workers`,
+  requires scipy>=1.4)
+- "numpy": :mod:`numpy.fft` (single-threaded)
+
+The default backend is the first available backend in the list
+above. It can be changed with :func:`set_backend`.
+"""
+import contextvars
+
+import numpy as np
+import scipy.fftpack
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+
+#: Available FFT backends (in the order of preference)
+BACKENDS = [name for (name, mod) in [("pyfftw", pyfftw),
+                                     ("scipy", scipy_fft),
+                                     ("numpy", np)]
+            if mod is not None]
+
+_settings = {"backend": BACKENDS[0]}
+
+#: Default number of FFT threads; A context variable, such that
+#: reconstructions in different threads (see
+#: :func:`odtbrain.resource_context`) do not affect each other.
+_threads = contextvars.ContextVar("odtbrain_fft_threads", default=1)
+
+
+def get_backend():
+    """Return the name of the current FFT backend"""
+    return _settings["backend"]
+
+
+def set_backend(name):
+    """Set the FFT backend ("pyfftw", "scipy", or "numpy")
+
+    Returns the name of the previous backend.
+    """
+    assert name in BACKENDS, "FFT backend '{}' not available ".format(name) \
+        + "(choose from {})".format(BACKENDS)
+    previous = _settings["backend"]
+    _settings["backend"] = name
+    return previous
+
+
+def get_threads():
+    """Return the default number of threads used for FFTs"""
+    return _threads.get()
+
+
+def set_threads(threads):
+    """Set the default number of threads used for FFTs
+
+    The setting applies to the current thread (and context).
+    Returns the previous value.
+    """
+    assert threads >= 1, "`threads` must be a positive integer."
+    previous = _threads.get()
+    _threads.set(int(threads))
+    return previous
+
+
+def get_wisdom():
+    """Return the accumulated FFTW wisdom (or `None` without pyfftw)
+
+    The wisdom contains the plans for all transforms that were
+    planned in this session and can be restored in a different
+    session with :func:`set_wisdom`.
+    """
+    if pyfftw is None:
+        return None
+    return pyfftw.export_wisdom()
+
+
+def set_wisdom(wisdom):
+    """Import FFTW wisdom obtained with :func:`get_wisdom`"""
+    if pyfftw is not None and wisdom is not None:
+        pyfftw.import_wisdom(wisdom)
+
+
+def clear_cache():
+    """Forget the accumulated FFTW wisdom"""
+    if pyfftw is not None:
+        pyfftw.forget_wisdom()
+
+
+def empty_aligned(shape, dtype):
+    """Allocate an empty array suitable for fast Fourier transforms"""
+    if pyfftw is not None:
+        return pyfftw.n_byte_align_empty(shape, 16, dtype)
+    else:
+        return np.empty(shape, dtype)
+
+
+def zeros_aligned(shape, dtype):
+    """Allocate a zero-filled array suitable for fast Fourier transforms"""
+    arr = empty_aligned(shape, dtype)
+    arr[:] = 0
+    return arr
+
+
+def plan(inarr, outarr, axes=(-1,), direction="FFTW_FORWARD",
+         threads=None, flags=("FFTW_ESTIMATE",), backend=None):
+    """Create a Fourier transform plan from `inarr` to `outarr`
+
+    Parameters
+    ----------
+    inarr, outarr: ndarrays
+        Input and output arrays (may be identical for in-place
+        transforms). As for :class:`pyfftw.FFTW`, the type of the
+        transform (complex-to-complex, real-to-complex, or
+        complex-to-real) is determined by the data types of the arrays.
+    axes: tuple of ints
+        Axes over which the transform is computed
+    direction: str or list of str
+        "FFTW_FORWARD" or "FFTW_BACKWARD"; For discrete cosine
+        transforms of real data, one of "FFTW_REDFT10" (DCT-II) or
+        "FFTW_REDFT01" (DCT-III) for each axis.
+    threads: int or None
+        Number of threads; Defaults to :func:`get_threads`.
+    flags: tuple of str
+        FFTW planner flags (ignored by the other backends)
+    backend: str or None
+        FFT backend; Defaults to :func:`get_backend`.
+
+    Returns
+    -------
+    plan: object
+        The transform is computed with `plan.execute()`. As with
+        FFTW, the transforms are not normalized and the input array
+        may be overwritten.
+    """
+    if threads is None:
+        threads = get_threads()
+    if backend is None:
+        backend = get_backend()
+    axes = tuple(axes)
+    if isinstance(direction, str):
+        direction = [direction]
+    direction = list(direction)
+    if backend == "pyfftw":
+        if len(direction) == 1:
+            direction = direction[0]
+        # Note that the FFTW planner overwrites the arrays unless
+        # "FFTW_ESTIMATE" is used.
+        return pyfftw.FFTW(inarr, outarr, axes=axes, direction=direction,
+                           threads=threads, flags=tuple(flags))
+    else:
+        return _NumpyPlan(inarr, outarr, axes, direction, threads, backend)
+
+
+class _NumpyPlan(object):
+    """Unnormalized transforms with :mod:`scipy.fft` or :mod:`numpy.fft`"""
+
+    def __init__(self, inarr, outarr, axes, direction, threads, backend):
+        self.inarr = inarr
+        self.outarr = outarr
+        self.axes = axes
+        self.direction = direction
+        self.threads = threads
+        if backend == "scipy":
+            self.mod = scipy_fft
+            self.kwargs = {"workers": threads}
+        else:
+            self.mod = np.fft
+            self.kwargs = {}
+
+    def execute(self):
+        inarr = self.inarr
+        outarr = self.outarr
+        axes = self.axes
+        direction = self.direction
+        if direction[0].startswith("FFTW_REDFT"):
+            result = inarr
+            for ax, di in zip(axes, direction):
+                dct_type = 2 if di == "FFTW_REDFT10" else 3
+                if self.mod is np.fft:
+                    result = scipy.fftpack.dct(result, type=dct_type,
+                                               axis=ax)
+                else:
+                    result = self.mod.dct(result, type=dct_type, axis=ax,
+                                          **self.kwargs)
+            outarr[:] = result
+            return
+        # number of points of the transform
+        shape = [outarr.shape[ax] if np.iscomplexobj(inarr)
+                 else inarr.shape[ax] for ax in axes]
+        if not np.iscomplexobj(inarr):
+            outarr[:] = self.mod.rfftn(inarr, axes=axes, **self.kwargs)
+        elif not np.iscomplexobj(outarr):
+            outarr[:] = self.mod.irfftn(inarr, s=shape, axes=axes,
+                                        **self.kwargs)
+            outarr *= np.prod(shape)
+        elif direction[0] == "FFTW_FORWARD":
+            outarr[:] = self.mod.fftn(inarr, axes=axes, **self.kwargs)
+        else:
+            outarr[:] = self.mod.ifftn(inarr, axes=axes, **self.kwargs)
+            outarr *= np.prod(shape)
+
+
+def fft(a, axes=(-1,), threads=None, backend=None):
+    """Forward Fourier transform (like :func:`numpy.fft.fftn`)"""
+    a = np.asarray(a)
+    if not np.iscomplexobj(a):
+        a = a.astype(np.result_type(a.dtype, np.complex64))
+    inarr = empty_aligned(a.shape, a.dtype)
+    inarr[:] = a
+    plan(inarr, inarr, axes=axes, threads=threads,
+         backend=backend).execute()
+    return inarr
+
+
+def ifft(a, axes=(-1,), threads=None, backend=None):
+    """Inverse Fourier transform (like :func:`numpy.fft.ifftn`)"""
+    a = np.asarray(a)
+    if not np.iscomplexobj(a):
+        a = a.astype(np.result_type(a.dtype, np.complex64))
+    inarr = empty_aligned(a.shape, a.dtype)
+    inarr[:] = a
+    plan(inarr, inarr, axes=axes, direction="FFTW_BACKWARD",
+         threads=threads, backend=backend).execute()
+    inarr /= np.prod([a.shape[ax] for ax in axes])
+    return inarr
+
+
+class PrunedIFFT2(object):
+    """Inverse 2D FFT of a band-limited spectrum with cropped output
+
+    The spectrum is nonzero only in the rows `rows` and the columns
+    `cols` (e.g. the bounding box of the Ewald disc) and only the
+    region `crop` of the result is required. The inverse transform
+    is computed in two stages:
+
+    1. 1D inverse transforms along y of the nonzero columns only
+    2. 1D inverse transforms along x of the cropped rows only
+
+    The result is identical (up to floating point accuracy) to the
+    cropped inverse FFT of the zero-filled spectrum. Like the
+    transforms computed with :func:`plan`, the result is not
+    normalized.
+    """
+
+    def __init__(self, shape, rows, cols, crop, dtype_complex,
+                 real_output=False, num_cores=1, backend=None):
+        """
+        Parameters
+        ----------
+        shape: tuple of ints (Ny, Nx)
+            Shape of the (real-space) output of the full transform
+        rows, cols: 1d ndarrays of ints
+            Indices of the nonzero rows and columns of the
+            spectrum; If `real_output` is set, `cols` refers to the
+            non-negative frequencies (`Nx//2+1` values) along x.
+        crop: tuple of slices
+            Region of the output that is returned
+        dtype_complex: dtype object
+            Complex data type used for the computation
+        real_output: bool
+            Compute the inverse real FFT of a Hermitian spectrum
+            (along x only the non-negative frequencies are given)
+        num_cores: int
+            Number of threads used for the FFTs
+        backend: str or None
+            FFT backend; Defaults to :func:`get_backend`.
+        """
+        lNy, lNx = shape
+        self.rows = rows
+        self.cols = cols
+        self.crop = crop
+        lcols = lNx // 2 + 1 if real_output else lNx
+        lcrop = len(range(*crop[0].indices(lNy)))
+        kwargs = {"threads": num_cores,
+                  "direction": "FFTW_BACKWARD",
+                  "flags": ["FFTW_MEASURE"],
+                  "backend": backend}
+        self._buf1 = empty_aligned((lNy, len(cols)), dtype_complex)
+        self._ifft1 = plan(self._buf1, self._buf1, axes=(0,), **kwargs)
+        self._buf2 = empty_aligned((lcrop, lcols), dtype_complex)
+        if real_output:
+            dtype = np.dtype(dtype_complex).type(0).real.dtype
+            self._out2 = empty_aligned((lcrop, lNx), dtype)
+        else:
+            self._out2 = self._buf2
+        self._ifft2 = plan(self._buf2, self._out2, axes=(1,), **kwargs)
+
+    def execute(self, inarr):
+        """Compute the cropped inverse FFT
+
+        Parameters
+        ----------
+        inarr: (len(rows), len(cols)) ndarray
+            The nonzero part of the spectrum
+
+        Returns
+        -------
+        outarr: 2d ndarray
+            The cropped inverse transform; This is a view of an
+            internal buffer that is overwritten by the next call.
+        """
+        # The transforms overwrite their input, i.e. the zero rows
+        # and columns have to be set for each transform.
+        self._buf1[:] = 0
+        self._buf1[self.rows] = inarr
+        self._ifft1.execute()
+        self._buf2[:] = 0
+        self._buf2[:, self.cols] = self._buf1[self.crop[0]]
+        self._ifft2.execute()
+        return self._out2[:, self.crop[1]]
@@ -0,0 +1,137 @@
+"""Estimation of the detector distance `lD`"""
+import numpy as np
+
+from . import _resources
+from . import util
+from ._accumulator import Accumulator2D
+from ._sweep import backpropagate_3d_sweep
+
+
+def tamura_coefficient(f):
+    """Tamura coefficient of the modulus of `f`
+
+    The Tamura coefficient :math:`\\sqrt{\\sigma/\\mu}` (standard
+    deviation and mean of :math:`|f|`) is a sharpness metric that
+    is maximal for a focused reconstruction.
+    """
+    absf = np.abs(f)
+    mean = absf.mean()
+    if mean == 0:
+        return 0.
+    return np.sqrt(absf.std() / mean)
+
+
+def _parabolic_peak(x, y, idx):
+    """Vertex of the parabola through the maximum and its neighbors"""
+    if idx == 0 or idx == len(x) - 1:
+        return x[idx]
+    (x0, x1, x2) = x[idx - 1:idx + 2]
+    (y0, y1, y2) = y[idx - 1:idx + 2]
+    denom = (x0 - x1) * (x0 - x2) * (x1 - x2)
+    a = (x2 * (y1 - y0) + x1 * (y0 - y2) + x0 * (y2 - y1)) / denom
+    b = (x2**2 * (y0 - y1) + x1**2 * (y2 - y0) + x0**2 * (y1 - y2)) / denom
+    if a >= 0:
+        return x[idx]
+    return np.clip(-b / (2 * a), x0, x2)
+
+
+@_resources.with_resources
+def estimate_focus(uSin, angles, res, nm, distances, rows=None,
+                   metric=tamura_coefficient, weight_angles=True,
+                   num_cores=None, ret_scores=False, verbose=0):
+    """Estimate the detector distance `lD` from a sharpness metric
+
+    The sinogram is reconstructed for every value in `distances`
+    and the value that maximizes `metric` is returned. To keep the
+    computation time low, only a few slices of 3D sinograms are
+    reconstructed (see :func:`backpropagate_3d_sweep`); 2D
+    sinograms are reconstructed with :class:`Accumulator2D`. In
+    both cases, the projections are Fourier transformed only once.
+
+    Parameters
+    ----------
+    uSin: (A,N) or (A,Ny,Nx) ndarray
+        Two- or three-dimensional sinogram (see
+        :func:`backpropagate_2d` and :func:`backpropagate_3d`)
+    angles: (A,) ndarray
+        Angular positions :math:`\\phi_j` of `uSin` in radians
+    res, nm: float
+        Vacuum wavelength of the light in pixels and refractive
+        index of the surrounding medium
+    distances: 1d array of floats
+        Candidate distances `lD` in pixels (equidistant values
+        are recommended for the refinement of the maximum)
+    rows: list of ints or None
+        Detector rows (slices of the volume along the rotational
+        axis y) of 3D sinograms that are reconstructed; Defaults
+        to the central row. Choose rows that intersect the object.
+    metric: callable
+        Sharpness metric that is evaluated for each reconstruction;
+        Defaults to :func:`tamura_coefficient`.
+    weight_angles: bool
+        See :func:`backpropagate_3d`
+    num_cores: int or None
+        Number of cores; Defaults to the number of cores set with
+        :func:`odtbrain.resource_context`.
+    ret_scores: bool
+        Also return the values of `metric` for all `distances`
+    verbose: int
+        Increment to increase verbosity.
+
+    Returns
+    -------
+    lD: float
+        The estimated distance; If the maximum of `metric` is not
+        at the boundary of `distances`, it is refined by fitting a
+        parabola to the maximum and its two neighbors.
+    scores: 1d ndarray
+        The values of `metric` (only if `ret_scores` is set)
+
+    Notes
+    -----
+    The distance is estimated with the propagation kernel of the
+    backpropagation. For data that are converted with
+    :func:`sinogram_as_rytov`, use the estimate to refocus the
+    complex wave field sinogram (:func:`refocus_sinogram` with the
+    distance `-lD`) before the Rytov approximation is applied (see
+    the notes of :func:`backpropagate_3d`).
+
+    .. versionadded:: 0.3.0
+    """
+    uSin = np.asarray(uSin)
+    angles = np.squeeze(angles)
+    distances = np.array(distances, dtype=float).reshape(-1)
+    assert angles.ndim == 1, "`angles` must be a 1D array."
+    assert uSin.shape[0] == angles.shape[0], \
+        "Number of projections and angles do not match."
+    assert uSin.ndim in [2, 3], "`uSin` must be a 2D or 3D sinogram."
+
+    if uSin.ndim == 2:
+        A = angles.shape[0]
+        if weight_angles:
+            weights = util.compute_angle_weights_1d(angles)
+        else:
+            weights = np.ones(A)
+        accs = [Accumulator2D(uSin.shape[1], res, nm, lD=lD,
+                              num_cores=num_cores) for lD in distances]
+        for aa in range(A):
+            spectrum = accs[0].transform(uSin[aa])
+            for acc in accs:
+                acc.add_transformed(spectrum, angles[aa], weights[aa])
+        recons = [acc.snapshot() for acc in accs]
+    else:
+        if rows is None:
+            rows = [uSin.shape[1] // 2]
+        recons = backpropagate_3d_sweep(
+            uSin, angles, res, nm, parameters=[{"lD": lD}
+                                               for lD in distances],
+            rows=rows, weight_angles=weight_angles, num_cores=num_cores)
+
+    scores = np.array([metric(f) for f in recons])
+    idx = int(np.argmax(scores))
+    lD = _parabolic_peak(distances, scores, idx)
+    if verbose > 0:
+        print("......Estimated focus distance: {:.2f}".format(lD))
+    if ret_scores:
+        return lD, scores
+    return lD
@@ -0,0 +1,150 @@
+"""Memory requirements of the 3D backpropagation"""
+import os
+
+import numpy as np
+
+from . import _resources
+from . import util
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def available_memory():
+    """Return the available physical memory in bytes (or `None`)"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_memory_3d(shape, res, nm, padding=(True, True), padfac=1.75,
+                       pad_strategy="pow2", intp_order=2,
+                       intp_method="rotate", tile_size=32, dtype=None,
+                       sino_dtype=np.complex128, onlyreal=False,
+                       num_cores=None, save_memory=False,
+                       prune_spectrum=False, copy=True):
+    """Estimate the memory usage of :func:`backpropagate_3d`
+
+    Parameters
+    ----------
+    shape: tuple of ints (A, Ny, Nx)
+        Shape of the sinogram
+    res, nm, padding, padfac, pad_strategy, intp_order, intp_method,
+    tile_size, dtype, onlyreal, num_cores, save_memory, prune_spectrum,
+    copy:
+        Parameters of :func:`backpropagate_3d`
+    sino_dtype: dtype object or argument for :func:`numpy.dtype`
+        Data type of the sinogram; For real-valued sinograms,
+        real-to-complex FFTs are used.
+
+    Returns
+    -------
+    mem: dict
+        Estimated sizes in bytes of the main arrays:
+
+        - "sinogram": copy of the input sinogram (if `copy` is set)
+        - "padded sinogram": padded sinogram
+        - "projection": Fourier transformed projections (after
+          pruning, if `prune_spectrum` is set)
+        - "filter2": z-dependent filter (zero if `save_memory` is set)
+        - "filtered_proj": filtered projection of one angle
+        - "shared_array": volume shared with the worker processes
+          (`intp_method="rotate"`)
+        - "buffers": buffers of the inverse FFTs and temporary
+          arrays of the rotation
+        - "output": reconstructed volume
+        - "peak": estimated peak memory of the reconstruction (not
+          including the input sinogram)
+
+    Notes
+    -----
+    The estimate only considers arrays with at least the size of a
+    padded projection. Memory used by the Python interpreter, the
+    FFT plans, and the worker processes is not included.
+    """
+    (A, lny, lnx) = shape
+    ln = lnx
+    if dtype is None:
+        dtype = np.float_
+    dtype = np.dtype(dtype)
+    dtype_complex = np.dtype("complex{}".format(2 * dtype.itemsize * 8))
+    sino_dtype = np.dtype(sino_dtype)
+    real_input = not np.issubdtype(sino_dtype, np.complexfloating)
+    isz = dtype.itemsize
+    iszc = dtype_complex.itemsize
+
+    lNx = util.compute_padded_size(lnx, padfac, strategy=pad_strategy) \
+        if padding[0] else lnx
+    lNy = util.compute_padded_size(lny, padfac, strategy=pad_strategy) \
+        if padding[1] else lny
+    lNxh = lNx // 2 + 1 if real_input else lNx
+
+    if prune_spectrum:
+        km = (2 * np.pi * nm) / res
+        ky = 2 * np.pi * np.fft.fftfreq(lNy)
+        kx = 2 * np.pi * np.fft.fftfreq(lNx)[:lNxh]
+        lNyb = int(np.sum(ky**2 < km**2))
+        lNxb = int(np.sum(kx**2 < km**2))
+    else:
+        (lNyb, lNxb) = (lNy, lNxh)
+
+    mem = {}
+    mem["sinogram"] = A * lny * lnx * sino_dtype.itemsize * copy
+    mem["padded sinogram"] = A * lNy * lNx * sino_dtype.itemsize
+    # The Fourier transform of complex sinograms is computed in-place.
+    proj_full = A * lNy * lNxh * (iszc if real_input else
+                                  sino_dtype.itemsize)
+    proj_itemsize = iszc if real_input else sino_dtype.itemsize
+    mem["projection"] = A * lNyb * lNxb * proj_itemsize
+    # filter2 is computed in double precision
+    mem["filter2"] = 0 if save_memory else ln * lNyb * lNxb * 16
+    mem["filtered_proj"] = ln * lny * lnx * iszc
+    if intp_method == "rotate":
+        mem["shared_array"] = ln * lny * lnx * isz
+    else:
+        mem["shared_array"] = 0
+    # inverse FFTs
+    buffers = lNyb * lNxb * iszc
+    if prune_spectrum:
+        lcols = lNx // 2 + 1 if real_input else lNx
+        buffers += (lNy * lNxb + lny * lcols) * iszc
+        if real_input:
+            buffers += lny * lNx * isz
+    elif real_input:
+        buffers += lNy * lNx * isz
+    # rotation
+    if intp_method == "gather":
+        # interpolated values of one tile per thread
+        if num_cores is None:
+            num_cores = _resources.get_num_cores()
+        buffers += 6 * tile_size**2 * lny * iszc * num_cores
+    elif intp_method == "fourier":
+        ychunk = int(np.ceil(lny / 4))
+        buffers += 4 * ln * ychunk * ln * iszc
+    elif intp_method == "rotate":
+        # For orders > 1, the spline filter creates a double
+        # precision copy of the input, otherwise the input is copied.
+        buffers += ln * lny * lnx * (8 if intp_order > 1 else isz)
+    mem["buffers"] = buffers
+    mem["output"] = ln * lny * lnx * (isz if onlyreal else iszc)
+
+    # Peak memory of the individual stages
+    stages = []
+    # padding and Fourier transform
+    stages.append(mem["sinogram"] + mem["padded sinogram"]
+                  + proj_full * real_input)
+    if prune_spectrum:
+        stages.append(mem["sinogram"] + proj_full
+                      + A * lNyb * lNxh * proj_itemsize
+                      + mem["projection"])
+    # backpropagation
+    stages.append(mem["sinogram"] + mem["projection"] + mem["filter2"]
+                  + mem["filtered_proj"] + mem["shared_array"]
+                  + mem["buffers"] + mem["output"])
+    mem["peak"] = max(stages)
+    return mem
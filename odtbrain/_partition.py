@@ -0,0 +1,219 @@
+"""Distribution of the 3D reconstruction among executor workers"""
+import concurrent.futures
+import inspect
+
+import numpy as np
+
+from . import _resources
+from . import util
+from ._alg3d_bpp import backpropagate_3d
+from ._alg3d_bppt import backpropagate_3d_tilted, norm_vec, \
+    sphere_points_from_angles_and_tilt
+
+
+def _backpropagate_partition(func, uSin, angles, scale, args, kwargs):
+    """Reconstruct a partial volume (executed by a worker)"""
+    f = func(uSin, angles, *args, **kwargs)
+    f *= scale
+    return f
+
+
+def _sum_volumes(f1, f2):
+    """Combine two partial volumes (executed by a worker)"""
+    f1 += f2
+    return f1
+
+
+def partition_angles(num_angles, num_partitions):
+    """Split the angle indices into contiguous partitions
+
+    Every partition contains at least two angles (the reconstruction
+    functions require arrays of angles).
+
+    Returns
+    -------
+    partitions: list of 1d ndarrays
+        Indices of the angles of each partition
+    """
+    num_partitions = max(1, min(num_partitions, num_angles // 2))
+    return np.array_split(np.arange(num_angles), num_partitions)
+
+
+def tree_reduce(executor, futures):
+    """Sum the results of `futures` pairwise in `executor`
+
+    Two results are combined (by a new task in `executor`) as soon
+    as both are available. For results that become available at
+    about the same time, the reduction forms a balanced binary tree
+    of depth `log2(len(futures))`.
+
+    Returns
+    -------
+    result: object
+        The sum of all results
+    """
+    pending = set(futures)
+    remaining = len(futures)
+    ready = []
+    while remaining > 1:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        ready += [fut.result() for fut in done]
+        while len(ready) >= 2:
+            pending.add(executor.submit(_sum_volumes, ready.pop(),
+                                        ready.pop()))
+            remaining -= 1
+    if ready:
+        return ready[0]
+    return pending.pop().result()
+
+
+def _tilted_points(angles, tilted_axis):
+    """Convert angles about `tilted_axis` to points on the unit sphere
+
+    :func:`backpropagate_3d_tilted` computes the points relative to
+    the first angle, which would differ between the partitions.
+    The points are given in the frame of the detector, i.e. they
+    are rotated back from the frame in which the projection of
+    `tilted_axis` onto the detector is the y-axis.
+    """
+    tilted_axis = norm_vec(tilted_axis)
+    angz = np.arctan2(tilted_axis[0], tilted_axis[1])
+    rotmat = np.array([
+        [np.cos(angz), -np.sin(angz), 0],
+        [np.sin(angz),  np.cos(angz), 0],
+        [0,             0, 1],
+    ])
+    tilted_axis_yz = norm_vec(np.dot(rotmat, tilted_axis))
+    points = sphere_points_from_angles_and_tilt(angles, tilted_axis_yz)
+    # inverse rotation of each point
+    return np.dot(points, rotmat)
+
+
+def _backpropagate_partitioned(func, uSin, angles, args, kwargs, executor,
+                               num_partitions, weight_angles, count,
+                               max_count):
+    for key in ["cancel", "checkpoint", "callback", "count", "max_count",
+                "copy"]:
+        assert key not in kwargs, \
+            "`{}` is not supported with an executor.".format(key)
+    uSin = np.asarray(uSin)
+    angles = np.asarray(angles)
+    A = angles.shape[0]
+    if max_count is not None:
+        max_count.value += A
+    if num_partitions is None:
+        num_partitions = _resources.get_num_cores()
+
+    # The angular weights and the angular differential depend on all
+    # angles. The weights are applied to the sinogram here and the
+    # partial volumes are scaled with the fraction of the angles, such
+    # that the sum of the partial volumes is the full reconstruction.
+    if weight_angles and np.squeeze(angles).ndim == 1:
+        weights = util.compute_angle_weights_1d(np.squeeze(angles))
+        weights = weights.reshape(-1, 1, 1)
+        kwargs["weight_angles"] = False
+    else:
+        weights = None
+        kwargs["weight_angles"] = weight_angles
+
+    futures = []
+    for part in partition_angles(A, num_partitions):
+        sino = uSin[part]
+        if weights is not None:
+            sino = sino * weights[part]
+        fut = executor.submit(_backpropagate_partition, func, sino,
+                              angles[part], part.size / A, args,
+                              dict(kwargs, copy=False))
+        if count is not None:
+            fut.add_done_callback(lambda fut, size=part.size:
+                                  _resources.increment(count, size))
+        futures.append(fut)
+    return tree_reduce(executor, futures)
+
+
+def backpropagate_3d_partitioned(uSin, angles, *args, executor,
+                                 num_partitions=None, weight_angles=True,
+                                 count=None, max_count=None, **kwargs):
+    """Angle-partitioned version of :func:`backpropagate_3d`
+
+    The angles are split into `num_partitions` contiguous
+    partitions. Each partition is reconstructed with
+    :func:`backpropagate_3d` by a worker of `executor` and the
+    partial volumes are summed by a tree reduction (also in
+    `executor`). Because the backpropagation is linear in the
+    projections, the result is identical (up to floating point
+    accuracy) to that of :func:`backpropagate_3d`.
+
+    Parameters
+    ----------
+    uSin, angles, args, kwargs:
+        Arguments of :func:`backpropagate_3d` (except `cancel`,
+        `checkpoint`, `callback`, and `copy`)
+    executor: concurrent.futures.Executor
+        Executor that runs the partial reconstructions, e.g. a
+        :class:`concurrent.futures.ProcessPoolExecutor` or an
+        executor that distributes the work among several machines
+        (e.g. from the :py:mod:`mpi4py.futures` or
+        :py:mod:`distributed` packages). The function arguments and
+        the partial volumes must be picklable.
+    num_partitions: int or None
+        Number of partitions; Defaults to the number of cores set
+        with :func:`odtbrain.resource_context`. Every partition
+        contains at least two angles.
+    weight_angles: bool
+        See :func:`backpropagate_3d`; The weights are computed
+        from all angles before partitioning.
+    count, max_count: multiprocessing.Value or `None`
+        Can be used to monitor the progress of the algorithm.
+        `count.value` is incremented by the number of angles of a
+        partition when its partial volume is finished.
+
+    Returns
+    -------
+    f: ndarray of shape (Nx, Ny, Nx)
+        The reconstruction (see :func:`backpropagate_3d`)
+
+    Notes
+    -----
+    Each worker uses `num_cores` threads and processes (see
+    :func:`backpropagate_3d`). For local process pools, set
+    `num_cores` such that the product with the number of workers
+    does not exceed the number of cores (see
+    :func:`odtbrain.split_cores`).
+
+    With `intp_method="rotate"`, the volume is passed to the worker
+    processes of the rotation via the pool initializer. Thus,
+    executors that run several reconstructions concurrently in the
+    same process (e.g. thread pools) can be used with all
+    interpolation methods.
+    """
+    return _backpropagate_partitioned(
+        backpropagate_3d, uSin, angles, args, kwargs, executor=executor,
+        num_partitions=num_partitions, weight_angles=weight_angles,
+        count=count, max_count=max_count)
+
+
+def backpropagate_3d_tilted_partitioned(uSin, angles, *args, executor,
+                                        num_partitions=None,
+                                        weight_angles=True, count=None,
+                                        max_count=None, **kwargs):
+    """Angle-partitioned version of :func:`backpropagate_3d_tilted`
+
+    See :func:`backpropagate_3d_partitioned` for details.
+    """
+    angles = np.squeeze(angles)
+    if angles.ndim == 1:
+        bound = inspect.signature(backpropagate_3d_tilted).bind(
+            uSin, angles, *args, **kwargs)
+        tilted_axis = bound.arguments.get("tilted_axis", [0, 1, 0])
+        if weight_angles:
+            # weights of the angles about the tilted axis
+            uSin = uSin * util.compute_angle_weights_1d(angles).reshape(
+                -1, 1, 1)
+            weight_angles = False
+        angles = _tilted_points(angles, tilted_axis)
+    return _backpropagate_partitioned(
+        backpropagate_3d_tilted, uSin, angles, args, kwargs,
+        executor=executor, num_partitions=num_partitions,
+        weight_angles=weight_angles, count=count, max_count=max_count)
@@ -1,49 +1,143 @@
 """Data pre-processing in optical tomography"""
+import ctypes
+import multiprocessing as mp
+
+import numexpr as ne
 import numpy as np
 from scipy.stats import mode
 from skimage.restoration import unwrap_phase
 
+from . import _fft
+from . import _resources
+from . import util
+
 
 def align_unwrapped(sino):
     """Align an unwrapped phase array to zero-phase
 
     All operations are performed in-place.
     """
-    samples = []
     if len(sino.shape) == 2:
         # 2D
         # take 1D samples at beginning and end of array
-        samples.append(sino[:, 0])
-        samples.append(sino[:, 1])
-        samples.append(sino[:, 2])
-        samples.append(sino[:, -1])
-        samples.append(sino[:, -2])
+        samples = sino[:, [0, 1, 2, -1, -2]].transpose()
 
     elif len(sino.shape) == 3:
         # 3D
         # take 1D samples at beginning and end of array
-        samples.append(sino[:, 0, 0])
-        samples.append(sino[:, 0, -1])
-        samples.append(sino[:, -1, 0])
-        samples.append(sino[:, -1, -1])
-        samples.append(sino[:, 0, 1])
+        samples = sino[:, [0, 0, -1, -1, 0], [0, -1, 0, -1, 1]].transpose()
 
     # find discontinuities in the samples
-    steps = np.zeros((len(samples), samples[0].shape[0]))
-    for i in range(len(samples)):
-        t = np.unwrap(samples[i])
-        steps[i] = samples[i] - t
+    steps = samples - np.unwrap(samples, axis=-1)
 
     # if the majority believes so, add a step of PI
-    remove = mode(steps, axis=0)[0][0]
+    # (The shape of the result of `mode` depends on the scipy version.)
+    remove = np.asarray(mode(steps, axis=0)[0], dtype=float).reshape(-1)
 
     # obtain divmod min
     twopi = 2*np.pi
     minimum = divmod_neg(np.min(sino), twopi)[0]
     remove += minimum*twopi
 
-    for i in range(len(sino)):
-        sino[i] -= remove[i]
+    sino -= remove.reshape((-1,) + (1,) * (len(sino.shape) - 1))
+
+
+def _unwrap_3d(phiR, num_cores):
+    """Unwrap each projection of a 3D phase sinogram (in-place)
+
+    The projections are distributed among `num_cores` processes
+    that unwrap them in a shared array. The shared array is passed
+    to the workers when they are started (see :func:`_unwrap_init`),
+    which works with all start methods of :mod:`multiprocessing`.
+    """
+    if num_cores == 1 or len(phiR) == 1:
+        for i in range(len(phiR)):
+            phiR[i] = unwrap_phase(phiR[i])
+        return
+
+    shared_array_base = mp.Array(ctypes.c_double, phiR.size)
+    _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
+    _shared_array = _shared_array.reshape(phiR.shape)
+    _shared_array[:] = phiR
+
+    bounds = np.linspace(0, len(phiR), num_cores + 1).astype(int)
+    targ_args = [(bounds[t], bounds[t + 1]) for t in range(num_cores)]
+    with mp.Pool(processes=num_cores, initializer=_unwrap_init,
+                 initargs=(shared_array_base, phiR.shape)) as pool:
+        pool.map(_unwrap_slices, targ_args)
+
+    phiR[:] = _shared_array
+
+
+def _unwrap_3d_lsq(phiR, num_cores):
+    """Least-squares unwrapping of each projection (in-place)
+
+    This implements the unweighted least-squares phase unwrapping
+    with discrete cosine transforms (Neumann boundary conditions)
+    :cite:`Ghiglia1994`. All projections are unwrapped at once with
+    one batched forward and inverse transform. Finally, the result
+    is made congruent with the wrapped input phase, such that it
+    differs from `phiR` only by multiples of 2PI.
+    """
+    (la, lny, lnx) = phiR.shape
+    twopi = 2 * np.pi
+
+    def wrap(x):
+        return x - twopi * np.rint(x / twopi)
+
+    # The divergence of the wrapped phase gradient is the right-hand
+    # side of the discrete Poisson equation.
+    rho = _fft.empty_aligned(phiR.shape, np.float64)
+    rho[:] = 0
+    dx = wrap(np.diff(phiR, axis=2))
+    rho[:, :, :-1] += dx
+    rho[:, :, 1:] -= dx
+    del dx
+    dy = wrap(np.diff(phiR, axis=1))
+    rho[:, :-1, :] += dy
+    rho[:, 1:, :] -= dy
+    del dy
+
+    # DCT-II (REDFT10) and its inverse DCT-III (REDFT01)
+    kwargs = {"axes": (1, 2),
+              "threads": num_cores,
+              "flags": ["FFTW_ESTIMATE"]}
+    dct_plan = _fft.plan(rho, rho, direction=["FFTW_REDFT10"] * 2,
+                         **kwargs)
+    idct_plan = _fft.plan(rho, rho, direction=["FFTW_REDFT01"] * 2,
+                          **kwargs)
+    dct_plan.execute()
+
+    # Solve the Poisson equation in Fourier space. The inverse
+    # transform is not normalized.
+    ky = np.pi * np.arange(lny).reshape(-1, 1) / lny
+    kx = np.pi * np.arange(lnx).reshape(1, -1) / lnx
+    eigv = (2 * np.cos(ky) + 2 * np.cos(kx) - 4) * 4 * lny * lnx
+    # the mean value is arbitrary
+    eigv[0, 0] = 1
+    rho[:, 0, 0] = 0
+    rho /= eigv
+    idct_plan.execute()
+
+    # congruence with the wrapped phase
+    phiR[:] = rho + wrap(phiR - rho)
+
+
+#: Shared array of an unwrapping worker (see :func:`_unwrap_init`)
+_unwrap_array = None
+
+
+def _unwrap_init(shared_array_base, shape):
+    """Initialize an unwrapping worker with the shared array"""
+    global _unwrap_array
+    _unwrap_array = np.ctypeslib.as_array(
+        shared_array_base.get_obj()).reshape(shape)
+
+
+def _unwrap_slices(d):
+    (amin, amax) = d
+    for i in range(amin, amax):
+        _unwrap_array[i] = unwrap_phase(_unwrap_array[i])
 
 
 def divmod_neg(a, b):
@@ -57,7 +151,9 @@ def divmod_neg(a, b):
     return q, r
 
 
-def sinogram_as_radon(uSin, align=True):
+@_resources.with_resources
+def sinogram_as_radon(uSin, align=True, out=None, num_cores=None,
+                      unwrap_method="skimage"):
     """Compute the phase from a complex wave field sinogram
 
     This step is essential when using the ray approximation before
@@ -72,11 +168,40 @@ def sinogram_as_radon(uSin, align=True):
         through the angles :math:`\phi_0`.
     align: bool
         Tries to correct for a phase offset in the phase sinogram.
+    out: 2d or 3d real ndarray or None
+        If given, the phase is computed in this array. Its shape
+        must match that of `uSin`.
+
+        .. versionadded:: 0.3.0
+    num_cores: int or None
+        The number of cores used for unwrapping the projections of
+        a 3D sinogram in parallel. This value defaults to the number
+        of cores set with :func:`odtbrain.resource_context`.
+
+        .. versionadded:: 0.3.0
+    unwrap_method: str
+        Algorithm used for unwrapping the phase of 3D sinograms.
+
+        - "skimage": unwrap each projection with
+          :func:`skimage.restoration.unwrap_phase` (robust against
+          noise and phase residues)
+        - "lsq": unweighted least-squares unwrapping of all
+          projections at once using batched discrete cosine
+          transforms :cite:`Ghiglia1994`. This is much faster, but
+          only yields correct results for well-sampled, low-noise
+          data without phase residues.
+
+        2D sinograms are always unwrapped with :func:`numpy.unwrap`
+        (for 1D data, least-squares unwrapping is identical to
+        integrating the wrapped phase differences).
+
+        .. versionadded:: 0.3.0
 
     Returns
     -------
     phase: 2d or 3d real ndarray
-        The unwrapped phase array corresponding to `uSin`.
+        The unwrapped phase array corresponding to `uSin`
+        (`out` if given).
 
     See Also
     --------
@@ -84,17 +209,30 @@ def sinogram_as_radon(uSin, align=True):
     radontea.backproject_3d: e.g. reconstruction via backprojection
     """
     ndims = len(uSin.shape)
+    assert unwrap_method in ["skimage", "lsq"], \
+        "`unwrap_method` must be 'skimage' or 'lsq'."
+
+    if out is None:
+        # numexpr computes in double precision (keep single precision)
+        dtype = np.finfo(np.result_type(uSin, np.complex64)).dtype
+        out = np.empty(uSin.shape, dtype=dtype)
+
+    # same as `np.angle`, but without temporary arrays
+    phiR = _evaluate("arctan2(imag(uSin), real(uSin))",
+                     local_dict={"uSin": uSin},
+                     out=out)
 
     if ndims == 2:
         # unwrapping is very important
-        phiR = np.unwrap(np.angle(uSin), axis=-1)
+        phiR[:] = np.unwrap(phiR, axis=-1)
     else:
         # Unwrap gets the dimension of the problem from the input
         # data. Since we have a sinogram, we need to pass it the
         # slices one by one.
-        phiR = np.angle(uSin)
-        for i in range(len(phiR)):
-            phiR[i] = unwrap_phase(phiR[i])
+        if unwrap_method == "lsq":
+            _unwrap_3d_lsq(phiR, num_cores)
+        else:
+            _unwrap_3d(phiR, num_cores)
 
     if align:
         align_unwrapped(phiR)
@@ -102,7 +240,9 @@ def sinogram_as_radon(uSin, align=True):
     return phiR
 
 
-def sinogram_as_rytov(uSin, u0=1, align=True):
+@_resources.with_resources
+def sinogram_as_rytov(uSin, u0=1, align=True, out=None,
+                      num_cores=None, unwrap_method="skimage"):
     """Convert the complex wave field sinogram to the Rytov phase
 
     This method applies the Rytov approximation to the
@@ -142,24 +282,68 @@ def sinogram_as_rytov(uSin, u0=1, align=True):
         to the center of the reconstruction volume.
     align: bool
         Tries to correct for a phase offset in the phase sinogram.
+    out: 2d or 3d complex ndarray or None
+        If given, the Rytov sinogram is computed in this array. Its
+        shape must match that of `uSin`. Setting `out=uSin`
+        converts `uSin` in-place without allocating any additional
+        full-size arrays. In combination with `copy=False` in e.g.
+        :func:`backpropagate_3d`, this considerably reduces the
+        memory footprint of the reconstruction.
+
+        .. versionadded:: 0.3.0
+    num_cores: int or None
+        The number of cores used for unwrapping the projections of
+        a 3D sinogram in parallel. This value defaults to the number
+        of cores set with :func:`odtbrain.resource_context`.
+
+        .. versionadded:: 0.3.0
+    unwrap_method: str
+        Algorithm used for unwrapping the phase of 3D sinograms.
+
+        - "skimage": unwrap each projection with
+          :func:`skimage.restoration.unwrap_phase` (robust against
+          noise and phase residues)
+        - "lsq": unweighted least-squares unwrapping of all
+          projections at once using batched discrete cosine
+          transforms :cite:`Ghiglia1994`. This is much faster, but
+          only yields correct results for well-sampled, low-noise
+          data without phase residues.
+
+        2D sinograms are always unwrapped with :func:`numpy.unwrap`
+        (for 1D data, least-squares unwrapping is identical to
+        integrating the wrapped phase differences).
+
+        .. versionadded:: 0.3.0
 
     Returns
     -------
     uB: 2d or 3d real ndarray
         The Rytov-filtered complex sinogram
-        :math:`u_\mathrm{B}(\mathbf{r})`.
+        :math:`u_\mathrm{B}(\mathbf{r})` (`out` if given).
 
     See Also
     --------
     skimage.restoration.unwrap_phase: phase unwrapping
     """
     ndims = len(uSin.shape)
+    assert unwrap_method in ["skimage", "lsq"], \
+        "`unwrap_method` must be 'skimage' or 'lsq'."
+
+    if out is None:
+        # numexpr computes in double precision (keep single precision)
+        out = np.empty(uSin.shape,
+                       dtype=np.result_type(uSin, u0, np.complex64))
 
-    # imaginary part of the complex Rytov phase
-    phiR = np.angle(uSin / u0)
+    # complex Rytov phase:
+    # The real part is the logarithm of the amplitude `lna` and
+    # the imaginary part is the wrapped phase `phiR`. numexpr
+    # computes this in one pass without temporary arrays.
+    rytovSin = _evaluate("log(uSin / u0)",
+                         local_dict={"uSin": uSin, "u0": u0},
+                         out=out)
 
-    # real part of the complex Rytov phase
-    lna = np.log(np.absolute(uSin / u0))
+    # imaginary part of the complex Rytov phase (view)
+    phiR = rytovSin.imag
 
     if ndims == 2:
         # unwrapping is very important
@@ -168,15 +352,176 @@ def sinogram_as_rytov(uSin, u0=1, align=True):
         # Unwrap gets the dimension of the problem from the input
         # data. Since we have a sinogram, we need to pass it the
         # slices one by one.
-        for i in range(len(phiR)):
-            phiR[i] = unwrap_phase(phiR[i])
+        if unwrap_method == "lsq":
+            _unwrap_3d_lsq(phiR, num_cores)
+        else:
+            _unwrap_3d(phiR, num_cores)
 
     if align:
         align_unwrapped(phiR)
 
     # rytovSin = u0*(np.log(a/a0) + 1j*phiR)
     # u0 is one - we already did background correction
+    if not (np.isscalar(u0) and u0 == 1):
+        _evaluate("u0 * rytovSin",
+                  local_dict={"u0": u0, "rytovSin": rytovSin},
+                  out=rytovSin)
+    return rytovSin
+
+
+@_resources.with_resources
+def refocus_sinogram(uSin, res, nm, distance, padding=True, padfac=1.75,
+                     pad_strategy="pow2", padval=None, chunk_size=None,
+                     out=None, num_cores=None):
+    """Numerically refocus a complex wave field sinogram
+
+    Each projection is propagated by `distance` with the angular
+    spectrum method, i.e. its Fourier transform is multiplied with
+
+    .. math::
+        \\exp\\left(i k_\\mathrm{m} (M - 1) d \\right)
 
-    # complex rytov phase:
-    rytovSin = 1j * phiR + lna
-    return u0 * rytovSin
+    with :math:`k_\\mathrm{m}` and :math:`M` as defined in
+    :func:`backpropagate_3d`. Evanescent waves are discarded. The
+    projections are padded as in :func:`backpropagate_3d` and
+    refocused in chunks with batched Fourier transforms.
+
+    Parameters
+    ----------
+    uSin: 2d or 3d complex ndarray
+        The background-corrected sinogram of the complex wave
+        :math:`u(\\mathbf{r})/u_0(\\mathbf{r})`. The first axis
+        iterates through the angles :math:`\\phi_0`.
+    res: float
+        Vacuum wavelength of the light :math:`\\lambda` in pixels
+    nm: float
+        Refractive index of the surrounding medium
+        :math:`n_\\mathrm{m}`
+    distance: float
+        Propagation distance :math:`d` in pixels; Use `-lD` to
+        focus a sinogram that was recorded at the distance `lD`
+        from the center of rotation onto the center of rotation.
+    padding: bool or tuple of bools
+        Padding of the detector axes (a tuple `(x, y)` for 3D
+        sinograms, see :func:`backpropagate_3d`)
+    padfac: float
+        Padding factor (see :func:`backpropagate_3d`)
+    pad_strategy: str
+        How the padded size is chosen (see :func:`backpropagate_3d`)
+    padval: float or None
+        The value used for padding; If set to `None`, the edge
+        values are used (see :func:`numpy.pad`).
+    chunk_size: int or None
+        Number of projections that are refocused at once. If set to
+        `None`, the chunk size is chosen such that the buffer of the
+        padded projections does not exceed 32MB.
+    out: 2d or 3d complex ndarray or None
+        If given, the refocused sinogram is computed in this array.
+        Its shape must match that of `uSin`. Setting `out=uSin`
+        refocuses `uSin` in-place; Only the buffer of one chunk is
+        allocated. The result can then be converted in-place with
+        :func:`sinogram_as_rytov` and reconstructed with `copy=False`.
+    num_cores: int or None
+        The number of threads used by the Fourier transforms; This
+        value defaults to the number of cores set with
+        :func:`odtbrain.resource_context`.
+
+    Returns
+    -------
+    uSin_focused: 2d or 3d complex ndarray
+        The refocused sinogram (`out` if given)
+
+    Notes
+    -----
+    Refocusing is the same propagation that the parameter `lD` of
+    the reconstruction algorithms applies to the filtered
+    projections; `refocus_sinogram(uSin, res, nm, -lD)` followed by
+    a reconstruction with `lD=0` is equivalent to a reconstruction
+    with `lD`. For the Rytov approximation, the wave field must be
+    refocused before :func:`sinogram_as_rytov` is applied.
+
+    .. versionadded:: 0.3.0
+    """
+    ndet = len(uSin.shape) - 1
+    assert ndet in [1, 2], "`uSin` must be a 2D or 3D sinogram."
+    if isinstance(padding, (bool, np.bool_)):
+        padding = (padding,) * ndet
+    assert len(padding) == ndet, \
+        "`padding` must have one entry per detector axis."
+    dtype_complex = np.result_type(uSin.dtype, np.complex64)
+    if out is None:
+        out = np.empty(uSin.shape, dtype=dtype_complex)
+    assert out.shape == uSin.shape, "`out` must have the shape of `uSin`."
+    A = uSin.shape[0]
+    # detector axes in array order, i.e. `(x,)` or `(y, x)`
+    dshape = uSin.shape[1:]
+    padding = padding[::-1]
+
+    pads = []
+    for size, pad_axis in zip(dshape, padding):
+        if pad_axis:
+            pad = util.compute_padded_size(size, padfac,
+                                           strategy=pad_strategy) - size
+        else:
+            pad = 0
+        padl = int(np.ceil(pad / 2))
+        pads.append((padl, pad - padl))
+    pshape = tuple(size + pl + pr for size, (pl, pr) in zip(dshape, pads))
+
+    # propagation kernel including the normalization of the inverse FFT
+    km = (2 * np.pi * nm) / res
+    ksq = 0
+    for ii, size in enumerate(pshape):
+        kk = 2 * np.pi * np.fft.fftfreq(size)
+        ksq = ksq + kk.reshape((-1,) + (1,) * (ndet - 1 - ii))**2
+    filter_klp = (ksq < km**2)
+    M = 1. / km * np.sqrt((km**2 - ksq) * filter_klp)
+    kernel = np.exp(1j * km * (M - 1) * distance) * filter_klp
+    kernel = (kernel / np.prod(pshape)).astype(dtype_complex)
+
+    if chunk_size is None:
+        nbytes = np.prod(pshape) * dtype_complex.itemsize
+        chunk_size = 2**25 // nbytes
+    chunk_size = max(1, min(A, chunk_size))
+    # The projections of a chunk are transformed with a single
+    # (batched) plan.
+    buffer = _fft.empty_aligned((chunk_size,) + pshape, dtype_complex)
+    axes = tuple(range(1, ndet + 1))
+    fft_plan = _fft.plan(buffer, buffer, axes=axes, threads=num_cores,
+                         flags=["FFTW_ESTIMATE"])
+    ifft_plan = _fft.plan(buffer, buffer, axes=axes, threads=num_cores,
+                          direction="FFTW_BACKWARD",
+                          flags=["FFTW_ESTIMATE"])
+    crop = tuple(slice(pl, pl + size) for size, (pl, _) in zip(dshape, pads))
+
+    for c0 in range(0, A, chunk_size):
+        nc = min(chunk_size, A - c0)
+        chunk = uSin[c0:c0 + nc]
+        if padval is None:
+            buffer[:nc] = np.pad(chunk, [(0, 0)] + pads, mode="edge")
+        else:
+            buffer[:nc] = np.pad(chunk, [(0, 0)] + pads,
+                                 mode="linear_ramp",
+                                 end_values=(padval,))
+        buffer[nc:] = 0
+        fft_plan.execute()
+        buffer *= kernel
+        ifft_plan.execute()
+        out[c0:c0 + nc] = buffer[(slice(0, nc),) + crop]
+    return out
+
+
+def _evaluate(ex, local_dict, out=None):
+    """Wrapper for :func:`numexpr.evaluate` that supports any `out`
+
+    numexpr only computes in double precision. If `out` does not
+    have the data type of the result, then the result is copied to
+    `out`.
+    """
+    if out is None:
+        return ne.evaluate(ex, local_dict=local_dict)
+    try:
+        ne.evaluate(ex, local_dict=local_dict, out=out, casting="same_kind")
+    except (TypeError, ValueError):
+        out[:] = ne.evaluate(ex, local_dict=local_dict)
+    return out
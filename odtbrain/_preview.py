@@ -0,0 +1,116 @@
+"""Preview reconstructions on a coarser grid"""
+import functools
+import inspect
+
+import numpy as np
+
+from . import _fft
+
+
+def fourier_downsample(data, factor, axis=-1):
+    """Downsample `data` along `axis` by cropping its Fourier spectrum
+
+    The output has `Nc = N // factor` samples. The sample `j` is
+    located at the input coordinate `factor * (j - (Nc-1)/2) + (N-1)/2`,
+    i.e. the centers of the input and the output grid (which are the
+    centers of rotation of the reconstruction algorithms) coincide.
+    The data are padded with their edge values to (at least) twice
+    their size before Fourier transforming and only the frequencies
+    that can be represented on the coarse grid are kept (an ideal
+    low-pass filter).
+
+    Parameters
+    ----------
+    data: ndarray
+        Real or complex input data
+    factor: int
+        Downsampling factor
+    axis: int
+        Axis along which the data are downsampled
+
+    Returns
+    -------
+    down: ndarray
+        Downsampled data (real if `data` is real)
+    """
+    data = np.moveaxis(np.asarray(data), axis, -1)
+    N = data.shape[-1]
+    Nc = max(1, N // factor)
+    # padded sizes of the fine and the coarse grid
+    Lc = int(np.ceil(2 * N / factor))
+    Lp = Lc * factor
+    pl = (Lp - N) // 2
+    padded = np.pad(data, [(0, 0)] * (data.ndim - 1) + [(pl, Lp - N - pl)],
+                    mode="edge")
+    spec = _fft.fft(padded, axes=(-1,))
+    # shift the first sample of the coarse grid to index zero
+    shift = pl + (N - 1) / 2 - factor * (Nc - 1) / 2
+    k = np.round(np.fft.fftfreq(Lp) * Lp).astype(int)
+    spec *= np.exp(2j * np.pi * k * shift / Lp)
+    # Keep the frequencies |k| < Lc/2 (without the Nyquist frequency,
+    # such that real data remain real).
+    keep = np.abs(k) < Lc / 2
+    coarse = np.zeros(data.shape[:-1] + (Lc,), dtype=spec.dtype)
+    coarse[..., k[keep] % Lc] = spec[..., keep]
+    down = _fft.ifft(coarse, axes=(-1,))[..., :Nc] / factor
+    if not np.iscomplexobj(data):
+        down = down.real.astype(data.dtype)
+    return np.moveaxis(down, -1, axis)
+
+
+def with_preview(func):
+    """Decorator that implements the `preview` keyword arguments
+
+    If `preview` is larger than one, the detector axes of the
+    sinogram are downsampled by this factor with
+    :func:`fourier_downsample` and the wavelength `res` and the
+    distance `lD` are converted to the pixels of the coarse grid.
+    The reconstruction on the coarse grid is converted back to
+    the units of the original pixels (the object function scales
+    with the inverse square of the pixel size). If `preview_angles`
+    is larger than one, only every `preview_angles`-th angle is
+    used.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        preview = bound.arguments.get("preview", 1)
+        preview_angles = bound.arguments.get("preview_angles", 1)
+        if preview == 1 and preview_angles == 1:
+            return func(*args, **kwargs)
+        assert int(preview) == preview and preview >= 1, \
+            "`preview` must be a positive integer."
+        assert int(preview_angles) == preview_angles \
+            and preview_angles >= 1, \
+            "`preview_angles` must be a positive integer."
+        uSin = np.asarray(bound.arguments["uSin"])
+        angles = np.asarray(bound.arguments["angles"])
+        if preview_angles > 1:
+            uSin = uSin[::preview_angles]
+            angles = angles[::preview_angles]
+        if preview > 1:
+            # all axes except the angular axis
+            for axis in range(1, uSin.ndim):
+                uSin = fourier_downsample(uSin, preview, axis=axis)
+            bound.arguments["res"] = bound.arguments["res"] / preview
+            lD = bound.arguments.get("lD", 0)
+            if uSin.ndim == 3:
+                # The 3D algorithms propagate the slice with the index
+                # `i` by the distance `i - N/2`, i.e. the slices of the
+                # coarse grid would be propagated by `(preview-1)/2`
+                # pixels less than the slices of the original grid at
+                # the same positions (see `fourier_downsample`).
+                lD -= (preview - 1) / 2
+            bound.arguments["lD"] = lD / preview
+        bound.arguments["uSin"] = uSin
+        bound.arguments["angles"] = angles
+        bound.arguments["preview"] = 1
+        bound.arguments["preview_angles"] = 1
+        f = func(*bound.args, **bound.kwargs)
+        if preview > 1:
+            f /= preview**2
+        return f
+
+    return wrapper
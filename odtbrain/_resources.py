@@ -0,0 +1,216 @@
+"""Scoped control of threads and worker processes
+
+The reconstruction algorithms use several independent sources of
+parallelism: numexpr threads, FFT threads (see :mod:`odtbrain._fft`),
+BLAS threads (via numpy/scipy), and worker processes or threads
+(`num_cores`). :func:`resource_context` sets all of them at once and
+restores the previous settings afterwards.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import multiprocessing as mp
+import threading
+
+import numexpr as ne
+
+from . import _fft
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+
+#: Default number of cores of the current thread (and context)
+_num_cores = contextvars.ContextVar("odtbrain_num_cores", default=None)
+
+# The numexpr and BLAS thread counts are global for the process.
+# They are set to the values of the most recently entered context
+# that is still active in any thread (see `_apply_global`).
+_lock = threading.Lock()
+_active = []
+_global = {"ne_original": None, "blas_limits": None}
+
+# Progress counters without a lock of their own (see `increment`)
+_count_lock = threading.Lock()
+
+
+def get_num_cores():
+    """Return the number of cores used by default for reconstructions
+
+    This is the value set with :func:`resource_context` in the
+    current thread or, outside of such a context, the number of
+    cores on the system.
+    """
+    num_cores = _num_cores.get()
+    if num_cores is None:
+        return mp.cpu_count()
+    return num_cores
+
+
+def _apply_global():
+    """Apply the process-global settings of the active contexts
+
+    Must be called with `_lock` acquired.
+    """
+    if not _active:
+        if _global["ne_original"] is not None:
+            ne.set_num_threads(_global["ne_original"])
+            _global["ne_original"] = None
+        if _global["blas_limits"] is not None:
+            _global["blas_limits"].restore_original_limits()
+            _global["blas_limits"] = None
+        return
+    num_cores = _active[-1][1]
+    # `blas_threads=None` does not change the BLAS limit
+    blas_threads = None
+    for entry in reversed(_active):
+        if entry[2] is not None:
+            blas_threads = entry[2]
+            break
+    previous = ne.set_num_threads(num_cores)
+    if _global["ne_original"] is None:
+        _global["ne_original"] = previous
+    if threadpoolctl is None:
+        return
+    if blas_threads is not None:
+        limits = threadpoolctl.threadpool_limits(limits=blas_threads,
+                                                 user_api="blas")
+        if _global["blas_limits"] is None:
+            # remembers the original limits
+            _global["blas_limits"] = limits
+    elif _global["blas_limits"] is not None:
+        _global["blas_limits"].restore_original_limits()
+        _global["blas_limits"] = None
+
+
+def split_cores(num_jobs, num_cores=None):
+    """Split a budget of cores among concurrent reconstructions
+
+    Parameters
+    ----------
+    num_jobs: int
+        Number of reconstructions that run at the same time
+    num_cores: int or None
+        Total number of cores; Defaults to :func:`get_num_cores`.
+
+    Returns
+    -------
+    shares: list of ints
+        Number of cores for each reconstruction; The shares differ
+        by at most one and sum up to `num_cores`. If there are more
+        reconstructions than cores, each of them gets one core.
+    """
+    assert num_jobs >= 1, "`num_jobs` must be a positive integer."
+    if num_cores is None:
+        num_cores = get_num_cores()
+    base, rest = divmod(num_cores, num_jobs)
+    return [max(1, base + (ii < rest)) for ii in range(num_jobs)]
+
+
+def get_mp_context():
+    """Multiprocessing context of the worker processes
+
+    Forking a process while other threads hold a lock (e.g. of FFTW
+    in a concurrent reconstruction) can deadlock the child. If other
+    threads are running and the default start method is "fork", the
+    workers are therefore forked from a single-threaded server
+    process ("forkserver") that has already imported ODTbrain.
+    """
+    if (mp.get_start_method() == "fork"
+            and threading.active_count() > 1
+            and "forkserver" in mp.get_all_start_methods()):
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["odtbrain"])
+        return ctx
+    return mp.get_context()
+
+
+def increment(count, value):
+    """Increment the progress counter `count.value` atomically
+
+    `count` may be updated from several threads or processes
+    (e.g. by the workers of an executor).
+    """
+    if hasattr(count, "get_lock"):
+        lock = count.get_lock()
+    else:
+        lock = _count_lock
+    with lock:
+        count.value += value
+
+
+@contextlib.contextmanager
+def resource_context(num_cores=None, blas_threads=1):
+    """Limit the threads and processes used for reconstructions
+
+    Within this context, the number of numexpr threads, FFT threads,
+    and the default number of worker processes (`num_cores` of the
+    reconstruction algorithms) are set to `num_cores`. The previous
+    settings are restored when the context is left.
+
+    Parameters
+    ----------
+    num_cores: int or None
+        Number of cores; Defaults to :func:`get_num_cores`.
+    blas_threads: int or None
+        Number of threads of the BLAS library used by numpy and
+        scipy; The default (1) prevents oversubscription when BLAS
+        routines are called from the worker processes. If set to
+        `None`, the BLAS library is not limited. This requires the
+        :mod:`threadpoolctl` package and is ignored otherwise.
+
+    Notes
+    -----
+    The default number of cores (:func:`get_num_cores`) and the
+    number of FFT threads are local to the current thread, i.e.
+    reconstructions in different threads can use different
+    contexts. The numexpr and BLAS thread counts are global for
+    the process: With contexts that are active in several threads
+    at the same time, they are set to the values of the most
+    recently entered context, and the original values are restored
+    when the last context is left. To run several reconstructions
+    side by side with separate budgets, start them in separate
+    processes or threads and assign each of them a share of the
+    available cores (see :func:`split_cores`).
+    """
+    if num_cores is None:
+        num_cores = get_num_cores()
+    assert num_cores >= 1, "`num_cores` must be a positive integer."
+    entry = (object(), num_cores, blas_threads)
+    token = _num_cores.set(num_cores)
+    fft_token = _fft._threads.set(num_cores)
+    with _lock:
+        _active.append(entry)
+        _apply_global()
+    try:
+        yield
+    finally:
+        with _lock:
+            _active.remove(entry)
+            _apply_global()
+        _fft._threads.reset(fft_token)
+        _num_cores.reset(token)
+
+
+def with_resources(func):
+    """Decorator that runs `func` within :func:`resource_context`
+
+    The keyword argument `num_cores` of `func` defaults to `None`,
+    which is replaced by :func:`get_num_cores`.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        num_cores = bound.arguments.get("num_cores")
+        if num_cores is None:
+            num_cores = get_num_cores()
+        bound.arguments["num_cores"] = num_cores
+        with resource_context(num_cores=num_cores, blas_threads=None):
+            return func(*bound.args, **bound.kwargs)
+
+    return wrapper
@@ -0,0 +1,230 @@
+"""Rotation kernels for backpropagation about the y-axis"""
+import numpy as np
+import scipy.special
+
+from . import _fft
+
+
+def get_tiles(lnz, lnx, tile_size):
+    """Split the x-z plane of the output volume into square tiles
+
+    Parameters
+    ----------
+    lnz, lnx: int
+        Size of the output volume in z and x.
+    tile_size: int
+        Edge length of the tiles in pixels.
+
+    Returns
+    -------
+    tiles: list of tuples of slices
+        The z- and x-slices of each tile.
+    """
+    assert tile_size > 0, "`tile_size` must be a positive integer."
+    tiles = []
+    for z0 in range(0, lnz, tile_size):
+        for x0 in range(0, lnx, tile_size):
+            tiles.append((slice(z0, min(z0 + tile_size, lnz)),
+                          slice(x0, min(x0 + tile_size, lnx))))
+    return tiles
+
+
+def gather_accumulate(proj_zxy, outarr, ang, tiles, pool=None):
+    """Rotate a filtered projection about the y-axis and add it to `outarr`
+
+    This is a voxel-driven alternative to rotating the full
+    filtered projection with :func:`scipy.ndimage.rotate` and adding
+    the result to the output volume afterwards. For every voxel of
+    `outarr`, the source coordinate in the filtered projection is
+    computed analytically and the value is gathered with linear
+    interpolation. The rotation geometry is identical to that of
+    :func:`scipy.ndimage.rotate` with `axes=(0, 2)`, `reshape=False`,
+    `order=1`, and `mode="constant"`.
+
+    Parameters
+    ----------
+    proj_zxy: (Nz, Nx, Ny) ndarray
+        Filtered projection with the y-axis as the last axis.
+        Because all voxels along y share the same source coordinates
+        in the x-z plane, this memory layout allows to gather
+        contiguous rows.
+    outarr: (Nz, Ny, Nx) ndarray
+        Output volume to which the rotated projection is added.
+    ang: float
+        Rotation angle in degrees (see :func:`scipy.ndimage.rotate`).
+    tiles: list of tuples of slices
+        Output tiles in the x-z plane (see :func:`get_tiles`).
+    pool: instance of multiprocessing.pool.ThreadPool or None
+        If given, the tiles are processed in parallel. The tiles do
+        not overlap, so no locking is required.
+    """
+    cos = scipy.special.cosdg(ang)
+    sin = scipy.special.sindg(ang)
+    targ_args = [(proj_zxy, outarr, cos, sin, tt) for tt in tiles]
+    if pool is None:
+        for d in targ_args:
+            _gather_tile(d)
+    else:
+        pool.map(_gather_tile, targ_args)
+
+
+def _gather_tile(d):
+    (proj_zxy, outarr, cos, sin, (slz, slx)) = d
+    lnz, lnx, lny = proj_zxy.shape
+    cz = (lnz - 1) / 2
+    cx = (lnx - 1) / 2
+    zo = np.arange(slz.start, slz.stop).reshape(-1, 1) - cz
+    xo = np.arange(slx.start, slx.stop).reshape(1, -1) - cx
+    # source coordinates (same matrix as in scipy.ndimage.rotate)
+    zi = cz + cos * zo + sin * xo
+    xi = cx - sin * zo + cos * xo
+    # Points outside of the input volume are set to zero
+    # (mode "constant" with `cval=0`).
+    valid = (zi >= 0) & (zi <= lnz - 1) & (xi >= 0) & (xi <= lnx - 1)
+    if not np.any(valid):
+        return
+    zi = zi[valid]
+    xi = xi[valid]
+    z0 = np.clip(np.floor(zi).astype(int), 0, max(lnz - 2, 0))
+    x0 = np.clip(np.floor(xi).astype(int), 0, max(lnx - 2, 0))
+    z1 = np.minimum(z0 + 1, lnz - 1)
+    x1 = np.minimum(x0 + 1, lnx - 1)
+    fz = (zi - z0).reshape(-1, 1)
+    fx = (xi - x0).reshape(-1, 1)
+    # linear interpolation of all y-values at once
+    vals = (1 - fz) * ((1 - fx) * proj_zxy[z0, x0] + fx * proj_zxy[z0, x1])
+    vals += fz * ((1 - fx) * proj_zxy[z1, x0] + fx * proj_zxy[z1, x1])
+    tile = np.zeros((zo.size, xo.size, lny), dtype=outarr.dtype)
+    tile[valid] = vals
+    outarr[slz, :, slx] += tile.transpose(0, 2, 1)
+
+
+class FourierRotator(object):
+    """Rotation about the y-axis via three-pass Fourier shears
+
+    The rotation by an angle :math:`\\theta` is split into a rotation
+    by a multiple of 90° (which is exact, see :func:`numpy.rot90`) and
+    a residual rotation :math:`|r| \\le 45°` that is decomposed into
+    three shears
+
+    .. math::
+        R(r) = S_x(-\\tan(r/2)) \\, S_z(\\sin r) \\, S_x(-\\tan(r/2)).
+
+    Each shear is a row-wise sub-pixel shift that is computed with a
+    phase ramp in Fourier space. In contrast to spline interpolation,
+    this is an (up to boundary effects) exact interpolation of
+    band-limited data and its cost scales with the FFT. The data are
+    zero-padded to twice their size in the x-z plane to prevent
+    wrap-around. The FFTW plans are created once and reused for all
+    angles.
+
+    The rotation geometry is identical to that of
+    :func:`scipy.ndimage.rotate` with `axes=(0, 2)`,
+    `reshape=False`, and `mode="constant"`.
+    """
+
+    def __init__(self, shape, dtype_complex, num_cores=1, ychunk=None,
+                 backend=None):
+        """
+        Parameters
+        ----------
+        shape: tuple of ints (Nz, Ny, Nx)
+            Shape of the arrays to rotate; The x-z plane must be square.
+        dtype_complex: dtype object
+            Complex data type used for the computation
+        num_cores: int
+            Number of threads used by FFTW
+        ychunk: int or None
+            Number of y-slices that are rotated at once. The padded
+            buffer has the size `(2*Nz, ychunk, 2*Nx)`. Defaults to a
+            quarter of `Ny`, such that the buffer is about as large
+            as the input array.
+        backend: str or None
+            FFT backend; Defaults to :func:`odtbrain._fft.get_backend`.
+        """
+        lnz, lny, lnx = shape
+        assert lnz == lnx, "The x-z plane must be square."
+        if ychunk is None:
+            ychunk = int(np.ceil(lny / 4))
+        ychunk = max(1, min(ychunk, lny))
+        self.shape = shape
+        self.ychunk = ychunk
+        self.size = lnx
+        # padded size
+        lP = 2 * lnx
+        self.padl = (lP - lnx) // 2
+        self.buffer = _fft.empty_aligned((lP, ychunk, lP),
+                                         dtype_complex)
+        kwargs = {"threads": num_cores,
+                  "flags": ["FFTW_MEASURE"],
+                  "backend": backend}
+        self._fftx = _fft.plan(self.buffer, self.buffer, axes=(2,),
+                               direction="FFTW_FORWARD", **kwargs)
+        self._ifftx = _fft.plan(self.buffer, self.buffer, axes=(2,),
+                                direction="FFTW_BACKWARD", **kwargs)
+        self._fftz = _fft.plan(self.buffer, self.buffer, axes=(0,),
+                               direction="FFTW_FORWARD", **kwargs)
+        self._ifftz = _fft.plan(self.buffer, self.buffer, axes=(0,),
+                                direction="FFTW_BACKWARD", **kwargs)
+        # coordinates relative to the rotation center
+        # (same center as in scipy.ndimage.rotate)
+        coord = np.arange(lP) - self.padl - (lnx - 1) / 2
+        kk = 2 * np.pi * np.fft.fftfreq(lP)
+        self._zc = coord.reshape(-1, 1, 1)
+        self._xc = coord.reshape(1, 1, -1)
+        self._kz = kk.reshape(-1, 1, 1)
+        self._kx = kk.reshape(1, 1, -1)
+
+    def _shear(self, plan, iplan, kk, cc, shift):
+        """Shift rows along the axis of `kk` by `shift*cc` pixels"""
+        lP = self.buffer.shape[0]
+        phase = np.exp(1j * kk * cc * shift)
+        if lP % 2 == 0:
+            # Treat the Nyquist frequency symmetrically, such that
+            # real input data remain real.
+            if kk.shape[0] == lP:
+                phase[lP // 2] = phase[lP // 2].real
+            else:
+                phase[..., lP // 2] = phase[..., lP // 2].real
+        # normalization of the inverse FFT
+        phase /= lP
+        plan.execute()
+        self.buffer *= phase
+        iplan.execute()
+
+    def rotate_add(self, inarr, ang, outarr):
+        """Rotate `inarr` by `ang` and add the result to `outarr`
+
+        Parameters
+        ----------
+        inarr: (Nz, Ny, Nx) ndarray
+            Input array (real or complex)
+        ang: float
+            Rotation angle in degrees (see :func:`scipy.ndimage.rotate`)
+        outarr: (Nz, Ny, Nx) ndarray
+            Output array; If `outarr` is real, only the real part of
+            the rotated array is added.
+        """
+        lny = self.shape[1]
+        ln = self.size
+        pl = self.padl
+        # split into multiple of 90° and residual angle
+        k = int(np.round(ang / 90))
+        rr = np.deg2rad(ang - 90 * k)
+        for y0 in range(0, lny, self.ychunk):
+            y1 = min(y0 + self.ychunk, lny)
+            ly = y1 - y0
+            self.buffer[:] = 0
+            self.buffer[pl:pl + ln, :ly, pl:pl + ln] = np.rot90(
+                inarr[:, y0:y1, :], k % 4, axes=(0, 2))
+            if rr != 0:
+                a = -np.tan(rr / 2)
+                b = np.sin(rr)
+                self._shear(self._fftx, self._ifftx, self._kx, self._zc, a)
+                self._shear(self._fftz, self._ifftz, self._kz, self._xc, b)
+                self._shear(self._fftx, self._ifftx, self._kx, self._zc, a)
+            rotated = self.buffer[pl:pl + ln, :ly, pl:pl + ln]
+            if np.iscomplexobj(outarr):
+                outarr[:, y0:y1, :] += rotated
+            else:
+                outarr[:, y0:y1, :] += rotated.real
@@ -0,0 +1,120 @@
+"""Reconstructions for several sets of parameters"""
+import numpy as np
+
+from . import _resources
+from . import util
+from ._accumulator import Accumulator3D
+
+
+#: Parameters of :func:`backpropagate_3d` that can be varied
+SWEEP_PARAMETERS = ["res", "nm", "lD"]
+
+
+@_resources.with_resources
+def backpropagate_3d_sweep(uSin, angles, res, nm, lD=0, parameters=None,
+                           rows=None, weight_angles=True, onlyreal=False,
+                           padding=(True, True), padfac=1.75,
+                           pad_strategy="pow2", padval=None,
+                           intp_order=2, intp_method="rotate",
+                           tile_size=32, dtype=None, num_cores=None,
+                           save_memory=False, count=None, max_count=None,
+                           verbose=0):
+    """3D backpropagation for several values of `res`, `nm`, and `lD`
+
+    The padding and the Fourier transform of the projections do not
+    depend on the wavelength, the refractive index of the medium,
+    or the distance of the detector. This function transforms each
+    projection once and backpropagates it for every entry of
+    `parameters` (see :class:`odtbrain.Accumulator3D`), e.g. to
+    find the focus position `lD` or the medium index `nm` of a
+    measurement.
+
+    Parameters
+    ----------
+    uSin, angles, res, nm, lD, weight_angles, onlyreal, padding,
+    padfac, pad_strategy, padval, intp_order, intp_method, tile_size,
+    dtype, num_cores, save_memory, verbose:
+        Parameters of :func:`backpropagate_3d`; `angles` must be a
+        1D array (rotation about the y-axis).
+    parameters: list of dicts
+        Each dictionary overrides the values of `res`, `nm`, and
+        `lD` (keys "res", "nm", and "lD") for one reconstruction;
+        Defaults to a single reconstruction with the given values.
+    rows: list of ints or None
+        Indices of the detector rows (slices of the volume along the
+        rotational axis y) that are reconstructed; Set this to a few
+        rows to quickly evaluate many parameters. Defaults to all
+        rows.
+    count, max_count: multiprocessing.Value or `None`
+        Can be used to monitor the progress of the algorithm.
+        `count.value` is incremented by one for every projection and
+        set of parameters.
+
+    Returns
+    -------
+    f: list of ndarrays of shape (Nx, Ny, Nx) or (Nx, len(rows), Nx)
+        The reconstructions for each entry of `parameters`
+
+    Notes
+    -----
+    The angles are weighted (`weight_angles`) and the angular
+    differential is computed as in :func:`backpropagate_3d`, i.e.
+    `backpropagate_3d_sweep(uSin, angles, parameters=[p], ...)[0]`
+    is equal (up to floating point accuracy) to
+    `backpropagate_3d(uSin, angles, **p, ...)`. The computation
+    time of the backpropagation step is proportional to the number
+    of parameter sets and to the number of rows.
+
+    .. versionadded:: 0.3.0
+    """
+    if parameters is None:
+        parameters = [{}]
+    for pp in parameters:
+        for key in pp:
+            assert key in SWEEP_PARAMETERS, \
+                "Only {} can be varied, got '{}'.".format(SWEEP_PARAMETERS,
+                                                          key)
+    uSin = np.asarray(uSin)
+    angles = np.squeeze(angles)
+    assert angles.ndim == 1, "`angles` must be a 1D array."
+    assert uSin.ndim == 3, "`uSin` must be a 3D sinogram."
+    assert uSin.shape[0] == angles.shape[0], \
+        "Number of projections and angles do not match."
+    A = angles.shape[0]
+    if max_count is not None:
+        max_count.value += A * len(parameters)
+
+    if weight_angles:
+        weights = util.compute_angle_weights_1d(angles)
+    else:
+        weights = np.ones(A)
+
+    accs = []
+    for pp in parameters:
+        kwargs = {"res": res, "nm": nm, "lD": lD}
+        kwargs.update(pp)
+        accs.append(Accumulator3D(
+            uSin.shape[1:], padding=padding, padfac=padfac,
+            pad_strategy=pad_strategy, padval=padval,
+            intp_order=intp_order, intp_method=intp_method,
+            tile_size=tile_size, dtype=dtype, onlyreal=onlyreal,
+            num_cores=num_cores, save_memory=save_memory, rows=rows,
+            **kwargs))
+
+    try:
+        for aa in range(A):
+            # the transform is identical for all accumulators
+            spectrum = accs[0].transform(uSin[aa])
+            for acc in accs:
+                acc.add_transformed(spectrum, angles[aa], weights[aa])
+                if count is not None:
+                    count.value += 1
+            if verbose > 0:
+                print("......Processing angle {}/{}".format(aa + 1, A),
+                      end="\r", flush=True)
+        if verbose > 0:
+            print("")
+    finally:
+        for acc in accs:
+            acc.close()
+    return [acc.snapshot() for acc in accs]
@@ -33,3 +33,110 @@ def compute_angle_weights_1d(angles):
     # Sort everything back where it belongs
     unsortweights[sortargs] = weights
     return unsortweights
+
+
+def compute_padded_size(size, padfac, strategy="pow2", minimum=64):
+    """
+    Compute the padded size of the sinogram for Fourier filtering.
+    Parameters
+    ----------
+    size: int
+        Size of the input data along one axis
+    padfac: float
+        The input data are padded to at least `size*padfac`
+    strategy: str
+        - "pow2": the next power of two
+        - "smooth": the smallest integer of the form
+          :math:`2^a 3^b 5^c 7^d`, for which FFTW has optimized
+          algorithms
+    minimum: int
+        Minimum padded size
+    Returns
+    -------
+    padded_size: int
+        The padded size
+    Notes
+    -----
+    For an input size of 150 and `padfac=1.75`, the "pow2" strategy
+    yields 512 and the "smooth" strategy yields 270.
+    """
+    assert strategy in ["pow2", "smooth"], \
+        "`strategy` must be 'pow2' or 'smooth'."
+    if strategy == "pow2":
+        return int(max(minimum,
+                       2**np.ceil(np.log(size * padfac) / np.log(2))))
+    candidate = max(minimum, int(np.ceil(size * padfac)))
+    while True:
+        rest = candidate
+        for prime in [2, 3, 5, 7]:
+            while rest % prime == 0:
+                rest //= prime
+        if rest == 1:
+            return candidate
+        candidate += 1
+
+
+def compute_angle_order(angles, method="bitreversed"):
+    """
+    Compute an order in which the angles cover the full angular
+    range early on.
+    Parameters
+    ----------
+    angles: ndarray of length A
+        Angles in radians (1d) or, for (A,3) arrays, points on the
+        unit sphere which are assumed to be ordered along their
+        trajectory
+    method: str
+        - "acquisition": the order of `angles`
+        - "bitreversed": bit-reversal (van der Corput) order of the
+          sorted angles; After the first angle, the angle halfway
+          around is processed, then the angles at a quarter and at
+          three quarters, etc.
+        - "golden": golden ratio order of the sorted angles; Each
+          angle is (approximately) the previous angle plus 0.618
+          times the angular range.
+        For angles that are not equally distributed, the angle
+        closest (by index in the sorted angles) to the ideal
+        position that was not processed yet is used.
+    Returns
+    -------
+    order: 1d ndarray of ints
+        Indices of the angles in the processing order
+    Notes
+    -----
+    The partial sum of the projections processed in such an order
+    covers the angular range almost uniformly at any time, which
+    is useful for intermediate reconstructions.
+    """
+    assert method in ["acquisition", "bitreversed", "golden"], \
+        "`method` must be 'acquisition', 'bitreversed', or 'golden'."
+    angles = np.asarray(angles)
+    A = angles.shape[0]
+    if method == "acquisition" or A < 3:
+        return np.arange(A)
+    if angles.ndim == 1:
+        sortidx = np.argsort(angles % (2 * np.pi), kind="stable")
+    else:
+        sortidx = np.arange(A)
+    # fractions of the angular range in the processing order
+    fractions = np.zeros(A)
+    for ii in range(A):
+        if method == "bitreversed":
+            # van der Corput sequence (bit-reversed binary fraction)
+            (rest, base) = (ii, .5)
+            while rest:
+                fractions[ii] += (rest & 1) * base
+                (rest, base) = (rest >> 1, base / 2)
+        else:
+            fractions[ii] = (ii * (np.sqrt(5) - 1) / 2) % 1
+    # assign each fraction to the closest angle that was not used yet
+    unused = np.ones(A, dtype=bool)
+    positions = np.zeros(A, dtype=int)
+    for ii in range(A):
+        # circular distance to the unused positions
+        dist = np.abs(np.arange(A) - fractions[ii] * A)
+        dist = np.minimum(dist, A - dist)
+        dist[~unused] = np.inf
+        positions[ii] = np.argmin(dist)
+        unused[positions[ii]] = False
+    return sortidx[positions]
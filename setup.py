@@ -25,12 +25,12 @@ setup(
     long_description=open('README.rst').read() if exists('README.rst') else '',
     install_requires=["numexpr",
                       "numpy>=1.7.0",
-                      "pyfftw>=0.9.2",
                       "scikit-image>=0.11.0", 
                       "scipy>=0.10.0"],
+    extras_require={"fftw": ["pyfftw>=0.9.2"]},
     setup_requires=['pytest-runner'],
     tests_require=["pytest"],
-    python_requires='>=3.4, <4',
+    python_requires='>=3.7, <4',
     keywords=["odt", "opt", "diffraction", "born", "rytov", "radon",
               "backprojection", "backpropagation", "inverse problem",
               "Fourier diffraction theorem", "Fourier slice theorem"],
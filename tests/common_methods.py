@@ -205,6 +205,25 @@ def cutout(a):
     return a
 
 
+class CancelAfter(object):
+    """Progress counter (`count`) that cancels a token after `steps`"""
+
+    def __init__(self, token, steps):
+        self.token = token
+        self.steps = steps
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        if value >= self.steps:
+            self.token.cancel()
+
+
 def get_results(frame):
     """ Get the results from the frame of a method """
     filen = frame.f_globals["__file__"]
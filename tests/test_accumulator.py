@@ -0,0 +1,66 @@
+"""Test the stateful backpropagation accumulators"""
+import numpy as np
+import pytest
+
+import odtbrain
+import odtbrain.util
+
+from common_methods import create_test_sino_2d, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+def test_accumulator_2d():
+    sino, angles = create_test_sino_2d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_2d(sino, angles, **p)
+    weights = odtbrain.util.compute_angle_weights_1d(angles)
+    acc = odtbrain.Accumulator2D(sino.shape[1], **p)
+    for proj, ang, w in zip(sino, angles, weights):
+        acc.add(proj, ang, weight=w)
+    assert np.allclose(acc.snapshot(), ref)
+
+
+@pytest.mark.parametrize("intp_method", ["rotate", "gather", "fourier"])
+def test_accumulator_3d(intp_method):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino, angles, weight_angles=False,
+                                    intp_method=intp_method, **p)
+    acc = odtbrain.Accumulator3D(sino.shape[1:], intp_method=intp_method,
+                                 **p)
+    for proj, ang in zip(sino, angles):
+        acc.add(proj, ang)
+    acc.close()
+    assert acc.num_projections == len(angles)
+    assert np.allclose(acc.snapshot(), ref)
+
+
+def test_accumulator_3d_retract():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino, angles, onlyreal=True,
+                                    save_memory=True, **p)
+    weights = odtbrain.util.compute_angle_weights_1d(angles)
+    acc = odtbrain.Accumulator3D(sino.shape[1:], onlyreal=True,
+                                 save_memory=True, **p)
+    for proj, ang, w in zip(sino, angles, weights):
+        acc.add(proj, ang, weight=w)
+    # corrupt projection
+    rs = np.random.RandomState(42)
+    corrupt = rs.random_sample(sino.shape[1:]) * sino[0]
+    acc.add(corrupt, angles[3], weight=weights[3])
+    assert not np.allclose(acc.snapshot(), ref)
+    acc.retract(corrupt, angles[3], weight=weights[3])
+    assert np.allclose(acc.snapshot(), ref)
+    # remove all projections
+    for proj, ang, w in zip(sino, angles, weights):
+        acc.retract(proj, ang, weight=w)
+    assert np.all(acc.snapshot() == 0)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
@@ -1,8 +1,11 @@
 """Test 2d backpropagation"""
+import multiprocessing as mp
 import sys
+import threading
 
 import numpy as np
 import odtbrain
+from odtbrain import _alg2d_bpp
 
 from common_methods import create_test_sino_2d, cutout, \
     get_test_parameter_set, write_results, get_results
@@ -57,6 +60,128 @@ def test_2d_backprop_real():
     assert np.allclose(np.array(r).real, np.array(r2))
 
 
+def test_2d_backprop_fourier():
+    """
+    Fourier shear rotation must agree with spline interpolation for
+    band-limited data.
+    """
+    sino, angles = create_test_sino_2d(A=30, N=32)
+    p = {"res": 8, "nm": 1.333, "lD": 0}
+    f1 = odtbrain.backpropagate_2d(sino, angles, **p)
+    f2 = odtbrain.backpropagate_2d(sino, angles, intp_method="fourier", **p)
+    f3 = odtbrain.backpropagate_2d(sino, angles, intp_method="fourier",
+                                   onlyreal=True, **p)
+    assert np.allclose(f2.real, f3)
+    assert np.allclose(cutout(f1), cutout(f2),
+                       atol=.05 * np.abs(f1).max(), rtol=0)
+
+
+def test_2d_backprop_parallel(monkeypatch):
+    """Partial images of the worker processes must sum to the result"""
+    # allow more processes than cores and use processes for small data
+    monkeypatch.setattr(_alg2d_bpp.mp, "cpu_count", lambda: 3)
+    monkeypatch.setattr(_alg2d_bpp, "PARALLEL_MIN_SIZE", 0)
+    sino, angles = create_test_sino_2d()
+    p = {"res": 8, "nm": 1.333, "lD": 2}
+    f1 = odtbrain.backpropagate_2d(sino, angles, num_cores=1, **p)
+    for onlyreal in [False, True]:
+        f2 = odtbrain.backpropagate_2d(sino, angles, num_cores=3,
+                                       onlyreal=onlyreal, **p)
+        if onlyreal:
+            assert np.allclose(f1.real, f2)
+        else:
+            assert np.allclose(f1, f2)
+    # single precision
+    f3 = odtbrain.backpropagate_2d(sino, angles, num_cores=3,
+                                   dtype=np.float32, **p)
+    assert f3.dtype == np.complex64
+    assert np.allclose(f1, f3, atol=1e-5 * np.abs(f1).max(), rtol=0)
+    # the workers increment the counter for each angle
+    count = mp.Value("i", 0)
+    max_count = mp.Value("i", 0)
+    odtbrain.backpropagate_2d(sino, angles, num_cores=3, count=count,
+                              max_count=max_count, **p)
+    assert count.value == max_count.value
+
+
+def test_2d_backprop_parallel_threads(monkeypatch):
+    """Concurrent parallel reconstructions must not share data"""
+    monkeypatch.setattr(_alg2d_bpp.mp, "cpu_count", lambda: 3)
+    monkeypatch.setattr(_alg2d_bpp, "PARALLEL_MIN_SIZE", 0)
+    sino, angles = create_test_sino_2d()
+    sinos = [sino, sino**2]
+    p = {"res": 8, "nm": 1.333, "lD": 2}
+    refs = [odtbrain.backpropagate_2d(s, angles, num_cores=1, **p)
+            for s in sinos]
+    results = [None, None]
+
+    def reconstruct(ii):
+        results[ii] = odtbrain.backpropagate_2d(sinos[ii], angles,
+                                                num_cores=3, **p)
+
+    threads = [threading.Thread(target=reconstruct, args=(ii,))
+               for ii in range(2)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    for ref, f in zip(refs, results):
+        assert np.allclose(ref, f)
+
+
+def test_2d_backprop_chunks():
+    """Batched filtering must not change the result"""
+    sino, angles = create_test_sino_2d()
+    p = {"res": 8, "nm": 1.333, "lD": 2}
+    f1 = odtbrain.backpropagate_2d(sino, angles, chunk_size=1, **p)
+    # last chunk is incomplete
+    f2 = odtbrain.backpropagate_2d(sino, angles, chunk_size=4, **p)
+    f3 = odtbrain.backpropagate_2d(sino, angles, **p)
+    assert np.allclose(f1, f2)
+    assert np.allclose(f1, f3)
+
+
+def test_2d_backprop_real_input():
+    """Real-valued sinograms are filtered with real FFTs"""
+    sino, angles = create_test_sino_2d(N=21)
+    phase = np.angle(sino)
+    for padding in [True, False]:
+        p = {"res": 8, "nm": 1.333, "lD": 2, "padding": padding}
+        f1 = odtbrain.backpropagate_2d(phase.astype(complex), angles, **p)
+        f2 = odtbrain.backpropagate_2d(phase, angles, **p)
+        f3 = odtbrain.backpropagate_2d(phase, angles, onlyreal=True, **p)
+        assert np.allclose(f1, f2)
+        assert np.allclose(f1.real, f3)
+
+
+def test_2d_backprop_stack(monkeypatch):
+    """Stack reconstruction must agree with row-wise reconstruction"""
+    monkeypatch.setattr(_alg2d_bpp.mp, "cpu_count", lambda: 3)
+    monkeypatch.setattr(_alg2d_bpp, "PARALLEL_MIN_SIZE", 0)
+    sino, angles = create_test_sino_2d()
+    stack = np.stack((sino, sino**2), axis=1)
+    p = {"res": 8, "nm": 1.333, "lD": 2}
+    # serial, angles distributed, and rows distributed among workers
+    for intp_method in ["rotate", "fourier"]:
+        ref = [odtbrain.backpropagate_2d(stack[:, ii], angles, num_cores=1,
+                                         intp_method=intp_method, **p)
+               for ii in range(stack.shape[1])]
+        for num_cores in [1, 3, 2]:
+            f = odtbrain.backpropagate_2d_stack(stack, angles,
+                                                num_cores=num_cores,
+                                                intp_method=intp_method,
+                                                **p)
+            assert np.allclose(f, ref)
+    # rows filtered in separate blocks
+    ref = [odtbrain.backpropagate_2d(stack[:, ii], angles, num_cores=1,
+                                     intp_method="rotate", **p)
+           for ii in range(stack.shape[1])]
+    f = odtbrain.backpropagate_2d_stack(stack, angles, num_cores=1,
+                                        intp_method="rotate",
+                                        chunk_size=2**30, **p)
+    assert np.allclose(f, ref)
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
@@ -23,6 +23,18 @@ def test_2d_fmap():
     assert np.allclose(np.array(r).flatten().view(float), get_results(myframe))
 
 
+def test_2d_fmap_stack():
+    """Stack reconstruction must agree with row-wise reconstruction"""
+    sino, angles = create_test_sino_2d()
+    stack = np.stack((sino, sino**2, np.conj(sino)), axis=1)
+    p = {"res": 8, "nm": 1.333, "lD": 2}
+    f = odtbrain.fourier_map_2d_stack(stack, angles, num_cores=2, **p)
+    assert f.shape == (3, sino.shape[1], sino.shape[1])
+    for ii in range(stack.shape[1]):
+        fi = odtbrain.fourier_map_2d(stack[:, ii], angles, **p)
+        assert np.allclose(f[ii], fi)
+
+
 if __name__ == "__main__":
     # Run all tests
     loc = locals()
@@ -100,6 +100,73 @@ def test_3d_backprop_phase32():
     assert np.allclose(data32, data64, atol=6e-7, rtol=0)
 
 
+def test_3d_backprop_gather():
+    """
+    The gather kernel must match the rotation with linear interpolation.
+    """
+    sino, angles = create_test_sino_3d(Nx=10, Ny=12)
+    p = get_test_parameter_set(1)[0]
+    for onlyreal in [False, True]:
+        f1 = odtbrain.backpropagate_3d(sino, angles, padval=0,
+                                       dtype=np.float64, intp_order=1,
+                                       onlyreal=onlyreal, **p)
+        f2 = odtbrain.backpropagate_3d(sino, angles, padval=0,
+                                       dtype=np.float64,
+                                       intp_method="gather", tile_size=3,
+                                       onlyreal=onlyreal, **p)
+        assert np.allclose(f1, f2, atol=1e-14, rtol=0)
+
+
+def test_3d_backprop_fourier():
+    """
+    Fourier shear rotation must agree with spline interpolation for
+    band-limited data.
+    """
+    sino, angles = create_test_sino_3d(A=30, Nx=24, Ny=24)
+    p = {"res": 8, "nm": 1.333, "lD": 0}
+    f1 = odtbrain.backpropagate_3d(sino, angles, padval=0,
+                                   dtype=np.float64, intp_order=5, **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, padval=0,
+                                   dtype=np.float64,
+                                   intp_method="fourier", **p)
+    f3 = odtbrain.backpropagate_3d(sino, angles, padval=0,
+                                   dtype=np.float64, onlyreal=True,
+                                   intp_method="fourier", **p)
+    assert np.allclose(f2.real, f3)
+    assert np.allclose(cutout(f1), cutout(f2),
+                       atol=.05 * np.abs(f1).max(), rtol=0)
+
+
+def test_3d_backprop_real_input():
+    """Real-valued sinograms are filtered with real FFTs"""
+    sino, angles = create_test_sino_3d(Nx=11, Ny=12)
+    phase = np.angle(sino)
+    for padding in [(True, True), (False, False)]:
+        for save_memory in [False, True]:
+            p = {"res": 8, "nm": 1.333, "lD": 2, "padval": 0,
+                 "padding": padding, "save_memory": save_memory}
+            f1 = odtbrain.backpropagate_3d(phase.astype(complex), angles,
+                                           **p)
+            f2 = odtbrain.backpropagate_3d(phase.copy(), angles, **p)
+            f3 = odtbrain.backpropagate_3d(phase.copy(), angles,
+                                           onlyreal=True, **p)
+            assert np.allclose(f1, f2)
+            assert np.allclose(f1.real, f3)
+
+
+def test_3d_backprop_prune_spectrum():
+    """Pruning the spectrum to the low-pass band must be exact"""
+    sino, angles = create_test_sino_3d(Nx=11, Ny=12)
+    for uSin in [sino, np.angle(sino)]:
+        for save_memory in [False, True]:
+            p = {"res": 8, "nm": 1.333, "lD": 2, "padval": 0,
+                 "save_memory": save_memory}
+            f1 = odtbrain.backpropagate_3d(uSin.copy(), angles, **p)
+            f2 = odtbrain.backpropagate_3d(uSin.copy(), angles,
+                                           prune_spectrum=True, **p)
+            assert np.allclose(f1, f2)
+
+
 def test_3d_mprotate():
     myframe = sys._getframe()
     ln = 10
@@ -109,10 +176,11 @@ def test_3d_mprotate():
     _shared_array = np.ctypeslib.as_array(shared_array_base.get_obj())
     _shared_array = _shared_array.reshape(ln2, ln2, ln2)
     _shared_array[:, :, :] = initial_array
-    odtbrain._shared_array = _shared_array
-    # pool must be created after _shared array
-    pool = mp.Pool(processes=mp.cpu_count())
-    _alg3d_bpp._mprotate(2, ln, pool, 2)
+    with mp.Pool(processes=mp.cpu_count(),
+                 initializer=_alg3d_bpp._rotate_init,
+                 initargs=(shared_array_base, (ln2, ln2, ln2),
+                           None)) as pool:
+        _alg3d_bpp._mprotate(2, ln, pool, 2)
     if WRITE_RES:
         write_results(myframe, _shared_array)
     assert np.allclose(np.array(_shared_array).flatten().view(
@@ -0,0 +1,56 @@
+"""Test the processing order of the angles and intermediate volumes"""
+import numpy as np
+import pytest
+
+import odtbrain
+from odtbrain import util
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+def test_angle_order():
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    assert np.all(util.compute_angle_order(angles, "bitreversed")
+                  == [0, 4, 2, 6, 1, 5, 3, 7])
+    # sorted by angle
+    assert np.all(util.compute_angle_order(angles[::-1], "bitreversed")
+                  == [7, 3, 5, 1, 6, 2, 4, 0])
+    assert np.all(util.compute_angle_order(angles, "acquisition")
+                  == np.arange(8))
+    for size in [3, 10, 97]:
+        angles = np.linspace(0, np.pi, size)
+        for method in ["bitreversed", "golden"]:
+            order = util.compute_angle_order(angles, method)
+            assert np.all(np.sort(order) == np.arange(size))
+
+
+@pytest.mark.parametrize("func", [odtbrain.backpropagate_3d,
+                                  odtbrain.backpropagate_3d_tilted])
+def test_angle_order_callback(func):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = func(sino, angles, **p)
+    intermediate = []
+
+    def callback(f, angles_done):
+        intermediate.append((angles_done, f))
+
+    f = func(sino, angles, angle_order="golden", callback=callback,
+             callback_interval=4, **p)
+    assert np.allclose(f, ref)
+    assert [ad for (ad, _) in intermediate] == [4, 8]
+    # The intermediate volume is rescaled to the full angular range.
+    order = util.compute_angle_order(angles, "golden")
+    weights = util.compute_angle_weights_1d(angles)
+    sub = order[:4]
+    partial = func(sino[sub] * weights[sub].reshape(-1, 1, 1),
+                   angles[sub], weight_angles=False, **p)
+    assert np.allclose(intermediate[0][1], partial)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
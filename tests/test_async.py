@@ -0,0 +1,134 @@
+"""Test the asyncio interface"""
+import asyncio
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import odtbrain
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+def test_3d_backprop_async():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino, angles, **p)
+
+    async def reconstruct():
+        recon = odtbrain.backpropagate_3d_async(sino, angles, **p)
+        events = []
+        async for ev in recon:
+            events.append(ev)
+        return await recon, events
+
+    loop = asyncio.new_event_loop()
+    try:
+        result, events = loop.run_until_complete(reconstruct())
+    finally:
+        loop.close()
+    assert np.allclose(result, ref)
+    stages = [ev.stage for ev in events]
+    assert stages == ["started"] + ["filtering"] * 2 \
+        + ["backpropagation"] * len(angles) + ["finished"]
+    assert [ev.angle for ev in events if ev.stage == "backpropagation"] \
+        == list(range(len(angles)))
+    assert events[-1].step == events[-1].total == len(angles) + 2
+
+
+def test_3d_backprop_async_error():
+    sino, angles = create_test_sino_3d()
+
+    async def reconstruct():
+        # wrong number of angles
+        recon = odtbrain.backpropagate_3d_async(sino, angles[:-1], res=8,
+                                                nm=1.333)
+        events = []
+        async for ev in recon:
+            events.append(ev)
+        try:
+            await recon
+        except AssertionError:
+            return events
+        raise ValueError("The exception was not raised!")
+
+    loop = asyncio.new_event_loop()
+    try:
+        events = loop.run_until_complete(reconstruct())
+    finally:
+        loop.close()
+    assert [ev.stage for ev in events] == ["started"]
+
+
+def test_3d_backprop_async_angle_order():
+    """The events must report the indices of the processed angles"""
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+
+    async def reconstruct():
+        recon = odtbrain.backpropagate_3d_async(sino, angles,
+                                                angle_order="bitreversed",
+                                                **p)
+        events = [ev async for ev in recon]
+        await recon
+        return events
+
+    loop = asyncio.new_event_loop()
+    try:
+        events = loop.run_until_complete(reconstruct())
+    finally:
+        loop.close()
+    order = odtbrain.util.compute_angle_order(angles, "bitreversed")
+    assert [ev.angle for ev in events if ev.stage == "backpropagation"] \
+        == list(order)
+    assert list(order) != list(range(len(angles)))
+
+
+def test_3d_backprop_async_preview_angles():
+    """Only the angles of the preview are reported"""
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+
+    async def reconstruct():
+        recon = odtbrain.backpropagate_3d_async(sino, angles,
+                                                preview_angles=2, **p)
+        events = [ev async for ev in recon]
+        await recon
+        return events
+
+    loop = asyncio.new_event_loop()
+    try:
+        events = loop.run_until_complete(reconstruct())
+    finally:
+        loop.close()
+    num_angles = len(angles[::2])
+    stages = [ev.stage for ev in events]
+    assert stages == ["started"] + ["filtering"] * 2 \
+        + ["backpropagation"] * num_angles + ["finished"]
+    assert [ev.angle for ev in events if ev.stage == "backpropagation"] \
+        == list(range(0, len(angles), 2))
+    assert events[-1].total == num_angles + 2
+
+
+def test_3d_backprop_async_process_executor():
+    sino, angles = create_test_sino_3d()
+
+    async def reconstruct():
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            odtbrain.backpropagate_3d_async(sino, angles, res=8, nm=1.333,
+                                            executor=executor)
+
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(AssertionError, match="ThreadPoolExecutor"):
+            loop.run_until_complete(reconstruct())
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
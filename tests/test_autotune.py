@@ -0,0 +1,80 @@
+"""Test the autotuning of the 3D backpropagation"""
+import json
+import platform
+
+import numpy as np
+
+import odtbrain
+from odtbrain import _autotune, _fft
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+def test_autotune_3d(tmpdir):
+    cache_file = str(tmpdir.join("autotune.json"))
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    config = odtbrain.autotune_3d(sino.shape, cache_file=cache_file, **p)
+    assert sorted(config.keys()) == sorted(_autotune.TUNED_PARAMETERS)
+    with open(cache_file) as fd:
+        cache = json.load(fd)
+    assert list(cache[platform.node()].values()) == [config]
+
+
+def test_autotune_3d_cached(tmpdir, monkeypatch):
+    """Configurations must be tuned only once and not change results"""
+    cache_file = str(tmpdir.join("autotune.json"))
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    f1 = odtbrain.backpropagate_3d(sino, angles, **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, autotune=cache_file, **p)
+    assert np.allclose(f1, f2)
+
+    def tune(*args, **kwargs):
+        raise ValueError("The cached configuration was not used!")
+
+    monkeypatch.setattr(_autotune, "tune", tune)
+    f3 = odtbrain.backpropagate_3d(sino, angles, autotune=cache_file, **p)
+    assert np.allclose(f1, f3)
+
+
+def test_autotune_3d_config(tmpdir, monkeypatch):
+    """The cached configuration must respect the resource context"""
+    cache_file = str(tmpdir.join("autotune.json"))
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    called = {}
+
+    def tune(func, shape, sino_dtype, kwargs, verbose=0):
+        return {"num_cores": 64, "save_memory": False,
+                "prune_spectrum": False, "tile_size": 32,
+                "fft_backend": _fft.BACKENDS[-1]}
+
+    def backpropagate_3d(uSin, angles, res, nm, autotune=False,
+                         num_cores=None, save_memory=False,
+                         prune_spectrum=False, tile_size=32,
+                         fft_backend=None, **kwargs):
+        called.update(num_cores=num_cores, fft_backend=fft_backend,
+                      global_backend=_fft.get_backend())
+
+    monkeypatch.setattr(_autotune, "tune", tune)
+    func = _autotune.with_autotune(backpropagate_3d)
+    backend = _fft.get_backend()
+    with odtbrain.resource_context(num_cores=1):
+        func(sino, angles, autotune=cache_file, **p)
+    assert called["num_cores"] == 1
+    assert called["fft_backend"] == _fft.BACKENDS[-1]
+    assert called["global_backend"] == backend
+    # different parameters are tuned separately
+    key1 = _autotune._cache_key(sino.shape, sino.dtype, p)
+    key2 = _autotune._cache_key(sino.shape, sino.dtype,
+                                dict(p, padfac=2))
+    assert key1 != key2
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
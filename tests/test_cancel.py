@@ -0,0 +1,86 @@
+"""Test the cancellation of reconstructions"""
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+import odtbrain
+
+from common_methods import CancelAfter, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+@pytest.mark.parametrize("func", [odtbrain.backpropagate_3d,
+                                  odtbrain.backpropagate_3d_tilted])
+def test_cancel_raise(func):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    token = odtbrain.CancelToken()
+    # two filtering steps and three angles
+    count = CancelAfter(token, 5)
+    with pytest.raises(odtbrain.ReconstructionCancelled) as exc:
+        func(sino, angles, cancel=token, count=count, **p)
+    assert exc.value.angles_done == 3
+    assert token.angles_done == 3
+    # shared variables and worker processes are released
+    assert getattr(odtbrain, "_shared_array", None) is None
+    assert not mp.active_children()
+
+
+@pytest.mark.parametrize("func", [odtbrain.backpropagate_3d,
+                                  odtbrain.backpropagate_3d_tilted])
+def test_cancel_exception(func):
+    """Worker processes must be released if the reconstruction fails"""
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+
+    def callback(partial, angles_done):
+        raise ValueError("stop")
+
+    with pytest.raises(ValueError, match="stop"):
+        func(sino, angles, callback=callback, callback_interval=1, **p)
+    assert getattr(odtbrain, "_shared_array", None) is None
+    assert not mp.active_children()
+
+
+@pytest.mark.parametrize("intp_method", ["rotate", "gather", "fourier"])
+def test_cancel_partial(intp_method):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    p["intp_method"] = intp_method
+    token = odtbrain.CancelToken(partial=True)
+    count = CancelAfter(token, 5)
+    f1 = odtbrain.backpropagate_3d(sino, angles, cancel=token, count=count,
+                                   **p)
+    assert token.angles_done == 3
+    # The partial sum must equal the reconstruction of the first angles
+    # (the angular weights are computed from all angles).
+    weights = odtbrain.util.compute_angle_weights_1d(angles)
+    sino_w = sino * weights.reshape(-1, 1, 1)
+    f2 = odtbrain.backpropagate_3d(sino_w[:3], angles[:3],
+                                   weight_angles=False, **p)
+    # dphi0 = 2π/A
+    assert np.allclose(f1, f2 * 3 / len(angles))
+
+
+def test_cancel_deadline():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    token = odtbrain.CancelToken(timeout=0)
+    with pytest.raises(odtbrain.ReconstructionCancelled):
+        odtbrain.backpropagate_3d(sino, angles, cancel=token, **p)
+    assert token.angles_done == 0
+    # not cancelled
+    token = odtbrain.CancelToken(timeout=1000)
+    f1 = odtbrain.backpropagate_3d(sino, angles, cancel=token, **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, **p)
+    assert np.allclose(f1, f2)
+    assert token.angles_done == len(angles)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
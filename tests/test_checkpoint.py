@@ -0,0 +1,65 @@
+"""Test checkpointing of the 3D backpropagation"""
+import json
+
+import numpy as np
+import pytest
+
+import odtbrain
+
+from common_methods import CancelAfter, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+@pytest.mark.parametrize("func", [odtbrain.backpropagate_3d,
+                                  odtbrain.backpropagate_3d_tilted])
+def test_checkpoint_resume(func, tmpdir):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = func(sino, angles, **p)
+    path = str(tmpdir.join("recon"))
+    # interrupted after two filtering steps and five angles
+    token = odtbrain.CancelToken()
+    count = CancelAfter(token, 7)
+    with pytest.raises(odtbrain.ReconstructionCancelled):
+        func(sino, angles, cancel=token, count=count,
+             checkpoint=odtbrain.Checkpoint(path, interval=2), **p)
+    with open(path + ".json") as fd:
+        assert json.load(fd)["angles_done"] == 5
+    # resumed reconstruction
+    token = odtbrain.CancelToken()
+    count = CancelAfter(token, np.inf)
+    f = func(sino, angles, count=count,
+             checkpoint=odtbrain.Checkpoint(path, interval=2), **p)
+    assert np.allclose(f, ref)
+    assert count.value == len(angles) + 2
+    with open(path + ".json") as fd:
+        assert json.load(fd)["angles_done"] == len(angles)
+
+
+def test_checkpoint_mismatch(tmpdir):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    path = str(tmpdir.join("recon"))
+    odtbrain.backpropagate_3d(sino, angles,
+                              checkpoint=odtbrain.Checkpoint(path), **p)
+    with pytest.raises(AssertionError, match="different sinogram"):
+        odtbrain.backpropagate_3d(sino, angles, onlyreal=True,
+                                  checkpoint=odtbrain.Checkpoint(path), **p)
+    # same shape and angles, but a different scan
+    with pytest.raises(AssertionError, match="different sinogram"):
+        odtbrain.backpropagate_3d(sino * 1.1, angles,
+                                  checkpoint=odtbrain.Checkpoint(path), **p)
+    # overwrite the existing checkpoint
+    f1 = odtbrain.backpropagate_3d(sino, angles, onlyreal=True,
+                                   checkpoint=odtbrain.Checkpoint(
+                                       path, resume=False), **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, onlyreal=True, **p)
+    assert np.allclose(f1, f2)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
@@ -0,0 +1,79 @@
+"""Test the FFT backends"""
+import numpy as np
+import pytest
+
+import odtbrain
+from odtbrain import _fft
+
+from common_methods import create_test_sino_2d, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+@pytest.mark.parametrize("backend", _fft.BACKENDS)
+def test_fft_plan(backend):
+    rs = np.random.RandomState(42)
+    data = rs.random_sample((6, 8)) + 1j * rs.random_sample((6, 8))
+    # complex-to-complex
+    arr = _fft.empty_aligned(data.shape, np.complex128)
+    arr[:] = data
+    _fft.plan(arr, arr, axes=(0, 1), backend=backend).execute()
+    assert np.allclose(arr, np.fft.fft2(data))
+    _fft.plan(arr, arr, axes=(1,), direction="FFTW_BACKWARD",
+              backend=backend).execute()
+    assert np.allclose(arr, np.fft.ifft(np.fft.fft2(data), axis=1) * 8)
+    # real-to-complex and complex-to-real
+    real = _fft.empty_aligned(data.shape, np.float64)
+    spec = _fft.empty_aligned((6, 5), np.complex128)
+    real[:] = data.real
+    _fft.plan(real, spec, axes=(0, 1), backend=backend).execute()
+    assert np.allclose(spec, np.fft.rfft2(data.real))
+    _fft.plan(spec, real, axes=(0, 1), direction="FFTW_BACKWARD",
+              backend=backend).execute()
+    assert np.allclose(real, data.real * data.size)
+    # discrete cosine transform and its inverse
+    real[:] = data.real
+    _fft.plan(real, real, axes=(0, 1), direction=["FFTW_REDFT10"] * 2,
+              backend=backend).execute()
+    _fft.plan(real, real, axes=(0, 1), direction=["FFTW_REDFT01"] * 2,
+              backend=backend).execute()
+    assert np.allclose(real, data.real * 4 * data.size)
+    # convenience functions
+    assert np.allclose(_fft.fft(data, axes=(0, 1), backend=backend),
+                       np.fft.fft2(data))
+    assert np.allclose(_fft.ifft(data, axes=(0, 1), backend=backend),
+                       np.fft.ifft2(data))
+
+
+@pytest.mark.parametrize("backend", _fft.BACKENDS)
+def test_fft_backend_recon(backend):
+    sino2d, angles2d = create_test_sino_2d()
+    sino3d, angles3d = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref2d = odtbrain.backpropagate_2d(sino2d, angles2d, **p)
+    ref3d = odtbrain.backpropagate_3d(sino3d, angles3d, **p)
+    previous = _fft.set_backend(backend)
+    try:
+        assert _fft.get_backend() == backend
+        r2d = odtbrain.backpropagate_2d(sino2d, angles2d, **p)
+        r3d = odtbrain.backpropagate_3d(sino3d, angles3d, **p)
+    finally:
+        _fft.set_backend(previous)
+    assert np.allclose(r2d, ref2d)
+    assert np.allclose(r3d, ref3d)
+
+
+def test_fft_threads():
+    previous = _fft.set_threads(2)
+    try:
+        assert _fft.get_threads() == 2
+    finally:
+        _fft.set_threads(previous)
+    assert _fft.get_threads() == previous
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
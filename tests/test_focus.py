@@ -0,0 +1,50 @@
+"""Test the estimation of the detector distance"""
+import numpy as np
+
+import odtbrain
+import odtbrain._focus
+
+from common_methods import create_test_sino_2d, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+def test_focus_2d():
+    sino, angles = create_test_sino_2d()
+    p = get_test_parameter_set(1)[0]
+    distances = [-2, 0, 2, 4]
+    lD, scores = odtbrain.estimate_focus(sino, angles, p["res"], p["nm"],
+                                         distances, ret_scores=True)
+    for dd, sc in zip(distances, scores):
+        f = odtbrain.backpropagate_2d(sino, angles, p["res"], p["nm"], dd)
+        assert np.allclose(sc, odtbrain.tamura_coefficient(f))
+    assert distances[0] <= lD <= distances[-1]
+
+
+def test_focus_3d():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    distances = [-2, 0, 2]
+    rows = [10, 11]
+    _, scores = odtbrain.estimate_focus(sino, angles, p["res"], p["nm"],
+                                        distances, rows=rows,
+                                        ret_scores=True)
+    for dd, sc in zip(distances, scores):
+        f = odtbrain.backpropagate_3d(sino, angles, p["res"], p["nm"], dd)
+        assert np.allclose(sc, odtbrain.tamura_coefficient(f[:, rows, :]))
+
+
+def test_parabolic_peak():
+    x = np.array([-2., 0, 2, 4])
+    y = -(x - 0.7)**2
+    lD = odtbrain._focus._parabolic_peak(x, y, int(np.argmax(y)))
+    assert np.allclose(lD, 0.7)
+    # maximum at the boundary
+    assert odtbrain._focus._parabolic_peak(x, x, 3) == 4
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
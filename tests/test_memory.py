@@ -0,0 +1,64 @@
+"""Test the memory estimation"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import odtbrain
+
+from common_methods import create_test_sino_3d
+
+
+def test_estimate_memory_3d():
+    """The estimated peak memory must be close to the measured one"""
+    sino, angles = create_test_sino_3d(A=20, Nx=40, Ny=40)
+    p = {"res": 8, "nm": 1.333, "intp_method": "fourier", "num_cores": 1}
+    for kwargs in [{}, {"save_memory": True}, {"prune_spectrum": True}]:
+        tracemalloc.start()
+        odtbrain.backpropagate_3d(sino, angles, **p, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        mem = odtbrain.estimate_memory_3d(sino.shape, **p, **kwargs)
+        assert np.allclose(mem["peak"], peak, rtol=.2, atol=0)
+
+
+def test_estimate_memory_3d_arrays():
+    shape = (20, 40, 40)
+    p = {"res": 8, "nm": 1.333}
+    mem = odtbrain.estimate_memory_3d(shape, **p)
+    # padded to 128x128
+    assert mem["padded sinogram"] == 20 * 128 * 128 * 16
+    assert mem["filter2"] == 40 * 128 * 128 * 16
+    assert mem["output"] == 40**3 * 16
+    # saving memory
+    mem2 = odtbrain.estimate_memory_3d(shape, save_memory=True, **p)
+    assert mem2["filter2"] == 0
+    assert mem2["peak"] < mem["peak"]
+    # real input, single precision, and smaller padding
+    mem3 = odtbrain.estimate_memory_3d(shape, sino_dtype=np.float32,
+                                       dtype=np.float32, onlyreal=True,
+                                       pad_strategy="smooth", **p)
+    assert mem3["padded sinogram"] == 20 * 70 * 70 * 4
+    assert mem3["projection"] == 20 * 70 * 36 * 8
+    assert mem3["output"] == 40**3 * 4
+    assert mem3["peak"] < mem["peak"]
+
+
+def test_save_memory_auto():
+    sino, angles = create_test_sino_3d()
+    p = {"res": 8, "nm": 1.333, "num_cores": 1}
+    f1 = odtbrain.backpropagate_3d(sino, angles, **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, save_memory="auto", **p)
+    assert np.allclose(f1, f2)
+    with pytest.warns(UserWarning, match="exceeds `max_memory`"):
+        f3 = odtbrain.backpropagate_3d(sino, angles, save_memory="auto",
+                                       max_memory=1, **p)
+    assert np.allclose(f1, f3)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
@@ -0,0 +1,56 @@
+"""Test padding strategies"""
+import numpy as np
+
+import odtbrain
+from odtbrain import util
+
+from common_methods import create_test_sino_2d, create_test_sino_3d, cutout
+
+
+def test_padded_size():
+    assert util.compute_padded_size(150, 1.75) == 512
+    assert util.compute_padded_size(150, 1.75, strategy="smooth") == 270
+    assert util.compute_padded_size(144, 1.75) == 256
+    assert util.compute_padded_size(144, 1.75, strategy="smooth") == 252
+    # minimum size
+    assert util.compute_padded_size(10, 1.75) == 64
+    assert util.compute_padded_size(10, 1.75, strategy="smooth") == 64
+    for size in range(1, 300):
+        padded = util.compute_padded_size(size, 2.1, strategy="smooth")
+        assert padded >= size * 2.1
+        rest = padded
+        for prime in [2, 3, 5, 7]:
+            while rest % prime == 0:
+                rest //= prime
+        assert rest == 1
+
+
+def test_pad_strategy_2d():
+    sino, angles = create_test_sino_2d(N=40)
+    p = {"res": 8, "nm": 1.333, "lD": 0}
+    f1 = odtbrain.backpropagate_2d(sino, angles, **p)
+    f2 = odtbrain.backpropagate_2d(sino, angles, pad_strategy="smooth", **p)
+    assert np.allclose(cutout(f1), cutout(f2),
+                       atol=.1 * np.abs(f1).max(), rtol=0)
+
+
+def test_pad_strategy_3d():
+    sino, angles = create_test_sino_3d(Nx=40, Ny=40)
+    p = {"res": 8, "nm": 1.333, "lD": 0, "padval": 0}
+    f1 = odtbrain.backpropagate_3d(sino, angles, **p)
+    f2 = odtbrain.backpropagate_3d(sino, angles, pad_strategy="smooth", **p)
+    assert np.allclose(cutout(f1), cutout(f2),
+                       atol=.1 * np.abs(f1).max(), rtol=0)
+    f3 = odtbrain.backpropagate_3d_tilted(sino, angles, **p)
+    f4 = odtbrain.backpropagate_3d_tilted(sino, angles,
+                                          pad_strategy="smooth", **p)
+    assert np.allclose(cutout(f3), cutout(f4),
+                       atol=.1 * np.abs(f3).max(), rtol=0)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
@@ -0,0 +1,67 @@
+"""Test the angle-partitioned 3D reconstruction"""
+import concurrent.futures
+import multiprocessing as mp
+import types
+
+import numpy as np
+import pytest
+
+import odtbrain
+from odtbrain import _partition
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+@pytest.mark.parametrize("func,func_part,kwargs", [
+    (odtbrain.backpropagate_3d, odtbrain.backpropagate_3d_partitioned, {}),
+    (odtbrain.backpropagate_3d_tilted,
+     odtbrain.backpropagate_3d_tilted_partitioned,
+     {"tilted_axis": [0.2, 0.9, 0.3]})])
+def test_partitioned_process_pool(func, func_part, kwargs):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    p.update(kwargs)
+    ref = func(sino, angles, **p)
+    count = mp.Value("I", lock=True)
+    max_count = mp.Value("I", lock=True)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as ex:
+        f = func_part(sino, angles, executor=ex, num_partitions=3,
+                      num_cores=1, count=count, max_count=max_count, **p)
+    assert np.allclose(f, ref)
+    assert count.value == max_count.value == len(angles)
+
+
+@pytest.mark.parametrize("intp_method", ["gather", "rotate"])
+def test_partitioned_thread_pool(intp_method):
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino, angles, weight_angles=False,
+                                    onlyreal=True, intp_method=intp_method,
+                                    **p)
+    # counter without a lock (incremented from the executor threads)
+    count = types.SimpleNamespace(value=0)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as ex:
+        f = odtbrain.backpropagate_3d_partitioned(
+            sino, angles, executor=ex, num_partitions=10,
+            weight_angles=False, onlyreal=True, intp_method=intp_method,
+            count=count, **p)
+    assert np.allclose(f, ref)
+    assert count.value == len(angles)
+
+
+def test_tree_reduce():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as ex:
+        for num in [1, 2, 5, 8]:
+            futures = [ex.submit(np.ones, 3) for _ in range(num)]
+            assert np.all(_partition.tree_reduce(ex, futures) == num)
+    parts = _partition.partition_angles(9, 10)
+    assert len(parts) == 4
+    assert np.all(np.concatenate(parts) == np.arange(9))
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
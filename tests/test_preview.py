@@ -0,0 +1,73 @@
+"""Test the preview reconstructions on a coarser grid"""
+import numpy as np
+
+import odtbrain
+from odtbrain._preview import fourier_downsample
+
+from common_methods import create_test_sino_2d, create_test_sino_3d, \
+    get_test_parameter_set
+
+
+def downsample(f, factor):
+    for axis in range(f.ndim):
+        f = fourier_downsample(f, factor, axis=axis)
+    return f
+
+
+def rel_error(a, b):
+    return np.linalg.norm(a - b) / np.linalg.norm(b)
+
+
+def test_fourier_downsample():
+    for (size, factor) in [(40, 2), (41, 3), (64, 4)]:
+        x = np.arange(size)
+        data = np.exp(-(x - size / 2)**2 / (2 * 6**2))
+        down = fourier_downsample(data, factor)
+        # centers of the grids coincide
+        nc = size // factor
+        xc = factor * (np.arange(nc) - (nc - 1) / 2) + (size - 1) / 2
+        assert down.dtype == data.dtype
+        assert np.allclose(down, np.exp(-(xc - size / 2)**2 / (2 * 6**2)),
+                           atol=1e-3, rtol=0)
+        down = fourier_downsample(data.reshape(1, -1, 1) * (1 + 1j),
+                                  factor, axis=1)
+        assert np.allclose(down.flatten(), fourier_downsample(data, factor)
+                           * (1 + 1j))
+
+
+def test_preview_2d():
+    sino, angles = create_test_sino_2d(N=44)
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_2d(sino, angles, **p)
+    f = odtbrain.backpropagate_2d(sino, angles, preview=2, **p)
+    assert f.shape == (22, 22)
+    # The preview lacks the frequencies of the object outside of
+    # the (rotated) band of the downsampled projections.
+    assert rel_error(f, downsample(ref, 2)) < 0.2
+
+
+def test_preview_3d():
+    sino, angles = create_test_sino_3d(Nx=44, Ny=44)
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino, angles, **p)
+    f = odtbrain.backpropagate_3d(sino, angles, preview=2, **p)
+    assert f.shape == (22, 22, 22)
+    # The preview lacks the frequencies of the object outside of
+    # the (rotated) band of the downsampled projections.
+    assert rel_error(f, downsample(ref, 2)) < 0.2
+
+
+def test_preview_angles():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ref = odtbrain.backpropagate_3d(sino[::3], angles[::3], **p)
+    f = odtbrain.backpropagate_3d(sino, angles, preview_angles=3, **p)
+    assert np.allclose(f, ref)
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
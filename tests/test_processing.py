@@ -4,9 +4,11 @@ import sys
 import numpy as np
 
 import odtbrain
+from odtbrain import _preproc
 from odtbrain._preproc import divmod_neg
 
-from common_methods import write_results, get_results
+from common_methods import create_test_sino_2d, create_test_sino_3d, \
+    get_test_parameter_set, write_results, get_results
 
 WRITE_RES = False
 
@@ -129,6 +131,96 @@ def test_sino_rytov():
         ryt2d2 - ryt[:, 0, :], twopi).view(float), atol=1e-6)
 
 
+def test_sino_out():
+    """In-place computation must yield the same result"""
+    sino = get_test_data_set_sino(rytov=True)
+    u0 = np.exp(.1j) * np.ones(sino.shape[1:])
+    ryt = odtbrain.sinogram_as_rytov(sino, u0=u0)
+    inplace = sino.copy()
+    ryt2 = odtbrain.sinogram_as_rytov(inplace, u0=u0, out=inplace)
+    assert ryt2 is inplace
+    assert np.allclose(ryt, ryt2)
+
+    rad = odtbrain.sinogram_as_radon(sino)
+    out = np.zeros(sino.shape, dtype=float)
+    rad2 = odtbrain.sinogram_as_radon(sino, out=out)
+    assert rad2 is out
+    assert np.allclose(rad, rad2)
+
+
+def test_sino_single_precision():
+    """Single precision input must yield single precision output"""
+    sino = get_test_data_set_sino(rytov=True).astype(np.complex64)
+    ryt = odtbrain.sinogram_as_rytov(sino)
+    assert ryt.dtype == np.complex64
+    ryt2 = odtbrain.sinogram_as_rytov(sino.astype(np.complex128))
+    # the phase offset (`align`) may differ by 2PI
+    assert np.allclose(np.exp(ryt), np.exp(ryt2), atol=1e-5)
+    rad = odtbrain.sinogram_as_radon(sino)
+    assert rad.dtype == np.float32
+
+
+def test_sino_unwrap_parallel():
+    """Parallel unwrapping must yield exactly the serial result"""
+    x = np.linspace(-3, 3, 20)
+    phase = np.array([np.angle(np.exp(1j*(x.reshape(-1, 1)**2 + x**2)*ii))
+                      for ii in range(5)])
+    serial = phase.copy()
+    _preproc._unwrap_3d(serial, num_cores=1)
+    # use more processes than cores
+    parallel = phase.copy()
+    _preproc._unwrap_3d(parallel, num_cores=3)
+    assert np.array_equal(serial, parallel)
+    # Rytov phase is unwrapped on a non-contiguous view
+    ryt = np.exp(1j*phase) * 1.1
+    imag = np.log(ryt).imag
+    _preproc._unwrap_3d(imag, num_cores=2)
+    assert np.allclose(imag, serial)
+
+
+def test_sino_unwrap_lsq():
+    """Least-squares unwrapping of smooth data must be exact"""
+    x = np.linspace(-3, 3, 20)
+    phase = np.array([(x.reshape(-1, 1)**2 + x**2)*ii*.3 + ii
+                      for ii in range(5)])
+    unwrapped = np.angle(np.exp(1j*phase))
+    _preproc._unwrap_3d_lsq(unwrapped, num_cores=1)
+    # result differs by a multiple of 2PI for each projection
+    offset = (unwrapped - phase)[:, 0, 0].reshape(-1, 1, 1)
+    assert np.allclose(negative_modulo_rest(offset, 2*np.pi), 0)
+    assert np.allclose(unwrapped - offset, phase)
+    # compare with default method
+    sino = np.exp(1j*phase)
+    rad1 = odtbrain.sinogram_as_radon(sino)
+    rad2 = odtbrain.sinogram_as_radon(sino, unwrap_method="lsq")
+    assert np.allclose(rad1, rad2)
+
+
+def test_sino_refocus():
+    """Refocusing must be equivalent to reconstructing with `lD`"""
+    p = get_test_parameter_set(1)[0]
+    sino, angles = create_test_sino_3d()
+    # all frequencies propagate for res < sqrt(2) * nm
+    same = odtbrain.refocus_sinogram(sino, 1.5, p["nm"], 0)
+    assert np.allclose(same, sino)
+    ref = odtbrain.refocus_sinogram(sino, p["res"], p["nm"], 3)
+    inplace = sino.copy()
+    out = odtbrain.refocus_sinogram(inplace, p["res"], p["nm"], 3,
+                                    chunk_size=2, out=inplace)
+    assert out is inplace
+    assert np.allclose(ref, inplace)
+
+    for sino, angles, func in [
+            (sino, angles, odtbrain.backpropagate_3d),
+            create_test_sino_2d() + (odtbrain.backpropagate_2d,)]:
+        uB = sino - 1
+        f1 = func(uB, angles, p["res"], p["nm"], lD=3)
+        focused = odtbrain.refocus_sinogram(uB, p["res"], p["nm"], -3)
+        f2 = func(focused, angles, p["res"], p["nm"], lD=0)
+        # The refocused sinogram is cropped to the original size.
+        assert np.linalg.norm(f1 - f2) / np.linalg.norm(f1) < 0.01
+
+
 def test_divmod_neg():
     assert np.allclose(divmod_neg(0, 2*np.pi), (0, 0))
     assert np.allclose(divmod_neg(-1e-17, 2*np.pi), (0, 0))
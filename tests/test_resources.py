@@ -0,0 +1,95 @@
+"""Test the scoped resource settings"""
+import multiprocessing as mp
+import threading
+
+import numexpr as ne
+import numpy as np
+
+import odtbrain
+from odtbrain import _fft, _resources
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+def test_resource_context():
+    ne_previous = ne.set_num_threads(3)
+    fft_previous = _fft.get_threads()
+    try:
+        with odtbrain.resource_context(num_cores=2):
+            assert _resources.get_num_cores() == 2
+            assert _fft.get_threads() == 2
+            assert ne.set_num_threads(2) == 2
+            with odtbrain.resource_context(num_cores=1):
+                assert _resources.get_num_cores() == 1
+            assert _resources.get_num_cores() == 2
+        assert ne.set_num_threads(3) == 3
+        assert _fft.get_threads() == fft_previous
+    finally:
+        ne.set_num_threads(ne_previous)
+
+
+def test_resource_context_threads():
+    """Contexts in threads must not affect each other"""
+    ne_previous = ne.set_num_threads(3)
+    fft_previous = _fft.get_threads()
+    entered = [threading.Event(), threading.Event()]
+    leave = [threading.Event(), threading.Event()]
+    seen = {}
+
+    def run(ii, num_cores):
+        with odtbrain.resource_context(num_cores=num_cores):
+            entered[ii].set()
+            leave[ii].wait()
+            seen[ii] = (_resources.get_num_cores(), _fft.get_threads())
+
+    try:
+        threads = [threading.Thread(target=run, args=(0, 2)),
+                   threading.Thread(target=run, args=(1, 1))]
+        threads[0].start()
+        entered[0].wait()
+        threads[1].start()
+        entered[1].wait()
+        # the thread that entered first leaves first
+        leave[0].set()
+        threads[0].join()
+        assert ne.set_num_threads(1) == 1
+        leave[1].set()
+        threads[1].join()
+        assert seen == {0: (2, 2), 1: (1, 1)}
+        # the original settings are restored
+        assert ne.set_num_threads(3) == 3
+        assert _fft.get_threads() == fft_previous
+        assert _resources.get_num_cores() == mp.cpu_count()
+    finally:
+        ne.set_num_threads(ne_previous)
+
+
+def test_resource_reconstruction():
+    """Reconstructions must not change the global settings"""
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    ne_previous = ne.set_num_threads(3)
+    try:
+        r1 = odtbrain.backpropagate_3d(sino, angles, num_cores=1, **p)
+        assert ne.set_num_threads(3) == 3
+        with odtbrain.resource_context(num_cores=1):
+            r2 = odtbrain.backpropagate_3d(sino, angles, **p)
+    finally:
+        ne.set_num_threads(ne_previous)
+    assert np.allclose(r1, r2)
+
+
+def test_split_cores():
+    assert odtbrain.split_cores(3, num_cores=8) == [3, 3, 2]
+    assert odtbrain.split_cores(1, num_cores=8) == [8]
+    assert odtbrain.split_cores(4, num_cores=2) == [1, 1, 1, 1]
+    with odtbrain.resource_context(num_cores=4):
+        assert odtbrain.split_cores(2) == [2, 2]
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()
@@ -0,0 +1,43 @@
+"""Test the reconstruction for several sets of parameters"""
+import numpy as np
+
+import odtbrain
+
+from common_methods import create_test_sino_3d, get_test_parameter_set
+
+
+def test_sweep_3d():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    parameters = [{"lD": 0}, {"lD": 2, "nm": p["nm"] + .01}]
+    results = odtbrain.backpropagate_3d_sweep(sino, angles,
+                                              parameters=parameters, **p)
+    assert len(results) == 2
+    for pp, f in zip(parameters, results):
+        kwargs = dict(p)
+        kwargs.update(pp)
+        ref = odtbrain.backpropagate_3d(sino, angles, **kwargs)
+        assert np.allclose(f, ref)
+
+
+def test_sweep_3d_rows():
+    sino, angles = create_test_sino_3d()
+    p = get_test_parameter_set(1)[0]
+    rows = [0, 4, 5]
+    for intp_method in ["rotate", "gather", "fourier"]:
+        full = odtbrain.backpropagate_3d(sino, angles, onlyreal=True,
+                                         intp_method=intp_method, **p)
+        f = odtbrain.backpropagate_3d_sweep(sino, angles, rows=rows,
+                                            onlyreal=True,
+                                            intp_method=intp_method,
+                                            **p)[0]
+        assert f.shape == (full.shape[0], len(rows), full.shape[2])
+        assert np.allclose(f, full[:, rows, :])
+
+
+if __name__ == "__main__":
+    # Run all tests
+    loc = locals()
+    for key in list(loc.keys()):
+        if key.startswith("test_") and hasattr(loc[key], "__call__"):
+            loc[key]()